@@ -0,0 +1,106 @@
+#! /usr/bin/python
+# vim: set ts=4 sw=4 expandtab:
+#
+# Register allocator comparison.  Compiles every program in bench.PROGRAMS
+# with every allocator given with --allocator (default: stack, reg and
+# linear) --repeat times, and prints for each the mean time of the
+# allocation pass and of the whole compile, with their 95% confidence
+# intervals, and the quality of the code: the number of instructions, how
+# many of them access memory, the bytes of stack the functions reserve, and
+# how many moves the allocator coalesced away.
+# bench.py --modes reg,linear measures how fast the code runs.
+#
+# Exits with status 1 if a compile fails.
+#
+# Usage: allocators.py [options] [program...]
+
+from __future__ import print_function
+import os, sys, re, json, shutil, subprocess, tempfile, time
+from optparse import OptionParser
+
+from bench import PROGRAMS, COMPDIR, mean_ci, fmt
+
+def compile_once(source, allocator):
+    """Compiles source with --allocator allocator and returns (wall time,
+    allocation pass time, moves coalesced, assembly), or None if the compile
+    failed."""
+    statsfile = source + '.json'
+    cmd = [sys.executable, os.path.join(COMPDIR, 'compile.py'), '--stats-json', statsfile,
+           '--allocator', allocator, source]
+    start = time.time()
+    retcode = subprocess.call(cmd)
+    t = time.time() - start
+    if retcode != 0:
+        return None
+    f = open(statsfile)
+    records = json.load(f)[0]['passes']
+    f.close()
+    alloc = sum([r['time'] for r in records if r['name'].endswith('alloc')])
+    coalesced = sum([r['counters'].get('moves coalesced', 0) for r in records if r['name'].endswith('alloc')])
+    f = open(os.path.splitext(source)[0] + '.s')
+    asm = f.read()
+    f.close()
+    return t, alloc, coalesced, asm
+
+def code_quality(asm):
+    """Returns (instructions, memory accesses, stack bytes) of assembly."""
+    instructions = memory = stack = 0
+    for line in asm.split('\n'):
+        line = line.split('#')[0].strip()
+        if not line or line.endswith(':') or line.startswith('.'):
+            continue
+        instructions += 1
+        if '(%' in line:
+            memory += 1
+        m = re.match(r'subl \$(\d+),\s*%esp', line)
+        if m:
+            stack += int(m.group(1))
+    return instructions, memory, stack
+
+if __name__ == "__main__":
+    parser = OptionParser(usage='%prog [options] [program...]')
+    parser.add_option('-a', '--allocator', dest='allocators', action='append', default=[],
+                      help='allocator to compile with; may be repeated (default: stack, reg and linear)')
+    parser.add_option('-n', '--repeat', dest='repeat', type='int', default=3,
+                      help='compile every program N times with each allocator (default: %default)')
+    (options, args) = parser.parse_args()
+
+    allocators = options.allocators or ['stack', 'reg', 'linear']
+    programs = [p for p in PROGRAMS if not args or p[0] in args]
+
+    print('%-12s %-8s %18s %18s %8s %8s %8s %9s' %
+          ('program', 'alloc', 'alloc time (s)', 'compile time (s)', 'instrs', 'memory', 'stack', 'coalesced'))
+    failed = []
+    workdir = tempfile.mkdtemp(prefix='allocators')
+    try:
+        for name, source, stdin in programs:
+            copy = os.path.join(workdir, name + '.py')
+            shutil.copy(source, copy)
+            for allocator in allocators:
+                times = []
+                alloctimes = []
+                asm = None
+                coalesced = 0
+                for i in range(options.repeat):
+                    result = compile_once(copy, allocator)
+                    if result is None:
+                        break
+                    times.append(result[0])
+                    alloctimes.append(result[1])
+                    coalesced = result[2]
+                    asm = result[3]
+                if len(times) < options.repeat:
+                    print('%s (%s): compile failed' % (name, allocator), file=sys.stderr)
+                    failed.append(name)
+                    continue
+                m, c = mean_ci(alloctimes)
+                alloc = '%s +- %s' % (fmt(m), fmt(c))
+                m, c = mean_ci(times)
+                total = '%s +- %s' % (fmt(m), fmt(c))
+                print('%-12s %-8s %18s %18s %8d %8d %8d %9d' %
+                      ((name, allocator, alloc, total) + code_quality(asm) + (coalesced,)))
+    finally:
+        shutil.rmtree(workdir)
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,235 @@
+#! /usr/bin/python
+# vim: set ts=4 sw=4 expandtab:
+#
+# Benchmark harness.  Compiles every program in PROGRAMS in every mode in
+# MODES, runs each binary several times and writes the means, with 95%
+# confidence intervals, as gnuplot data files:
+#
+#   overhead.dat     sys/user/real time of one program without and with
+#                    reference counting, as plotted by paper/overhead.gnuplot
+#   treelatency.dat  worst dec_ref_ctr latency of test/tree.py for a range of
+#                    tree depths, as plotted by paper/treelatency.gnuplot
+#   runtime.dat      real time of every program in every mode, in the layout
+#                    of paper/slot_runtime.dat
+#   results.json     every sample, and the commit they were taken at
+#
+# The confidence interval columns come after the columns the paper's scripts
+# plot, so those scripts can be pointed at the output directory unchanged.
+#
+# Usage: bench.py [options] [program...]
+
+from __future__ import print_function
+import os, sys, shutil, subprocess, time, math, re, json
+from optparse import OptionParser
+
+BENCHDIR = os.path.dirname(os.path.abspath(__file__))
+COMPDIR = os.path.join(os.path.dirname(BENCHDIR), 'compiler')
+
+# name, source, stdin
+PROGRAMS = [
+    ('tree',        os.path.join(COMPDIR, 'test', 'tree.py'),        '8\n1\n'),
+    ('sieve',       os.path.join(COMPDIR, 'test', 'sieve.py'),       '121\n'),
+    ('allfeatures', os.path.join(COMPDIR, 'test', 'allfeatures.py'), ''),
+    ('classes',     os.path.join(BENCHDIR, 'programs', 'classes.py'), '20000\n'),
+    ('dicts',       os.path.join(BENCHDIR, 'programs', 'dicts.py'),   '20000\n'),
+]
+
+# name, title, compile.py options
+MODES = [
+    ('stack',       'Stack allocation',                        ['--allocator', 'stack']),
+    ('stack-norc',  'Stack allocation, no reference counting', ['--allocator', 'stack', '--no-refcount']),
+    ('reg',         'Register allocation',                     ['--allocator', 'reg']),
+    ('reg-norc',    'Register allocation, no reference counting', ['--allocator', 'reg', '--no-refcount']),
+    ('linear',      'Linear scan allocation',                  ['--allocator', 'linear']),
+    ('linear-norc', 'Linear scan allocation, no reference counting', ['--allocator', 'linear', '--no-refcount']),
+]
+
+# two-sided 95% quantiles of Student's t distribution, by degrees of freedom
+T95 = [None, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
+       2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093,
+       2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045,
+       2.042]
+
+def mean_ci(samples):
+    """Returns the mean of samples and the half width of its 95% confidence
+    interval."""
+    n = len(samples)
+    if n == 0:
+        return float('nan'), float('nan')
+    mean = sum(samples) / float(n)
+    if n == 1:
+        return mean, float('nan')
+    var = sum([(x - mean) ** 2 for x in samples]) / (n - 1)
+    t = T95[n - 1] if n - 1 < len(T95) else 1.960
+    return mean, t * math.sqrt(var / n)
+
+def compile_program(name, source, mode, flags, runtime, builddir, timeout):
+    """Compiles source into builddir/<mode>/<runtime>/<name> and returns the
+    path of the binary, or None if it could not be built in time."""
+    d = os.path.join(builddir, mode, runtime)
+    if not os.path.isdir(d):
+        os.makedirs(d)
+    copy = os.path.join(d, name + '.py')
+    shutil.copy(source, copy)
+    cmd = [sys.executable, os.path.join(COMPDIR, 'compile.py'), '--runtime', runtime] + flags + [copy]
+    proc = subprocess.Popen(cmd)
+    deadline = time.time() + timeout
+    while proc.poll() is None:
+        if time.time() > deadline:
+            proc.kill()
+            proc.wait()
+            print('%s (%s): compile timed out' % (name, mode), file=sys.stderr)
+            return None
+        time.sleep(0.05)
+    if proc.returncode != 0:
+        print('%s (%s): compile failed' % (name, mode), file=sys.stderr)
+        return None
+    return os.path.join(d, name)
+
+def run_once(binary, stdin):
+    """Runs binary once and returns (real, user, sys, stderr)."""
+    devnull = open(os.devnull, 'w')
+    start = time.time()
+    proc = subprocess.Popen([binary], stdin=subprocess.PIPE, stdout=devnull,
+                            stderr=subprocess.PIPE, cwd=os.path.dirname(binary))
+    # wait4 gives us the child's rusage; communicate() would reap it first
+    proc.stdin.write(stdin.encode('ascii'))
+    proc.stdin.close()
+    err = proc.stderr.read().decode('ascii', 'replace')
+    pid, status, rusage = os.wait4(proc.pid, 0)
+    real = time.time() - start
+    proc.returncode = status
+    devnull.close()
+    return real, rusage.ru_utime, rusage.ru_stime, err
+
+def measure(binary, stdin, repeat):
+    samples = {'real': [], 'user': [], 'sys': [], 'latency': []}
+    for i in range(repeat):
+        real, user, sys_, err = run_once(binary, stdin)
+        samples['real'].append(real)
+        samples['user'].append(user)
+        samples['sys'].append(sys_)
+        m = re.search(r'dec_ref_ctr took (\d+)\.(\d+) seconds', err)
+        if m:
+            samples['latency'].append(int(m.group(1)) + int(m.group(2)) / 1e6)
+    return samples
+
+def fmt(x, digits=3):
+    if x != x:
+        return 'NaN'
+    return '%.*f' % (digits, x)
+
+def write_overhead(path, results, program):
+    # the paper compares no memory management against reference counting,
+    # both with the stack allocator
+    without = results.get((program, 'stack-norc'))
+    with_ = results.get((program, 'stack'))
+    f = open(path, 'w')
+    print('time "No memory management" "Reference counting" "No memory management 95% CI" "Reference counting 95% CI"', file=f)
+    for kind in ['sys', 'user', 'real']:
+        m0, c0 = mean_ci(without[kind] if without else [])
+        m1, c1 = mean_ci(with_[kind] if with_ else [])
+        print('%s %s %s %s %s' % (kind, fmt(m0), fmt(m1), fmt(c0), fmt(c1)), file=f)
+    f.close()
+
+def write_runtime(path, results, programs, modes):
+    f = open(path, 'w')
+    titles = ['"%s"' % title for name, title, flags in modes]
+    titles += ['"%s 95%% CI"' % title for name, title, flags in modes]
+    print('Benchmark ' + ' '.join(titles), file=f)
+    for program in programs:
+        means = []
+        cis = []
+        for mode in modes:
+            samples = results.get((program, mode[0]))
+            m, c = mean_ci(samples['real'] if samples else [])
+            means.append(fmt(m))
+            cis.append(fmt(c))
+        print('%-12s %s' % (program, ' '.join(means + cis)), file=f)
+    f.close()
+
+def tree_nodes(depth):
+    # test/tree.py gives every node four children, down to depth
+    return (4 ** (depth + 1) - 1) / 3
+
+def write_treelatency(path, latencies):
+    # depth, nodes, allocations (a list is an object plus its data array),
+    # mean worst-case dec_ref_ctr latency, and its confidence interval
+    f = open(path, 'w')
+    for depth, samples in latencies:
+        m, c = mean_ci(samples)
+        nodes = tree_nodes(depth)
+        print('%d %d %d %s %s' % (depth, nodes, 2 * nodes, fmt(m, 6), fmt(c, 6)), file=f)
+    f.close()
+
+def git_revision():
+    try:
+        proc = subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd=BENCHDIR,
+                                stdout=subprocess.PIPE, stderr=open(os.devnull, 'w'))
+        return proc.communicate()[0].decode('ascii').strip() or None
+    except OSError:
+        return None
+
+if __name__ == "__main__":
+    parser = OptionParser(usage='%prog [options] [program...]')
+    parser.add_option('-n', '--repeat', dest='repeat', type='int', default=10,
+                      help='run every binary N times (default: %default)')
+    parser.add_option('-m', '--modes', dest='modes', default=','.join([m[0] for m in MODES]),
+                      help='comma separated modes to run (default: %default)')
+    parser.add_option('-o', '--output', dest='output', default=os.path.join(BENCHDIR, 'results'),
+                      help='directory for the .dat files (default: %default)')
+    parser.add_option('--build-dir', dest='builddir', default=os.path.join(BENCHDIR, 'build'),
+                      help='directory for the compiled programs (default: %default)')
+    parser.add_option('--overhead-program', dest='overhead', default='allfeatures',
+                      help='program overhead.dat is measured with (default: %default)')
+    parser.add_option('--max-depth', dest='maxdepth', type='int', default=8,
+                      help='deepest tree for treelatency.dat, 0 to skip (default: %default)')
+    parser.add_option('--compile-timeout', dest='timeout', type='float', default=600,
+                      help='give up on compiling a program after this many seconds (default: %default)')
+    (options, args) = parser.parse_args()
+
+    programs = [p for p in PROGRAMS if not args or p[0] in args]
+    modes = [m for m in MODES if m[0] in options.modes.split(',')]
+    if not os.path.isdir(options.output):
+        os.makedirs(options.output)
+
+    # timings use the release runtime, so pymem bookkeeping is not measured
+    results = {}
+    for name, source, stdin in programs:
+        for mode, title, flags in modes:
+            binary = compile_program(name, source, mode, flags, 'release', options.builddir, options.timeout)
+            if binary is None:
+                continue
+            samples = measure(binary, stdin, options.repeat)
+            results[(name, mode)] = samples
+            m, c = mean_ci(samples['real'])
+            print('%-12s %-12s %8ss +- %ss' % (name, mode, fmt(m), fmt(c)))
+
+    # latency needs the instrumented runtime, which times dec_ref_ctr
+    latencies = []
+    if options.maxdepth > 0:
+        tree = [p for p in PROGRAMS if p[0] == 'tree'][0]
+        binary = compile_program('tree', tree[1], 'stack', ['--allocator', 'stack'],
+                                 'instrumented', options.builddir, options.timeout)
+        if binary is not None:
+            for depth in range(1, options.maxdepth + 1):
+                samples = measure(binary, '%d\n1\n' % depth, options.repeat)
+                latencies.append((depth, samples['latency']))
+                m, c = mean_ci(samples['latency'])
+                print('tree depth %-2d latency %ss +- %ss' % (depth, fmt(m, 6), fmt(c, 6)))
+
+    names = [p[0] for p in programs]
+    if options.overhead in names:
+        write_overhead(os.path.join(options.output, 'overhead.dat'), results, options.overhead)
+    write_runtime(os.path.join(options.output, 'runtime.dat'), results, names, modes)
+    if latencies:
+        write_treelatency(os.path.join(options.output, 'treelatency.dat'), latencies)
+
+    f = open(os.path.join(options.output, 'results.json'), 'w')
+    json.dump({'revision': git_revision(),
+               'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'repeat': options.repeat,
+               'results': [{'program': p, 'mode': m, 'samples': s} for (p, m), s in sorted(results.items())],
+               'treelatency': [{'depth': d, 'samples': s} for d, s in latencies]},
+              f, indent=2, sort_keys=True)
+    f.close()
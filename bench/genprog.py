@@ -0,0 +1,199 @@
+#! /usr/bin/python
+# vim: set ts=4 sw=4 expandtab:
+#
+# Generates large, valid P3 programs for compile-time scaling tests.  The
+# programs only use what the compiler supports: integer arithmetic, lists,
+# dicts, if, while, print, lambdas (including ones that close over globals)
+# and classes with attributes and methods.  Every variable is defined before
+# it is used and every loop runs a fixed number of times, so the output also
+# runs under CPython.
+#
+# Usage: genprog.py [options] > big.py
+
+import sys, random
+from optparse import OptionParser
+
+class ProgramGenerator(object):
+    def __init__(self, statements=1000, depth=3, lambdas=10, classes=5, exprdepth=3, seed=0):
+        self.statements = statements
+        self.depth = depth
+        self.lambdas = lambdas
+        self.classes = classes
+        self.exprdepth = exprdepth
+        self.rand = random.Random(seed)
+        self.count = 0
+        self.names = 0
+
+    def fresh(self, prefix='v'):
+        self.names += 1
+        return '%s%d' % (prefix, self.names)
+
+    def generate(self):
+        self.count = 0
+        lines = []
+        scope = ['v0']
+        lines.append('v0 = 1')
+        # spread the lambdas and classes evenly through the program
+        defs = ['lambda'] * self.lambdas + ['class'] * self.classes
+        self.rand.shuffle(defs)
+        every = max(1, self.statements // (len(defs) + 1))
+        funcs = []
+        objects = []
+        while self.count < self.statements:
+            if defs and self.count >= every * (self.lambdas + self.classes - len(defs) + 1):
+                kind = defs.pop()
+                if kind == 'lambda':
+                    lines.extend(self.gen_lambda(scope, funcs))
+                else:
+                    lines.extend(self.gen_class(scope, objects))
+                continue
+            lines.extend(self.gen_stmt('', scope, self.depth, funcs, objects))
+        lines.append('print %s' % ' + '.join(scope[-5:]))
+        return '\n'.join(lines) + '\n'
+
+    # statements
+    # ================================================================================
+    def gen_stmt(self, indent, scope, depth, funcs, objects):
+        r = self.rand.random()
+        if depth > 0 and r < 0.10:
+            return self.gen_if(indent, scope, depth, funcs, objects)
+        if depth > 0 and r < 0.18:
+            return self.gen_while(indent, scope, depth, funcs, objects)
+        if r < 0.25:
+            self.count += 1
+            return ['%sprint %s' % (indent, self.gen_expr(scope, self.exprdepth))]
+        if funcs and r < 0.35:
+            self.count += 1
+            name, nargs = self.rand.choice(funcs)
+            args = ', '.join([self.gen_expr(scope, 1) for i in range(nargs)])
+            var = self.fresh()
+            scope.append(var)
+            return ['%s%s = %s(%s)' % (indent, var, name, args)]
+        if objects and r < 0.45:
+            self.count += 1
+            obj, cls = self.rand.choice(objects)
+            var = self.fresh()
+            if self.rand.random() < 0.5:
+                stmt = '%s%s = %s.get(%s)' % (indent, var, obj, self.gen_expr(scope, 1))
+            else:
+                stmt = '%s%s = %s.a + %s.k' % (indent, var, obj, cls)
+            scope.append(var)
+            return [stmt]
+        if r < 0.50:
+            self.count += 2
+            lst = self.fresh('l')
+            var = self.fresh()
+            lines = ['%s%s = [%s, %s]' % (indent, lst, self.gen_expr(scope, 1), self.gen_expr(scope, 1)),
+                     '%s%s = %s[%d]' % (indent, var, lst, self.rand.randint(0, 1))]
+            scope.append(var)
+            return lines
+        if r < 0.55:
+            self.count += 2
+            d = self.fresh('d')
+            var = self.fresh()
+            lines = ['%s%s = {0: %s, 1: %s}' % (indent, d, self.gen_expr(scope, 1), self.gen_expr(scope, 1)),
+                     '%s%s = %s[%d]' % (indent, var, d, self.rand.randint(0, 1))]
+            scope.append(var)
+            return lines
+        self.count += 1
+        var = self.fresh()
+        stmt = '%s%s = %s' % (indent, var, self.gen_expr(scope, self.exprdepth))
+        scope.append(var)
+        return [stmt]
+
+    def gen_block(self, indent, scope, depth, funcs, objects):
+        # names assigned in a block might not be assigned when it is skipped,
+        # so they are only visible inside it
+        inner = list(scope)
+        lines = []
+        for i in range(self.rand.randint(1, 4)):
+            lines.extend(self.gen_stmt(indent, inner, depth, funcs, objects))
+        return lines
+
+    def gen_if(self, indent, scope, depth, funcs, objects):
+        self.count += 1
+        lines = ['%sif %s:' % (indent, self.gen_cond(scope))]
+        lines.extend(self.gen_block(indent + '    ', scope, depth - 1, funcs, objects))
+        lines.append('%selse:' % indent)
+        lines.extend(self.gen_block(indent + '    ', scope, depth - 1, funcs, objects))
+        return lines
+
+    def gen_while(self, indent, scope, depth, funcs, objects):
+        self.count += 3
+        i = self.fresh('i')
+        lines = ['%s%s = 0' % (indent, i),
+                 '%swhile %s != %d:' % (indent, i, self.rand.randint(1, 3))]
+        lines.extend(self.gen_block(indent + '    ', scope + [i], depth - 1, funcs, objects))
+        lines.append('%s    %s = %s + 1' % (indent, i, i))
+        return lines
+
+    def gen_lambda(self, scope, funcs):
+        self.count += 1
+        name = self.fresh('f')
+        nargs = self.rand.randint(1, 3)
+        params = ['a%d' % i for i in range(nargs)]
+        # close over a couple of the globals defined so far
+        body = self.gen_expr(params + self.rand.sample(scope, min(2, len(scope))), self.exprdepth)
+        funcs.append((name, nargs))
+        return ['%s = lambda %s: %s' % (name, ', '.join(params), body)]
+
+    def gen_class(self, scope, objects):
+        self.count += 7
+        cls = self.fresh('C')
+        obj = self.fresh('o')
+        objects.append((obj, cls))
+        return ['class %s:' % cls,
+                '    k = %d' % self.rand.randint(0, 9),
+                '    def __init__(self, a):',
+                '        self.a = a',
+                '    def get(self, b):',
+                '        return %s' % self.gen_expr(['self.a', 'b'], 2),
+                '%s = %s(%s)' % (obj, cls, self.gen_expr(scope, 1))]
+
+    # expressions
+    # ================================================================================
+    def gen_expr(self, scope, depth):
+        r = self.rand.random()
+        if depth <= 0 or r < 0.25:
+            if r < 0.15:
+                return str(self.rand.randint(0, 9))
+            return self.rand.choice(scope)
+        if r < 0.55:
+            return '%s + %s' % (self.gen_expr(scope, depth - 1), self.gen_expr(scope, depth - 1))
+        if r < 0.65:
+            return '-(%s)' % self.gen_expr(scope, depth - 1)
+        if r < 0.85:
+            return '(%s if %s else %s)' % (self.gen_expr(scope, depth - 1), self.gen_cond(scope),
+                                           self.gen_expr(scope, depth - 1))
+        return '[%s, %s][%d]' % (self.gen_expr(scope, depth - 1), self.gen_expr(scope, depth - 1),
+                                 self.rand.randint(0, 1))
+
+    def gen_cond(self, scope):
+        op = self.rand.choice(['==', '!='])
+        cond = '%s %s %s' % (self.gen_expr(scope, 1), op, self.gen_expr(scope, 1))
+        r = self.rand.random()
+        if r < 0.2:
+            return 'not (%s)' % cond
+        if r < 0.4:
+            return '(%s) and (%s %s %s)' % (cond, self.rand.choice(scope), op, self.rand.choice(scope))
+        return cond
+
+if __name__ == "__main__":
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--statements', dest='statements', type='int', default=1000,
+                      help='approximate number of statements (default: %default)')
+    parser.add_option('-d', '--depth', dest='depth', type='int', default=3,
+                      help='maximum nesting of if and while (default: %default)')
+    parser.add_option('-l', '--lambdas', dest='lambdas', type='int', default=10,
+                      help='number of lambdas (default: %default)')
+    parser.add_option('-c', '--classes', dest='classes', type='int', default=5,
+                      help='number of classes (default: %default)')
+    parser.add_option('-e', '--expr-depth', dest='exprdepth', type='int', default=3,
+                      help='maximum depth of expressions (default: %default)')
+    parser.add_option('-s', '--seed', dest='seed', type='int', default=0,
+                      help='random seed (default: %default)')
+    (options, args) = parser.parse_args()
+
+    gen = ProgramGenerator(options.statements, options.depth, options.lambdas,
+                           options.classes, options.exprdepth, options.seed)
+    sys.stdout.write(gen.generate())
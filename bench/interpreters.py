@@ -0,0 +1,91 @@
+#! /usr/bin/python
+# vim: set ts=4 sw=4 expandtab:
+#
+# Compile time under different Python interpreters.  Compiles every program
+# in bench.PROGRAMS with compile.py run by each interpreter given with
+# --python (default: python2 and python3), --repeat times, and prints the
+# mean wall time of each with its 95% confidence interval, and how much
+# slower than the first interpreter the others are.  The time includes
+# starting the interpreter and loading the parser tables, as in a test run.
+#
+# The assembly is compared as well: whichever interpreter runs the compiler,
+# it has to write the same .s file.
+#
+# Exits with status 1 if a compile fails or the assembly differs.
+#
+# Usage: interpreters.py [options] [program...]
+
+from __future__ import print_function
+import os, sys, shutil, subprocess, tempfile, time
+from optparse import OptionParser
+
+from bench import PROGRAMS, MODES, COMPDIR, mean_ci, fmt
+
+def compile_once(python, source, flags):
+    """Compiles source with compile.py run by python and returns (wall
+    time, assembly), or None if the compile failed."""
+    cmd = [python, os.path.join(COMPDIR, 'compile.py')] + flags + [source]
+    start = time.time()
+    retcode = subprocess.call(cmd)
+    t = time.time() - start
+    if retcode != 0:
+        return None
+    f = open(os.path.splitext(source)[0] + '.s')
+    asm = f.read()
+    f.close()
+    return t, asm
+
+if __name__ == "__main__":
+    parser = OptionParser(usage='%prog [options] [program...]')
+    parser.add_option('-p', '--python', dest='pythons', action='append', default=[],
+                      help='interpreter to run compile.py with; may be repeated '
+                           '(default: python2 and python3)')
+    parser.add_option('-n', '--repeat', dest='repeat', type='int', default=5,
+                      help='compile every program N times with each interpreter (default: %default)')
+    parser.add_option('-m', '--mode', dest='mode', default='stack',
+                      choices=[m[0] for m in MODES],
+                      help='compile.py options, one of the modes of bench.py (default: %default)')
+    (options, args) = parser.parse_args()
+
+    pythons = options.pythons or ['python2', 'python3']
+    programs = [p for p in PROGRAMS if not args or p[0] in args]
+    flags = [m[2] for m in MODES if m[0] == options.mode][0]
+
+    print('%-12s %s' % ('program', ' '.join(['%22s' % os.path.basename(p) for p in pythons])))
+    failed = []
+    workdir = tempfile.mkdtemp(prefix='interpreters')
+    try:
+        for name, source, stdin in programs:
+            copy = os.path.join(workdir, name + '.py')
+            shutil.copy(source, copy)
+            columns = []
+            first = None
+            outputs = set()
+            for python in pythons:
+                samples = []
+                for i in range(options.repeat):
+                    result = compile_once(python, copy, flags)
+                    if result is None:
+                        break
+                    samples.append(result[0])
+                    outputs.add(result[1])
+                if len(samples) < options.repeat:
+                    print('%s (%s): compile failed' % (name, python), file=sys.stderr)
+                    failed.append(name)
+                    columns.append('%22s' % 'failed')
+                    continue
+                m, c = mean_ci(samples)
+                if first is None:
+                    first = m
+                    columns.append('%22s' % ('%ss +- %s' % (fmt(m), fmt(c))))
+                else:
+                    columns.append('%22s' % ('%ss +- %s %5.2fx' % (fmt(m), fmt(c), m / first)))
+            if len(outputs) > 1:
+                print('%s: the assembly differs between interpreters' % name, file=sys.stderr)
+                failed.append(name)
+            print('%-12s %s' % (name, ' '.join(columns)))
+    finally:
+        shutil.rmtree(workdir)
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,82 @@
+#! /usr/bin/python
+# vim: set ts=4 sw=4 expandtab:
+#
+# Parse throughput benchmark.  Generates a program of --statements statements
+# with genprog.py (or reads the given files), parses it --repeat times with
+# the compiler's PLY parser (p0parser, which compile.py uses) and with the
+# standard library's compiler.parse, and prints the best time of each in
+# lines per second.  The trees are compared too, so a parser that is fast
+# because it gets something wrong is caught.  Building the PLY parser from
+# its shipped tables is timed separately, it is paid once per compile.py run.
+# Python 3 has no compiler package; there only the PLY parser is timed.
+#
+# Exits with status 1 if the trees differ.
+#
+# Usage: parse.py [options] [source-files...]
+
+from __future__ import print_function
+import sys, time
+from optparse import OptionParser
+
+from genprog import ProgramGenerator
+from scaling import COMPDIR
+
+sys.path.insert(0, COMPDIR)
+try:
+    import compiler
+except ImportError:
+    compiler = None
+from p0parser import P0Parser
+
+def best_time(func, text, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func(text)
+        t = time.time() - start
+        if best is None or t < best:
+            best = t
+    return best
+
+if __name__ == "__main__":
+    parser = OptionParser(usage='%prog [options] [source-files...]')
+    parser.add_option('-n', '--statements', dest='statements', type='int', default=20000,
+                      help='statements in the generated program (default: %default)')
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=5,
+                      help='parses of each program, the fastest counts (default: %default)')
+    parser.add_option('-s', '--seed', dest='seed', type='int', default=0,
+                      help='random seed (default: %default)')
+    (options, args) = parser.parse_args()
+
+    sys.setrecursionlimit(100000)
+    sources = []
+    for path in args:
+        f = open(path, 'r')
+        sources.append((path, f.read() + '\n'))
+        f.close()
+    if not sources:
+        source = ProgramGenerator(options.statements, 3, 10, 5, 3, options.seed).generate()
+        sources.append(('%d statements' % options.statements, source + '\n'))
+
+    start = time.time()
+    ply = P0Parser()
+    ply.build()
+    print('building the PLY parser from its tables: %.3fs' % (time.time() - start))
+    print()
+
+    failed = []
+    print('%-30s %8s %12s %12s %8s' % ('program', 'lines', 'ply (l/s)', 'stdlib (l/s)', 'speedup'))
+    for name, text in sources:
+        lines = text.count('\n')
+        t_ply = best_time(ply.parse, text, options.repeat)
+        if compiler is None:
+            print('%-30s %8d %12.0f %12s %8s' % (name, lines, lines / t_ply, '-', '-'))
+            continue
+        if str(ply.parse(text)) != str(compiler.parse(text)):
+            failed.append(name)
+        t_std = best_time(compiler.parse, text, options.repeat)
+        print('%-30s %8d %12.0f %12.0f %7.2fx' % (name, lines, lines / t_ply, lines / t_std, t_std / t_ply))
+
+    if failed:
+        print('trees differ: %s' % ', '.join(failed), file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,29 @@
+# vim: set ts=4 sw=4 expandtab:
+# class-heavy workload: object creation, attribute access, bound method
+# calls and inheritance
+class Point:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def add(self, other):
+        return Point(self.x + other.x, self.y + other.y)
+
+class Counter(Point):
+    def bump(self, p):
+        self.x = self.x + p.x
+        self.y = self.y + p.y
+        return self
+
+n = input()
+acc = Point(0, 0)
+cnt = Counter(0, 0)
+i = 0
+while i != n:
+    p = Point(i, 1)
+    acc = acc.add(p)
+    cnt = cnt.bump(p)
+    i = i + 1
+print acc.x
+print acc.y
+print cnt.x == acc.x
@@ -0,0 +1,17 @@
+# vim: set ts=4 sw=4 expandtab:
+# dict-heavy workload: insertion, lookup and overwrite of int and list values
+n = input()
+d = {}
+i = 0
+while i != n:
+    d[i] = [i, i + 1]
+    i = i + 1
+
+total = 0
+i = 0
+while i != n:
+    total = total + d[i][1]
+    d[i] = total
+    i = i + 1
+print total
+print d[n + -1]
@@ -0,0 +1,157 @@
+#! /usr/bin/python
+# vim: set ts=4 sw=4 expandtab:
+#
+# Compile-time scaling benchmark.  Generates programs of increasing size with
+# genprog.py, compiles each with compile.py --stats-json and fits
+# time = c * size^k for every pass by least squares on the log-log points,
+# where size is the number of AST nodes of the parsed program.  k is the
+# growth exponent: about 1 for a linear pass, 2 for a quadratic one.
+#
+# Exits with status 1 if a pass grows faster than its budget.  Passes that
+# take less than --min-time even on the largest program are reported but not
+# judged, their times are mostly noise.
+#
+# Usage: scaling.py [options]
+
+from __future__ import print_function
+import os, sys, subprocess, tempfile, shutil, math, json
+from optparse import OptionParser
+
+from genprog import ProgramGenerator
+
+BENCHDIR = os.path.dirname(os.path.abspath(__file__))
+COMPDIR = os.path.join(os.path.dirname(BENCHDIR), 'compiler')
+
+DEFAULT_BUDGET = 1.5
+
+def compile_stats(path, flags):
+    """Compiles path and returns its list of per-pass records."""
+    statsfile = path + '.json'
+    cmd = [sys.executable, os.path.join(COMPDIR, 'compile.py'), '--stats-json', statsfile] + flags + [path]
+    retcode = subprocess.call(cmd)
+    if retcode != 0:
+        raise Exception('compile.py failed on %s' % path)
+    f = open(statsfile)
+    stats = json.load(f)
+    f.close()
+    return stats[0]['passes']
+
+def fit_exponent(points):
+    """Least squares slope of log(time) against log(size)."""
+    points = [(math.log(x), math.log(y)) for x, y in points if x > 0 and y > 0]
+    if len(points) < 2:
+        return None
+    n = float(len(points))
+    mx = sum([x for x, y in points]) / n
+    my = sum([y for x, y in points]) / n
+    sxx = sum([(x - mx) ** 2 for x, y in points])
+    if sxx == 0:
+        return None
+    return sum([(x - mx) * (y - my) for x, y in points]) / sxx
+
+def parse_budgets(specs):
+    budgets = {}
+    for spec in specs:
+        if '=' not in spec:
+            raise Exception("Expected --budget PASS=EXPONENT, got '%s'" % spec)
+        name, value = spec.split('=', 1)
+        budgets[name] = float(value)
+    return budgets
+
+if __name__ == "__main__":
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--sizes', dest='sizes', default='50,100,200,400',
+                      help='comma separated statement counts to generate (default: %default)')
+    parser.add_option('-d', '--depth', dest='depth', type='int', default=3,
+                      help='maximum nesting of if and while (default: %default)')
+    parser.add_option('-e', '--expr-depth', dest='exprdepth', type='int', default=3,
+                      help='maximum depth of expressions (default: %default)')
+    parser.add_option('--lambdas-per', dest='lambdas_per', type='int', default=20,
+                      help='one lambda per N statements (default: %default)')
+    parser.add_option('--classes-per', dest='classes_per', type='int', default=40,
+                      help='one class per N statements (default: %default)')
+    parser.add_option('-s', '--seed', dest='seed', type='int', default=0,
+                      help='random seed (default: %default)')
+    parser.add_option('-n', '--repeat', dest='repeat', type='int', default=3,
+                      help='compile every program N times and keep the fastest (default: %default)')
+    parser.add_option('--budget', dest='budgets', action='append', default=[],
+                      help='PASS=EXPONENT, allowed growth of one pass; may be repeated')
+    parser.add_option('--default-budget', dest='default_budget', type='float', default=DEFAULT_BUDGET,
+                      help='allowed growth of passes without a --budget (default: %default)')
+    parser.add_option('--min-time', dest='min_time', type='float', default=0.05,
+                      help='only judge passes that take at least this long on the largest program (default: %default)')
+    parser.add_option('--allocator', dest='allocator', default='stack',
+                      help='allocator to compile with (default: %default)')
+    parser.add_option('--json', dest='json', default=None,
+                      help='also write the measurements and exponents to this file')
+    parser.add_option('--keep', dest='keep', default=None,
+                      help='generate the programs into this directory and keep them')
+    (options, args) = parser.parse_args()
+
+    budgets = parse_budgets(options.budgets)
+    sizes = [int(s) for s in options.sizes.split(',')]
+    flags = ['--allocator', options.allocator]
+    workdir = options.keep or tempfile.mkdtemp(prefix='scaling')
+    if not os.path.isdir(workdir):
+        os.makedirs(workdir)
+
+    # pass -> [(program size, fastest time)]
+    points = {}
+    order = []
+    try:
+        for n in sizes:
+            gen = ProgramGenerator(n, options.depth, n // options.lambdas_per, n // options.classes_per,
+                                   options.exprdepth, options.seed)
+            path = os.path.join(workdir, 'gen%d.py' % n)
+            f = open(path, 'w')
+            f.write(gen.generate())
+            f.close()
+
+            best = {}
+            size = None
+            for i in range(options.repeat):
+                for record in compile_stats(path, flags):
+                    name = record['name']
+                    if size is None:
+                        # the first pass sees the parsed program
+                        size = record['size_before']
+                    if name not in best or record['time'] < best[name]:
+                        best[name] = record['time']
+                    if name not in order:
+                        order.append(name)
+            best['total'] = sum(best.values())
+            for name, t in best.items():
+                points.setdefault(name, []).append((size, t))
+            print('%6d statements %8d nodes %9.3fs' % (n, size, best['total']))
+    finally:
+        if options.keep is None:
+            shutil.rmtree(workdir)
+
+    failed = []
+    results = []
+    print()
+    print('%-15s %9s %9s %9s' % ('pass', 'time (s)', 'exponent', 'budget'))
+    for name in order + ['total']:
+        k = fit_exponent(points[name])
+        budget = budgets.get(name, options.default_budget)
+        largest = points[name][-1][1]
+        judged = k is not None and largest >= options.min_time
+        status = ''
+        if judged and k > budget:
+            status = 'OVER BUDGET'
+            failed.append(name)
+        elif not judged:
+            status = '(too fast to judge)'
+        print('%-15s %9.4f %9s %9.2f %s' % (name, largest, '%.2f' % k if k is not None else '-', budget, status))
+        results.append({'name': name, 'points': points[name], 'exponent': k,
+                        'budget': budget, 'judged': judged})
+
+    if options.json:
+        f = open(options.json, 'w')
+        json.dump({'sizes': sizes, 'allocator': options.allocator, 'passes': results},
+                  f, indent=2, sort_keys=True)
+        f.close()
+
+    if failed:
+        print('over budget: %s' % ', '.join(failed), file=sys.stderr)
+        sys.exit(1)
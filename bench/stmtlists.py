@@ -0,0 +1,111 @@
+#! /usr/bin/python
+# vim: set ts=4 sw=4 expandtab:
+#
+# Regression benchmark for building statement and instruction lists.  Passes
+# that join the results of every statement of a block into one list used to
+# do it with reduce(lambda x,y: x+y, ...), which is quadratic in the number
+# of statements.  This generates a single module of --statements statements
+# (straight-line code with if and while one level deep, no functions or
+# classes), and a few halvings of it, and runs the front end, flattening and
+# both instruction selectors on them in this process, then Statement.reads()
+# and writes() over the selected instructions.  Growth exponents are fitted the
+# same way scaling.py does, with the number of statements as the size.
+#
+# Exits with status 1 if a pass grows faster than --budget.
+#
+# Usage: stmtlists.py [options]
+
+from __future__ import print_function
+import os, sys, time, gc
+from optparse import OptionParser
+
+from genprog import ProgramGenerator
+from scaling import fit_exponent, COMPDIR
+
+sys.path.insert(0, COMPDIR)
+import compiler
+from comp_util import VariableAllocator
+from passstats import PassStats, run_pass
+from p1insselector import LabelAllocator
+from p3flattener import P3Flattener
+from p3insselector import P3InstructionSelector
+from p3ifinsselector import P3IfInstructionSelector
+from compile import frontend
+
+def statement_rw(program):
+    count = 0
+    for statement in program.statements:
+        count += len(statement.writes()) + len(statement.reads())
+    return count
+
+def measure(n, seed, refcount):
+    """Compiles an n statement module and returns its PassStats."""
+    source = ProgramGenerator(n, 1, 0, 0, 1, seed).generate()
+    stats = PassStats()
+    varalloc = VariableAllocator(0, set())
+    ast = compiler.parse(source)
+    astlist = frontend(ast, varalloc, stats, refcount)
+    del ast
+    # the module is the only function
+    flatast = run_pass(stats, 'flatten', P3Flattener(varalloc).flatten, astlist[0], varalloc)
+    del astlist
+    selector = P3InstructionSelector(varalloc, LabelAllocator('0_'))
+    program = run_pass(stats, 'insselect', selector.visit, flatast, varalloc)
+    del flatast
+    # lower if and while to jumps, every instruction then has reads/writes
+    ifselector = P3IfInstructionSelector(varalloc, selector.labelalloc)
+    program = run_pass(stats, 'ifinsselect', ifselector.visit, program, varalloc)
+    start = time.time()
+    statement_rw(program)
+    stats.add('reads/writes', {'calls': 1, 'time': time.time() - start, 'maxrss_kb': 0,
+                               'rss_growth_kb': 0, 'size_before': 0, 'size_after': 0, 'temps': 0})
+    return stats
+
+if __name__ == "__main__":
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--statements', dest='statements', type='int', default=50000,
+                      help='statements in the largest module (default: %default)')
+    parser.add_option('--steps', dest='steps', type='int', default=4,
+                      help='number of sizes, each half the next (default: %default)')
+    parser.add_option('-s', '--seed', dest='seed', type='int', default=0,
+                      help='random seed (default: %default)')
+    parser.add_option('--no-refcount', dest='refcount', action='store_false', default=True,
+                      help='leave out reference counting')
+    parser.add_option('--budget', dest='budget', type='float', default=1.3,
+                      help='allowed growth exponent of every pass (default: %default)')
+    parser.add_option('--min-time', dest='min_time', type='float', default=0.05,
+                      help='only judge passes that take at least this long on the largest module (default: %default)')
+    (options, args) = parser.parse_args()
+
+    sys.setrecursionlimit(100000)
+    sizes = [options.statements >> i for i in reversed(range(options.steps))]
+    points = {}
+    order = []
+    for n in sizes:
+        stats = measure(n, options.seed, options.refcount)
+        total = 0.0
+        for name in stats.passes:
+            t = stats.records[name]['time']
+            total += t
+            points.setdefault(name, []).append((n, t))
+            if name not in order:
+                order.append(name)
+        print('%6d statements %9.3fs' % (n, total))
+        del stats
+        gc.collect()
+
+    failed = []
+    print()
+    print('%-16s %9s %9s' % ('pass', 'time (s)', 'exponent'))
+    for name in order:
+        k = fit_exponent(points[name])
+        largest = points[name][-1][1]
+        status = ''
+        if k is not None and largest >= options.min_time and k > options.budget:
+            status = 'OVER BUDGET'
+            failed.append(name)
+        print('%-16s %9.4f %9s %s' % (name, largest, '%.2f' % k if k is not None else '-', status))
+
+    if failed:
+        print('over budget (%.2f): %s' % (options.budget, ', '.join(failed)), file=sys.stderr)
+        sys.exit(1)
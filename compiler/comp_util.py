@@ -1,17 +1,41 @@
 # vim: set ts=4 sw=4 expandtab:
 
-from compiler.ast import *
+from pyast import *
 import itertools,heapq
 from p1explicate import *
+from x86ir import OperandTable
 
-squash = lambda fv_args: reduce(lambda a,b : a | b, fv_args, set([]))
+def concat(lists):
+    """Joins a sequence of lists into one list.  Unlike reduce'ing them
+    together with +, this copies every element once, so it stays linear in
+    the length of the result."""
+    result = []
+    for l in lists:
+        result.extend(l)
+    return result
+
+def union(sets):
+    """Union of a sequence of sets, in linear time (see concat)."""
+    result = set()
+    for s in sets:
+        result.update(s)
+    return result
+
+squash = union
 
 class VariableAllocator:
     """Provides context allocating variables by storing a set
     of currently used variables and the next variable number"""
-    def __init__(self, varnum=0, varset=set()):
+    def __init__(self, varnum=0, varset=None):
         self.varnum = varnum
+        # a default of set() would be one set shared by every allocator
+        if varset is None:
+            varset = set()
         self.varset = varset
+        # number of temporaries handed out, for compile.py --time-passes
+        self.allocated = 0
+        # the Var objects of the function being compiled
+        self.operands = OperandTable()
 
     def add_var(self, varname):
         self.varset.add(varname)
@@ -24,11 +48,16 @@ class VariableAllocator:
             if varname not in self.varset:
                 done = True
         self.add_var(varname)
+        self.allocated = self.allocated + 1
         return varname
 
     def is_allocated(self, varname):
         return varname in self.varset
 
+    def var(self, varname, spillable=True):
+        """Returns the x86ir.Var for varname."""
+        return self.operands.var(varname, spillable)
+
     def __str__(self):
         return 'VariableAllocator(%s,%s)' % (self.varnum, self.varset)
 
@@ -38,11 +67,10 @@ class priorityq:
     a given task and invalidate a task.  Taken from the python
     documentation here: http://docs.python.org/library/heapq.html
     Modified slightly."""
-    INVALID = -1            # special const to mark an entry as deleted
     def __init__(self):
         self.pq = []                      # the priority queue list
         self.counter = itertools.count(1) # unique sequence count
-        self.task_finder = {}             # mapping of tasks to entries
+        self.task_finder = {}             # mapping of tasks to live entries
 
     def add_task(self, priority, task, count=None):
         if count is None:
@@ -52,26 +80,72 @@ class priorityq:
         heapq.heappush(self.pq, entry)
 
     def get_top_priority(self):
+        # entries are never modified once pushed (that would break the
+        # heap invariant); stale ones are recognised by no longer being
+        # the live entry for their task
         while True:
-            priority, count, task = heapq.heappop(self.pq)
-            if count is not priorityq.INVALID:
+            entry = heapq.heappop(self.pq)
+            priority, count, task = entry
+            if self.task_finder.get(task) is entry:
                 del self.task_finder[task]
                 return priority, task
 
     def delete_task(self, task):
-        entry = self.task_finder[task]
-        entry[1] = priorityq.INVALID
+        del self.task_finder[task]
 
     def reprioritize(self, priority, task):
         entry = self.task_finder[task]
         self.add_task(priority, task, entry[1])
-        entry[1] = priorityq.INVALID
 
     def incr_priority(self, task, inc=1):
         entry = self.task_finder[task]
         self.reprioritize(entry[0]-inc, task)
 
 
+class bucketq(object):
+    """priorityq for priorities and counts that are integers, as the
+    saturations of color_graph are: a heap of counts for every priority, and
+    a heap of the priorities.  Tasks come out in the same order as from
+    priorityq, but a reprioritized task only leaves its count behind in the
+    old heap instead of a whole entry, and the heaps compare integers."""
+    def __init__(self):
+        self.buckets = {}                 # priority -> heap of counts
+        self.levels = []                  # heap of the keys of buckets
+        self.counter = itertools.count(1)
+        self.task_finder = {}             # task -> its count and priority
+        self.tasks = {}                   # count -> task
+
+    def add_task(self, priority, task, count=None):
+        if count is None:
+            count = next(self.counter)
+        self.task_finder[task] = (count, priority)
+        self.tasks[count] = task
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            bucket = self.buckets[priority] = []
+            heapq.heappush(self.levels, priority)
+        heapq.heappush(bucket, count)
+
+    def get_top_priority(self):
+        while True:
+            priority = self.levels[0]
+            bucket = self.buckets[priority]
+            while bucket:
+                count = heapq.heappop(bucket)
+                task = self.tasks[count]
+                if self.task_finder.get(task) == (count, priority):
+                    del self.task_finder[task]
+                    return priority, task
+            del self.buckets[priority]
+            heapq.heappop(self.levels)
+
+    def delete_task(self, task):
+        del self.task_finder[task]
+
+    def reprioritize(self, priority, task):
+        self.add_task(priority, task, self.task_finder[task][0])
+
+
 def prettyIndent(node,depth=0,indent='  '):
     """Given an AST node, print out a human readable form."""
     space=indent*depth
@@ -196,69 +270,66 @@ def prettyAST(node, depth=0, indent='  '):
         raise Exception('Encountered unhandled AST Node (%s)', node.__class__.__name__)
     return ret
 
-def free_vars(n):
-    if isinstance(n, Add):
-        return free_vars(n.left) | free_vars(n.right)
-    elif isinstance(n, UnarySub):
-        return free_vars(n.expr)
-    elif isinstance(n, CallFunc):
-        # the name of the function being called should be considered "free" (n.node)
-        return free_vars(n.node) | reduce(lambda x,y: x|y, [free_vars(x) for x in n.args], set([]))
-    elif isinstance(n, Const):
-        return set([])
+def _free_vars(n):
+    """
+    Returns the set of variables an explicated expression or statement refers
+    to without binding them.  The body of a Lambda is looked up in scopes, so
+    each Lambda is walked once however deeply Lambdas nest.
+    """
+    if isinstance(n, Module):
+        return scopes.free_vars(n.node) - scopes.local_assigns(n.node)
+    elif isinstance(n, Stmt):
+        return union([_free_vars(x) for x in n.nodes])
+    elif isinstance(n, Lambda):
+        return scopes.free_vars(n.code) - scopes.local_assigns(n.code) - set(n.argnames)
     elif isinstance(n, Name):
-        if n.name == 'True' or n.name == 'False':
-            return set([])
         return set([n.name])
-    elif isinstance(n, (Or,And)):
-        return free_vars(n.nodes[0]) + free_vars(n.nodes[1])
+    elif isinstance(n, Const):
+        return set([])
+    elif isinstance(n, (Assign,Discard,UnarySub,Not)):
+        return _free_vars(n.expr)
+    elif isinstance(n, Printnl):
+        return _free_vars(n.nodes[0])
+    elif isinstance(n, Return):
+        return _free_vars(n.value)
+    elif isinstance(n, Add):
+        return _free_vars(n.left) | _free_vars(n.right)
+    elif isinstance(n, (Or,And,List)):
+        return union([_free_vars(x) for x in n.nodes])
     elif isinstance(n, IfExp):
-        return free_vars(n.test) | free_vars(n.then) | free_vars(n.else_)
-    elif isinstance(n, List):
-        return reduce(lambda x,y: x|y, [free_vars(x) for x in n.nodes], set([]))
+        return _free_vars(n.test) | _free_vars(n.then) | _free_vars(n.else_)
     elif isinstance(n, Dict):
-        keys = reduce(lambda x,y: x|y, [free_vars(x[0]) for x in n.items], set([]))
-        values = reduce(lambda x,y: x|y, [free_vars(x[1]) for x in n.items], set([])) 
-        return keys | values
+        return union([_free_vars(k) | _free_vars(v) for (k,v) in n.items])
     elif isinstance(n, Compare):
-        return free_vars(n.ops[0][1]) | free_vars(n.expr)
-    elif isinstance(n, Not):
-        return free_vars(n.expr)
+        return _free_vars(n.expr) | _free_vars(n.ops[0][1])
     elif isinstance(n, Subscript):
-        return free_vars(n.expr) | free_vars(n.subs[0])
-    elif isinstance(n, Lambda):
-        return free_vars(n.code) - set(n.argnames)
-    elif isinstance(n, Class):
-        return free_vars(n.code)
-    elif isinstance(n, Stmt):        
-        return reduce(lambda x,y:x|y, [free_vars(x) for x in n.nodes], set([]))
-    elif isinstance(n, Printnl):
-        return reduce(lambda x,y:x|y, [free_vars(x) for x in n.nodes], set([]))
-    elif isinstance(n, Discard):
-        return free_vars(n.expr)
-    elif isinstance(n, Return):
-        return free_vars(n.value)
-    elif isinstance(n, Getattr):
-        return set([])
-    elif isinstance(n, AssAttr):
-        return set([])
-    elif isinstance(n, Function):
-        return set([n.name]) | set(n.argnames) | reduce(lambda x,y:x|y, [free_vars(x) for x in n.code], set([]))
-    elif isinstance(n, Assign):
-        return free_vars(n.expr)
+        return _free_vars(n.expr) | _free_vars(n.subs[0])
+    elif isinstance(n, CallFunc):
+        # the functions called directly are those of the runtime
+        return union([_free_vars(x) for x in n.args])
+    elif isinstance(n, CallFuncIndirect):
+        return union([_free_vars(x) for x in n.args]) | _free_vars(n.node)
+    elif isinstance(n, (InjectFrom,ProjectTo,GetTag)):
+        return _free_vars(n.arg)
+    elif isinstance(n, Let):
+        return (_free_vars(n.rhs) | _free_vars(n.body)) - set([n.var.name])
+    elif isinstance(n, While):
+        return _free_vars(n.test[1]) | _free_vars(n.body)
+    elif isinstance(n, If):
+        return _free_vars(n.tests[0][0]) | _free_vars(n.tests[0][1]) | _free_vars(n.else_)
     else:
-        raise Exception('Unhandled expression: "%s"' % n)
+        raise Exception('Unhandled node: %s' % n)
 
-def getLocalAssigns(n):
+def _local_assigns(n):
     """
     Returns the set of variables that are assigned to within the current scope,
     ignoring assignments in nested scopes (functions).
     """
     if isinstance(n, Module):
-        return getLocalAssigns(n.node)
+        return _local_assigns(n.node)
     elif isinstance(n, Stmt):
-        assigns = [getLocalAssigns(x) for x in n.nodes]
-        return reduce(lambda x,y: x|y, assigns, set([]))
+        assigns = [_local_assigns(x) for x in n.nodes]
+        return union(assigns)
     elif isinstance(n, Printnl):
         return set([])
     elif isinstance(n, Assign):
@@ -284,23 +355,163 @@ def getLocalAssigns(n):
         # is to only find assigments for the local scope
         return set([n.name])
     elif isinstance(n, If):
-        testset = getLocalAssigns(n.tests[0][0])
-        thenset = getLocalAssigns(n.tests[0][1])
-        elseset = getLocalAssigns(n.else_)
+        testset = _local_assigns(n.tests[0][0])
+        thenset = _local_assigns(n.tests[0][1])
+        elseset = _local_assigns(n.else_)
         return testset | thenset | elseset
     elif isinstance(n, While):
-        testset = getLocalAssigns(n.test)
-        bodyset = getLocalAssigns(n.body)
-        elseset = getLocalAssigns(n.else_) if n.else_ is not None else set()
+        # after gcflatten the test is a (Name, Stmt) pair
+        test = n.test[1] if isinstance(n.test, tuple) else n.test
+        testset = _local_assigns(test)
+        bodyset = _local_assigns(n.body)
+        elseset = _local_assigns(n.else_) if n.else_ is not None and n.else_ != [] else set()
         return testset | bodyset | elseset
-    elif isinstance(n, (Add,UnarySub,CallFunc,Const,Name,Or,And,IfExp,List,Dict,Compare,Not,Subscript,Lambda,CallFuncIndirect)):
+    elif isinstance(n, (Add,UnarySub,CallFunc,Const,Name,Or,And,IfExp,List,Dict,Compare,Not,Subscript,Lambda,CallFuncIndirect,InjectFrom,ProjectTo,GetTag)):
         # these are all expressions, so no assignments
         return set([])
     elif isinstance(n, Class):
         return set([n.name])
+    elif isinstance(n, Let):
+        return set([n.var.name])
     else:
         raise Exception('Unhandled expression: "%s"' % repr(n))
 
+def _captured_vars(n):
+    """
+    Returns the set of variables the Lambdas directly inside the current scope
+    take from it, i.e. the union of their free variables.
+    """
+    if isinstance(n, Module):
+        return _captured_vars(n.node)
+    elif isinstance(n, Stmt):
+        return union([_captured_vars(x) for x in n.nodes])
+    elif isinstance(n, Printnl):
+        return _captured_vars(n.nodes[0])
+    elif isinstance(n, Assign):
+        return _captured_vars(n.expr)
+    elif isinstance(n, (Discard,UnarySub,Not)):
+        return _captured_vars(n.expr)
+    elif isinstance(n, Add):
+        return _captured_vars(n.left) | _captured_vars(n.right)
+    elif isinstance(n, IfExp):
+        return _captured_vars(n.test) | _captured_vars(n.then) | _captured_vars(n.else_)
+    elif isinstance(n, (And,Or)):
+        return union([_captured_vars(x) for x in n.nodes])
+    elif isinstance(n, CallFunc):
+        return union([_captured_vars(x) for x in n.args])
+    elif isinstance(n, CallFuncIndirect):
+        return union([_captured_vars(x) for x in n.args]) | _captured_vars(n.node)
+    elif isinstance(n, Compare):
+        return _captured_vars(n.expr) | _captured_vars(n.ops[0][1])
+    elif isinstance(n, Return):
+        return _captured_vars(n.value)
+    elif isinstance(n, (Name,Const)):
+        return set([])
+    elif isinstance(n, Lambda):
+        return scopes.free_vars(n)
+    elif isinstance(n, (InjectFrom,ProjectTo,GetTag)):
+        return _captured_vars(n.arg)
+    elif isinstance(n, Let):
+        return _captured_vars(n.rhs) | _captured_vars(n.body)
+    elif isinstance(n, While):
+        return _captured_vars(n.test[1]) | _captured_vars(n.body)
+    elif isinstance(n, If):
+        return _captured_vars(n.tests[0][0]) | _captured_vars(n.tests[0][1]) | _captured_vars(n.else_)
+    else:
+        raise Exception('Unhandled node: %s' % n)
+
+class ScopeAnalysis:
+    """Answers the scope questions the front end passes ask (the variables
+    assigned in a scope, the ones its Lambdas capture, the free variables of
+    an expression), computing each answer once per node.
+
+    Answers are kept until invalidate() is called.  The PassManager calls it
+    after every pass and Rewriters call it after changing the tree in place;
+    anything else that changes a subtree it has already asked about must call
+    it too.  The sets returned are shared and must not be modified."""
+    def __init__(self):
+        self.assigns = {}
+        self.captured = {}
+        self.free = {}
+
+    def invalidate(self):
+        self.assigns.clear()
+        self.captured.clear()
+        self.free.clear()
+
+    def local_assigns(self, n):
+        try:
+            return self.assigns[n]
+        except KeyError:
+            ret = self.assigns[n] = _local_assigns(n)
+            return ret
+
+    def captured_vars(self, n):
+        try:
+            return self.captured[n]
+        except KeyError:
+            ret = self.captured[n] = _captured_vars(n)
+            return ret
+
+    def free_vars(self, n):
+        try:
+            return self.free[n]
+        except KeyError:
+            ret = self.free[n] = _free_vars(n)
+            return ret
+
+scopes = ScopeAnalysis()
+
+def getLocalAssigns(n):
+    return scopes.local_assigns(n)
+
+def normalise_names(n):
+    """
+    Returns (shape, names).  shape is a string describing the structure of the
+    AST in which every local variable (anything assigned to, or a parameter) is
+    replaced by its index in names.  Two functions that only differ in the
+    names of their variables have the same shape.
+    """
+    localnames = set()
+    def collect(n):
+        if isinstance(n, AssName):
+            localnames.add(n.name)
+        elif isinstance(n, (Function,Lambda)):
+            localnames.update(n.argnames)
+        if isinstance(n, Node):
+            for child in n.__dict__.values():
+                collect(child)
+        elif isinstance(n, (list,tuple)):
+            for child in n:
+                collect(child)
+    collect(n)
+
+    order = {}
+    shape = []
+    def walk(n):
+        if isinstance(n, Node):
+            shape.append(n.__class__.__name__ + '(')
+            for attr in sorted(n.__dict__):
+                if attr != 'lineno':
+                    shape.append(attr + '=')
+                    walk(n.__dict__[attr])
+                    shape.append(',')
+            shape.append(')')
+        elif isinstance(n, (list,tuple)):
+            shape.append('[' if isinstance(n, list) else '(')
+            for child in n:
+                walk(child)
+                shape.append(',')
+            shape.append(']' if isinstance(n, list) else ')')
+        elif isinstance(n, str) and n in localnames:
+            if n not in order:
+                order[n] = len(order)
+            shape.append('$%d' % order[n])
+        else:
+            shape.append(repr(n))
+    walk(n)
+    return ''.join(shape), sorted(order, key=order.get)
+
 class CallFuncIndirect(Node):
     def __init__(self, node, args, star_args = None, dstar_args = None, lineno=None):
         self.node = node
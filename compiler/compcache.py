@@ -0,0 +1,261 @@
+#! /usr/bin/python
+# vim: set ts=4 sw=4 expandtab:
+#
+# Content addressed cache for the files the test suite keeps regenerating:
+# assembly from compile.py, linked binaries and CPython's expected output.
+# Every entry is stored under the sha1 of everything that went into making
+# it, so an entry can never be stale, it just stops being asked for.
+#
+#   asm       source, compiler sources, compile options
+#   bin       asm key, runtime sources, gcc command line
+#   expected  source, .in contents, python interpreter
+#   func      one function's flattened AST with its variables renamed,
+#             compiler sources (see compile_function in compile.py)
+#
+# Entries are plain files under <cache-dir>/<kind>/<key>.  A hit touches the
+# file, so trim() evicting the oldest files first is an LRU policy.
+
+from __future__ import print_function
+import os, sys, shutil, tempfile, fcntl, threading
+import hashlib
+import json
+from optparse import OptionParser
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'p3compile')
+DEFAULT_SIZE = 256 * 1024 * 1024
+KINDS = ['asm', 'bin', 'expected', 'func']
+
+# keys are hashed, and entries stored, as bytes; on Python 2 str already is
+def to_bytes(s):
+    if isinstance(s, bytes):
+        return s
+    return s.encode('utf-8')
+
+def to_str(data):
+    if isinstance(data, str):
+        return data
+    return data.decode('utf-8')
+
+def file_contents(path):
+    f = open(path, 'rb')
+    data = f.read()
+    f.close()
+    return data
+
+def hash_files(paths):
+    h = hashlib.sha1()
+    for path in sorted(paths):
+        h.update(to_bytes(os.path.basename(path) + '\0'))
+        h.update(to_bytes(hashlib.sha1(file_contents(path)).hexdigest()))
+    return h.hexdigest()
+
+_dir_hashes = {}
+def compiler_hash(compdir):
+    """Hash of every python file the compiler could import from compdir."""
+    key = ('compiler', os.path.abspath(compdir))
+    if key not in _dir_hashes:
+        paths = [os.path.join(compdir, f) for f in os.listdir(compdir)
+                 if f.endswith('.py') and f != 'run_tests.py']
+        plydir = os.path.join(compdir, 'ply')
+        paths += [os.path.join(plydir, f) for f in os.listdir(plydir) if f.endswith('.py')]
+        _dir_hashes[key] = hash_files(paths)
+    return _dir_hashes[key]
+
+def runtime_hash(compdir):
+    """Hash of the C runtime that gets linked into every binary."""
+    key = ('runtime', os.path.abspath(compdir))
+    if key not in _dir_hashes:
+        paths = [os.path.join(compdir, f) for f in os.listdir(compdir)
+                 if os.path.splitext(f)[1] in ('.c', '.h')]
+        _dir_hashes[key] = hash_files(paths)
+    return _dir_hashes[key]
+
+class Cache:
+    def __init__(self, path=None, max_size=None):
+        if path is None:
+            path = os.environ.get('P3_CACHE_DIR', DEFAULT_DIR)
+        if max_size is None:
+            max_size = int(os.environ.get('P3_CACHE_SIZE', DEFAULT_SIZE))
+        self.path = path
+        self.max_size = max_size
+        self.hits = dict((kind, 0) for kind in KINDS)
+        self.misses = dict((kind, 0) for kind in KINDS)
+        self.lock = threading.Lock()
+        for kind in KINDS:
+            d = os.path.join(self.path, kind)
+            if not os.path.isdir(d):
+                try:
+                    os.makedirs(d)
+                except OSError:
+                    # somebody else made it first
+                    pass
+
+    def key(self, *parts):
+        h = hashlib.sha1()
+        for part in parts:
+            part = to_bytes(part)
+            h.update(to_bytes('%d:' % len(part)))
+            h.update(part)
+        return h.hexdigest()
+
+    def asm_key(self, source, compdir, *flags):
+        return self.key(file_contents(source), compiler_hash(compdir), *flags)
+
+    def bin_key(self, asm_key, compdir, gcc_cmd):
+        return self.key(asm_key, runtime_hash(compdir), '\0'.join(gcc_cmd))
+
+    def expected_key(self, source, infile, python_prog):
+        inp = ''
+        if infile is not None and os.path.exists(infile):
+            inp = file_contents(infile)
+        return self.key(file_contents(source), inp, python_prog)
+
+    def entry(self, kind, key):
+        return os.path.join(self.path, kind, key)
+
+    def get(self, kind, key, dest):
+        """Copies the entry to dest and returns True, or returns False if
+        there is no such entry."""
+        entry = self.entry(kind, key)
+        try:
+            shutil.copy2(entry, dest)
+            os.utime(entry, None)
+        except (IOError, OSError):
+            self.count(self.misses, kind)
+            return False
+        self.count(self.hits, kind)
+        return True
+
+    def put(self, kind, key, src):
+        # copy then rename, so a reader never sees half an entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.path, kind))
+        os.close(fd)
+        shutil.copy2(src, tmp)
+        os.rename(tmp, self.entry(kind, key))
+
+    def get_text(self, kind, key):
+        """Returns the contents of the entry, or None.  Unlike get() this
+        does not count the hit or miss, the caller does."""
+        entry = self.entry(kind, key)
+        try:
+            text = file_contents(entry)
+            os.utime(entry, None)
+        except (IOError, OSError):
+            return None
+        return to_str(text)
+
+    def put_text(self, kind, key, text):
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.path, kind))
+        f = os.fdopen(fd, 'wb')
+        f.write(to_bytes(text))
+        f.close()
+        os.rename(tmp, self.entry(kind, key))
+
+    def count(self, counter, kind):
+        self.lock.acquire()
+        counter[kind] += 1
+        self.lock.release()
+
+    def trim(self):
+        """Evicts least recently used entries until the cache fits in
+        max_size bytes."""
+        entries = []
+        total = 0
+        for kind in KINDS:
+            d = os.path.join(self.path, kind)
+            for f in os.listdir(d):
+                try:
+                    st = os.stat(os.path.join(d, f))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, os.path.join(d, f)))
+                total += st.st_size
+        entries.sort()
+        evicted = 0
+        while total > self.max_size and entries:
+            mtime, size, path = entries.pop(0)
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        return evicted
+
+    def stats_file(self):
+        return os.path.join(self.path, 'stats.json')
+
+    def save_stats(self):
+        """Adds this process's hits and misses to the totals on disk."""
+        f = open(self.stats_file(), 'a+')
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        try:
+            totals = json.loads(f.read())
+        except ValueError:
+            totals = {'hits': {}, 'misses': {}}
+        for kind in KINDS:
+            totals['hits'][kind] = totals['hits'].get(kind, 0) + self.hits[kind]
+            totals['misses'][kind] = totals['misses'].get(kind, 0) + self.misses[kind]
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(totals))
+        f.close()
+        self.hits = dict((kind, 0) for kind in KINDS)
+        self.misses = dict((kind, 0) for kind in KINDS)
+
+    def load_stats(self):
+        try:
+            return json.loads(file_contents(self.stats_file()))
+        except (IOError, ValueError):
+            return {'hits': {}, 'misses': {}}
+
+    def size(self):
+        total = 0
+        count = 0
+        for kind in KINDS:
+            d = os.path.join(self.path, kind)
+            for f in os.listdir(d):
+                total += os.path.getsize(os.path.join(d, f))
+                count += 1
+        return count, total
+
+    def clear(self):
+        for kind in KINDS:
+            shutil.rmtree(os.path.join(self.path, kind), ignore_errors=True)
+            os.makedirs(os.path.join(self.path, kind))
+        if os.path.exists(self.stats_file()):
+            os.unlink(self.stats_file())
+
+def format_stats(hits, misses):
+    lines = ['%-10s %8s %8s %8s' % ('', 'hits', 'misses', 'hit rate')]
+    for kind in KINDS:
+        h = hits.get(kind, 0)
+        m = misses.get(kind, 0)
+        rate = '-'
+        if h + m > 0:
+            rate = '%.1f%%' % (100.0 * h / (h + m))
+        lines.append('%-10s %8d %8d %8s' % (kind, h, m, rate))
+    return '\n'.join(lines)
+
+if __name__ == "__main__":
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-d', '--cache-dir', dest='cache_dir', default=None,
+                      help='cache directory (default: $P3_CACHE_DIR or %s)' % DEFAULT_DIR)
+    parser.add_option('--max-size', dest='max_size', type='int', default=None,
+                      help='size limit in bytes used by --trim')
+    parser.add_option('--trim', dest='trim', action='store_true', default=False,
+                      help='evict least recently used entries down to the size limit')
+    parser.add_option('--clear', dest='clear', action='store_true', default=False,
+                      help='remove every entry and reset the statistics')
+    (options, args) = parser.parse_args()
+
+    cache = Cache(options.cache_dir, options.max_size)
+    if options.clear:
+        cache.clear()
+    if options.trim:
+        print('evicted %d entries' % cache.trim())
+    stats = cache.load_stats()
+    count, total = cache.size()
+    print('%s: %d entries, %d bytes (limit %d)' % (cache.path, count, total, cache.max_size))
+    print(format_stats(stats['hits'], stats['misses']))
@@ -5,11 +5,12 @@
 # CSCI5525, Fall 2011
 # HW1
 
-import sys, logging
+from __future__ import print_function
+import sys, os, re, json, logging
 import logging.config
-import compiler
+import multiprocessing
 
-from p0parser import P0Parser
+from p0parser import parse, parseFile
 from p3wrapper import P3Wrapper
 from p3declassify import P3Declassify
 from p3uniquifyvars import P3UniquifyVars
@@ -19,66 +20,363 @@ from p3explicate import P3Explicate
 from p3heapify import P3Heapify
 from p3closureconvert import P3ClosureConversion
 from p3flattener import P3Flattener
+from p1insselector import LabelAllocator
 from p3insselector import P3InstructionSelector
 from p3stackallocator import P3StackAllocator
-from p3regallocator import P3RegAllocator
+from p3regallocator import P3RegAllocator, GraphTooLarge
+from p3linearscanallocator import P3LinearScanAllocator
 from p3ifinsselector import P3IfInstructionSelector
 from p3generator import P3Generator
 from comp_util import *
-import time
+from compcache import Cache, compiler_hash
+from passstats import PassStats, run_pass, count_nodes
+from passmanager import PassManager
+from runtimelib import link
+from snapshot import Snapshot
+from compileopts import DEFAULT_ALLOCATOR, LINEAR_SCAN_THRESHOLD, BACKEND_PASSES, CHECKPOINTS
+from x86ir import Instruction
+import snapshot
 
 logger = logging.getLogger('compiler.main')
 
+COMPDIR = os.path.dirname(os.path.abspath(__file__))
+
+# stands in for the per-function label prefix in cached assembly; it cannot
+# appear anywhere else in the output
+LABEL_PLACEHOLDER = '\x01\x01'
+
+def auto_allocator(program, varalloc):
+    if count_nodes(program, Instruction) > LINEAR_SCAN_THRESHOLD:
+        return P3LinearScanAllocator(program, varalloc)
+    return P3RegAllocator(program, varalloc)
+
+# compileopts.ALLOCATOR_NAMES lists the same names for --allocator
+ALLOCATORS = {
+    'stack':  lambda program, varalloc: P3StackAllocator(program),
+    'reg':    lambda program, varalloc: P3RegAllocator(program, varalloc),
+    'linear': lambda program, varalloc: P3LinearScanAllocator(program, varalloc),
+    'auto':   auto_allocator,
+}
+def backend(ir, varalloc, prefix, stats=None, allocator=DEFAULT_ALLOCATOR, labelalloc=None,
+            start_after=None, stop_after=None):
+    """Runs the back end passes on one function and returns its assembly.
+    If start_after names one of BACKEND_PASSES, ir is what that pass
+    returned and labelalloc the LabelAllocator the passes up to it used.  If
+    stop_after names one, (ir, varalloc, labelalloc) as they are after it is
+    returned instead."""
+    if labelalloc is None:
+        labelalloc = LabelAllocator(prefix)
+    instruction_selector = P3InstructionSelector(varalloc, labelalloc)
+    ifinsselector = P3IfInstructionSelector(varalloc, labelalloc)
+    # only the stack allocator leaves memory to memory operations, which the
+    # generator does through %eax; after the register allocator %eax may hold
+    # a variable, and the spill generator has already removed them
+    generator = P3Generator(allowMem2Mem=(allocator == 'stack'), labelprefix=prefix)
+    def allocate(program):
+        regallocator = ALLOCATORS[allocator](program, varalloc)
+        try:
+            program = regallocator.substitute()
+        except GraphTooLarge as e:
+            logger.info('Allocating function %s with linear scan: %s', prefix, e)
+            if stats is not None:
+                stats.count(allocator + 'alloc', 'graphs too large', 1)
+            regallocator = P3LinearScanAllocator(program, varalloc)
+            program = regallocator.substitute()
+        if stats is not None and hasattr(regallocator, 'coalesced'):
+            stats.count(allocator + 'alloc', 'moves coalesced', regallocator.coalesced)
+        if stats is not None and hasattr(regallocator, 'rounds'):
+            stats.count(allocator + 'alloc', 'rounds', regallocator.rounds)
+        return program
+    funcs = {'flatten':     P3Flattener(varalloc).flatten,
+             'insselect':   instruction_selector.visit,
+             'alloc':       allocate,
+             'ifinsselect': ifinsselector.visit,
+             'generate':    generator.generate}
+
+    begin = 0
+    if start_after is not None:
+        begin = BACKEND_PASSES.index(start_after) + 1
+    for name in BACKEND_PASSES[begin:]:
+        statname = allocator + name if name == 'alloc' else name
+        ir = run_pass(stats, statname, funcs[name], ir, varalloc)
+        if name == stop_after:
+            return ir, varalloc, labelalloc
+    return ir
+
+def compile_function(job):
+    """Runs the back end (flatten through assembly generation) on a single
+    closure-converted function and returns (assembly text, cache hit, stats).
+
+    job is a tuple (index, ast, varnum, varset, allocator, cachedir, stats,
+    start_after, stop_after).  Every function gets
+    its own VariableAllocator, LabelAllocator and P3Generator, all seeded only
+    from the state the front end left behind and from the function's index, so
+    the output of one function never depends on which other functions were
+    compiled before it.  This is what allows the functions to be compiled in
+    any order (or in parallel, see -j) and still produce byte-identical output.
+
+    If cachedir is given, the assembly is looked up by the shape of the
+    flattened function (see normalise_names) before running the back end.
+    Cached text has the function's variables, the temporaries made by the back
+    end and the label prefix replaced by placeholders, which are filled back in
+    here, so a hit gives exactly the text the back end would have.
+
+    If stats is a PassStats, the passes run on this function are recorded in
+    a new PassStats that is returned for the caller to merge.
+
+    start_after and stop_after are as for backend.  When start_after is
+    given, ast is the (ir, varalloc, labelalloc) backend returned, and varnum
+    and varset are not used.  The cache is not used with either."""
+    index, ast, varnum, varset, allocator, cachedir, stats, start_after, stop_after = job
+    prefix = '%d_' % index
+    if stats is not None:
+        stats = stats.child('fn%d' % index)
+    if start_after is not None:
+        ast, varalloc, labelalloc = ast
+    else:
+        varalloc = VariableAllocator(varnum, set(varset))
+        labelalloc = None
+    if cachedir is None:
+        return backend(ast, varalloc, prefix, stats, allocator, labelalloc,
+                       start_after, stop_after), False, stats
+
+    flatast = run_pass(stats, 'flatten', P3Flattener(varalloc).flatten, ast, varalloc)
+
+    cache = Cache(cachedir)
+    shape, localnames = normalise_names(flatast)
+    key = cache.key(shape, allocator, compiler_hash(COMPDIR))
+    entry = cache.get_text('func', key)
+    hit = entry is not None
+    if hit:
+        ntemps, text = entry.split('\n', 1)
+        # the back end is deterministic, so it would have asked for the same
+        # number of temporaries in the same order
+        temps = [varalloc.get_next_var() for i in range(int(ntemps))]
+        names = {'v': localnames, 'b': temps}
+        text = re.sub(r'\x01([vb])(\d+)\x01',
+                      lambda m: names[m.group(1)][int(m.group(2))], text)
+    else:
+        before = VariableAllocator(varalloc.varnum, set(varalloc.varset))
+        text = backend(flatast, varalloc, LABEL_PLACEHOLDER, stats, allocator, start_after='flatten')
+        temps = [before.get_next_var() for i in range(len(varalloc.varset) - len(before.varset))]
+        placeholders = {}
+        for i in range(len(localnames)):
+            placeholders[localnames[i]] = '\x01v%d\x01' % i
+        for i in range(len(temps)):
+            placeholders[temps[i]] = '\x01b%d\x01' % i
+        cached = re.sub(r'[A-Za-z_][A-Za-z0-9_$]*',
+                        lambda m: placeholders.get(m.group(0), m.group(0)), text)
+        cache.put_text('func', key, '%d\n%s' % (len(temps), cached))
+    return text.replace(LABEL_PLACEHOLDER, prefix), hit, stats
+
+def frontend(ast, varalloc, stats=None, refcount=True, fuse=True, start_after=None, stop_after=None):
+    """Runs the passes that work on the whole program, up to and including
+    closure conversion, and returns the list of functions they produce.
+    fuse=False runs every pass in a traversal of its own (see passmanager).
+    start_after and stop_after are as for PassManager.run."""
+    passes = PassManager(stats, fuse)
+    explicator = P3Explicate(varalloc,handleLambdas=False)
+    passes.add(P3Declassify(varalloc))
+    passes.add(P3Wrapper())
+    passes.add(P3UniquifyVars())
+    passes.add(GCFlattener(varalloc))
+    if refcount:
+        passes.add(GCRefCount(varalloc))
+    passes.add(explicator)
+    passes.add(P3Heapify(explicator))
+    passes.add(P3ClosureConversion(explicator, varalloc))
+    return passes.run(ast, varalloc, start_after, stop_after)
+
+def backends(astlist, varalloc, pool=None, cache=None, stats=None, allocator=DEFAULT_ALLOCATOR,
+             start_after=None, stop_after=None):
+    """Runs the back end on every function and yields what it returns for
+    each, in order.  astlist is what the front end returned, or if
+    start_after names a back end pass, the states backend returned for each
+    function after it (varalloc is then not used)."""
+    # the back end for each function starts from the same variable allocator state
+    cachedir = cache.path if cache is not None else None
+    varnum = varalloc.varnum if varalloc is not None else None
+    varset = varalloc.varset if varalloc is not None else None
+    jobs = [(i, astlist[i], varnum, varset, allocator, cachedir, stats, start_after, stop_after)
+            for i in range(0,len(astlist))]
+    # imap hands back each function as soon as it and all functions before
+    # it are done, so the caller can write it out while the rest compile
+    if pool is not None:
+        results = pool.imap(compile_function, jobs)
+    else:
+        results = (compile_function(job) for job in jobs)
+    for chunk, hit, fnstats in results:
+        if cache is not None:
+            cache.count(cache.hits if hit else cache.misses, 'func')
+        if stats is not None:
+            stats.merge(fnstats)
+        yield chunk
+
+def run_passes(ir, varalloc, start_after=None, stop_after=None, pool=None, cache=None,
+               stats=None, refcount=True, allocator=DEFAULT_ALLOCATOR, fuse=True):
+    """Runs the passes after start_after (None: all of them, ir is the
+    parsed program) up to and including stop_after (None: through generate).
+    Returns the IR after stop_after if it is a front end pass, and otherwise
+    an iterator over what backend returns for each function."""
+    if start_after not in BACKEND_PASSES:
+        frontend_stop = stop_after if stop_after not in BACKEND_PASSES else None
+        ir = frontend(ir, varalloc, stats, refcount, fuse, start_after, frontend_stop)
+        if stop_after is not None and stop_after == frontend_stop:
+            return ir
+        start_after = None
+    return backends(ir, varalloc, pool, cache, stats, allocator, start_after, stop_after)
+
+def compile_ast(ast, pool=None, cache=None, stats=None, refcount=True, allocator=DEFAULT_ALLOCATOR, fuse=True):
+    """Compiles a parsed program and yields its assembly one function at a
+    time, in the same order compile_file writes it.  See compile_source for
+    the arguments."""
+    varalloc = VariableAllocator(0, set())
+    for chunk in run_passes(ast, varalloc, None, None, pool, cache, stats, refcount, allocator, fuse):
+        yield chunk
+
+def checkpoint(ast, stop_after, start=None, pool=None, stats=None, refcount=True, allocator=DEFAULT_ALLOCATOR, fuse=True):
+    """Runs the passes on a parsed program up to and including the one named
+    stop_after (one of CHECKPOINTS) and returns a Snapshot of the IR after
+    it.  If start is a Snapshot, continues from it instead of ast."""
+    if start is None:
+        ir, varalloc, start_after = ast, VariableAllocator(0, set()), None
+    else:
+        ir, varalloc, start_after = start.ir, start.varalloc, start.passname
+        refcount = start.refcount
+        if start_after in ('alloc', 'ifinsselect'):
+            allocator = start.allocator
+    ir = run_passes(ir, varalloc, start_after, stop_after, pool, None, stats, refcount, allocator, fuse)
+    if stop_after in BACKEND_PASSES:
+        ir, varalloc = list(ir), None
+    return Snapshot(stop_after, ir, varalloc, refcount, allocator)
+
+def resume(start, pool=None, stats=None, allocator=DEFAULT_ALLOCATOR, fuse=True):
+    """Compiles a program from the Snapshot start on and yields its assembly
+    like compile_ast.  Once a snapshot is past register allocation, the
+    allocator it was taken with is used."""
+    if start.passname in ('alloc', 'ifinsselect'):
+        allocator = start.allocator
+    for chunk in run_passes(start.ir, start.varalloc, start.passname, None, pool, None,
+                            stats, start.refcount, allocator, fuse):
+        yield chunk
+
+def compile_source(text, pool=None, cache=None, stats=None, refcount=True, allocator=DEFAULT_ALLOCATOR, fuse=True):
+    """Compiles P3 source text and returns an iterator over the generated
+    assembly, one chunk per function.  Joining the chunks gives the text of
+    the .s file.  If a multiprocessing pool is given, the per-function back
+    ends are run on the pool; otherwise they are run one after the other as
+    the iterator is consumed.  If a Cache is given, functions that have not
+    changed since they were last compiled are taken from it.  If a PassStats
+    is given, every pass is recorded in it; the records are complete once
+    the iterator is exhausted.  refcount=False leaves out reference counting
+    (GCRefCount), allocator picks the register allocator from ALLOCATORS,
+    and fuse=False turns off fusing front end passes into one traversal."""
+    # parseFile adds the newline too, so a file may end without one
+    return compile_ast(parse(text + '\n'), pool, cache, stats, refcount, allocator, fuse)
+
+def compile_file(testcase, out=None, pool=None, cache=None, stats=None, refcount=True, allocator=DEFAULT_ALLOCATOR, fuse=True):
+    """Compiles the given source file.  If out is a file-like object, each
+    function's assembly is written to it as soon as it is generated and None
+    is returned; otherwise the whole assembly is returned as a string.  The
+    other arguments are as for compile_source."""
+    chunks = compile_ast(parseFile(testcase), pool, cache, stats, refcount, allocator, fuse)
+    if out is None:
+        return ''.join(chunks)
+    for chunk in chunks:
+        out.write(chunk)
+
+def compile_testcase(testcase, options, pool=None, cache=None):
+    """Does what compile.py does with one source file given its options, as
+    returned by compileopts.parse_args: writes the assembly to <source>.s,
+    or the IR --stop-after asks for, except linking it.  Returns the
+    PassStats of the compile, or None if options asks for none or the
+    assembly came from cache."""
+    base = testcase[:testcase.rfind('.')]
+    outputfile = '%s.s' % base
+    if cache is not None:
+        key = cache.asm_key(testcase, COMPDIR, options.allocator, str(options.refcount))
+        if cache.get('asm', key, outputfile):
+            return None
+    stats = None
+    if options.time_passes or options.stats_json or options.profile_dir:
+        profile_prefix = None
+        if options.profile_dir:
+            profile_prefix = os.path.join(options.profile_dir, os.path.basename(base))
+        stats = PassStats(profile_prefix)
+    start = None
+    if options.start_from:
+        start = snapshot.load('%s.%s.ir' % (base, options.start_from))
+    if options.stop_after:
+        ast = None
+        if start is None:
+            ast = parseFile(testcase)
+        snap = checkpoint(ast, options.stop_after, start, pool, stats,
+                          options.refcount, options.allocator, options.fuse)
+        snapshot.save(snap, '%s.%s.ir' % (base, options.stop_after))
+    else:
+        f = open(outputfile, 'w')
+        try:
+            if start is not None:
+                for chunk in resume(start, pool, stats, options.allocator, options.fuse):
+                    f.write(chunk)
+            else:
+                compile_file(testcase, f, pool, cache, stats, options.refcount, options.allocator, options.fuse)
+            f.write('\n')
+            f.close()
+        except:
+            # do not leave half a .s file behind
+            f.close()
+            os.unlink(outputfile)
+            raise
+    if cache is not None:
+        cache.put('asm', key, outputfile)
+    return stats
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        sys.exit(1)
+    from compileopts import option_parser, parse_args
+    (options, testcases) = parse_args(option_parser())
 
-#    # configure logging 
+#    # configure logging
 #    logging.config.fileConfig('logging.cfg')
     logging.basicConfig(level=logging.ERROR)
     logging.disable(logging.ERROR)
+    # the visitors recurse on the depth of the AST, which a long chain of
+    # binary operators like 1 + 1 + ... + 1 makes deep
     sys.setrecursionlimit(10000)
 
-    testcases = sys.argv[1:]
+    pool = None
+    if options.jobs > 1:
+        pool = multiprocessing.Pool(options.jobs)
+
+    cache = None
+    if options.cache:
+        cache = Cache(options.cache_dir)
+    if options.profile_dir and not os.path.isdir(options.profile_dir):
+        os.makedirs(options.profile_dir)
+    allstats = []
+
     for testcase in testcases:
         logger.info("Working on test case '%s'" % testcase)
+        stats = compile_testcase(testcase, options, pool, cache)
+        if stats is not None:
+            allstats.append({'file': testcase, 'passes': stats.as_json()})
+            if options.time_passes:
+                print('%s:' % testcase, file=sys.stderr)
+                print(stats.report(), file=sys.stderr)
+        base = testcase[:testcase.rfind('.')]
+        if options.runtime and link('%s.s' % base, base, COMPDIR, options.runtime) != 0:
+            sys.exit(1)
 
-        # instantiate all classes needed for our pipeline
-        varalloc = VariableAllocator()
-        declassify = P3Declassify(varalloc)
-        wrapper = P3Wrapper()
-        uniquify = P3UniquifyVars()
-        gcflattener = GCFlattener(varalloc)
-        gcrefcount = GCRefCount(varalloc)
-        explicator = P3Explicate(varalloc,handleLambdas=False)
-        heap = P3Heapify(explicator)
-        closer = P3ClosureConversion(explicator, varalloc)
-        flattener = P3Flattener(varalloc)
-        instruction_selector = P3InstructionSelector(varalloc)
-        ifinsselector = P3IfInstructionSelector(varalloc,instruction_selector.labelalloc)
-        generator = P3Generator(allowMem2Mem=True)
-
-        # send the AST through the pipeline
-        ast = compiler.parseFile(testcase)
-        ast = declassify.transform(ast)
-        ast = wrapper.transform(ast)
-        ast = uniquify.transform(ast)
-        ast = gcflattener.transform(ast)
-        ast = gcrefcount.transform(ast)
-        ast = explicator.explicate(ast)
-        ast  = heap.transform(ast)
-        astlist = closer.transform(ast)
-        output = ''
-        for ast in astlist:
-            flatast = flattener.flatten(ast)
-            program = instruction_selector.visit(flatast)
-            allocator = P3StackAllocator(program)
-            #allocator = P3RegAllocator(program, varalloc)
-            program = allocator.substitute()
-            program = ifinsselector.visit(program)
-            output = output + generator.generate(program)
-        outputfile = '%s.s' % testcase[:testcase.rfind('.')]
-        f = open(outputfile, 'w')
-        print >> f, output
+    if cache is not None:
+        cache.trim()
+        cache.save_stats()
+
+    if options.stats_json:
+        f = open(options.stats_json, 'w')
+        json.dump(allstats, f, indent=2, sort_keys=True)
         f.close()
-        logging.shutdown()
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+    logging.shutdown()
@@ -0,0 +1,122 @@
+#! /usr/bin/python
+# vim: set ts=4 sw=4 expandtab:
+#
+# Drop-in replacement for compile.py, taking the same options plus --socket,
+# that hands the work to a running compileserver.py.  If no server is
+# listening, the file is compiled in this process instead, so it is always
+# safe to use, e.g.
+#     ./run_tests.py ./compileclient.py test
+
+from __future__ import print_function
+import os, sys, socket
+import json
+
+from compileopts import option_parser, parse_args, default_socket_path
+from runtimelib import link
+
+def connect(path):
+    """Returns a socket connected to the compile server, or None if there is
+    no server listening on path."""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+    except socket.error:
+        s.close()
+        return None
+    return s
+
+def remote_compile(s, testcase, options):
+    """Has the server compile testcase with options and returns its
+    statistics, see compileserver.py."""
+    request = {'file': os.path.abspath(testcase), 'options': options.__dict__}
+    s.sendall((json.dumps(request) + '\n').encode('utf-8'))
+    chunks = []
+    while True:
+        data = s.recv(65536)
+        if not data:
+            break
+        chunks.append(data)
+    s.close()
+    reply = json.loads(b''.join(chunks).decode('utf-8'))
+    if 'error' in reply:
+        print(reply['error'], end=' ', file=sys.stderr)
+        sys.exit(1)
+    return reply['stats']
+
+class LocalCompiler:
+    """Compiles in this process, as compile.py would, setting up the first
+    time it is needed."""
+    def __init__(self, options):
+        self.options = options
+        self.compile = None
+        self.pool = None
+        self.cache = None
+
+    def __call__(self, testcase):
+        if self.compile is None:
+            import logging, multiprocessing
+            import compile
+            from compcache import Cache
+            logging.basicConfig(level=logging.ERROR)
+            logging.disable(logging.ERROR)
+            sys.setrecursionlimit(10000)
+            if self.options.jobs > 1:
+                self.pool = multiprocessing.Pool(self.options.jobs)
+            if self.options.cache:
+                self.cache = Cache(self.options.cache_dir)
+            if self.options.profile_dir and not os.path.isdir(self.options.profile_dir):
+                os.makedirs(self.options.profile_dir)
+            self.compile = compile
+        stats = self.compile.compile_testcase(testcase, self.options, self.pool, self.cache)
+        if stats is None:
+            return None
+        return {'passes': stats.as_json(), 'report': stats.report()}
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.trim()
+            self.cache.save_stats()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+if __name__ == "__main__":
+    parser = option_parser()
+    parser.add_option('-s', '--socket', dest='socket', default=default_socket_path(),
+                      help='compile server socket (default: %default)')
+    (options, testcases) = parse_args(parser)
+    socket_path = options.socket
+    del options.socket
+    # the server runs in a directory of its own
+    if options.cache and options.cache_dir is None and os.environ.get('P3_CACHE_DIR'):
+        options.cache_dir = os.environ['P3_CACHE_DIR']
+    for name in ('cache_dir', 'profile_dir'):
+        if getattr(options, name) is not None:
+            setattr(options, name, os.path.abspath(getattr(options, name)))
+
+    local_compile = LocalCompiler(options)
+    allstats = []
+    try:
+        for testcase in testcases:
+            s = connect(socket_path)
+            if s is not None:
+                stats = remote_compile(s, testcase, options)
+            else:
+                stats = local_compile(testcase)
+            if stats is not None:
+                allstats.append({'file': testcase, 'passes': stats['passes']})
+                if options.time_passes:
+                    print('%s:' % testcase, file=sys.stderr)
+                    print(stats['report'], file=sys.stderr)
+            if options.runtime:
+                base = testcase[:testcase.rfind('.')]
+                compdir = os.path.dirname(os.path.abspath(__file__))
+                if link('%s.s' % base, base, compdir, options.runtime) != 0:
+                    sys.exit(1)
+    finally:
+        local_compile.close()
+
+    if options.stats_json:
+        f = open(options.stats_json, 'w')
+        json.dump(allstats, f, indent=2, sort_keys=True)
+        f.close()
@@ -0,0 +1,93 @@
+# vim: set ts=4 sw=4 expandtab:
+#
+# The command line of compile.py.  It is kept apart from compile.py, which
+# imports every pass, so that compileclient.py can take the same options
+# without paying for that import when a compile server does the work, and the
+# two agree on where the server's socket is.
+
+import os, tempfile
+from optparse import OptionParser
+
+from runtimelib import RUNTIMES
+
+# the allocators of compile.ALLOCATORS
+ALLOCATOR_NAMES = ('auto', 'linear', 'reg', 'stack')
+DEFAULT_ALLOCATOR = 'auto'
+
+# functions of more instructions than this get the linear scan allocator
+# from --allocator auto: graph colouring takes minutes on the largest ones.
+# Measured on programs of bench/genprog.py -l 4 -c 2, functions of up to
+# 4000 instructions had at most 61000 interferences and took at most 3s with
+# reg, under p3regallocator.MAX_INTERFERENCES, past which reg itself falls
+# back to linear scan, after building the graph for nothing
+LINEAR_SCAN_THRESHOLD = 4000
+
+# the passes run on every function after closure conversion; alloc is
+# recorded by --time-passes as stackalloc or regalloc
+BACKEND_PASSES = ('flatten', 'insselect', 'alloc', 'ifinsselect', 'generate')
+
+# the passes --stop-after and --start-from accept: the front end passes (see
+# compile.frontend) and the back end ones, except generate, whose output is
+# the .s file
+CHECKPOINTS = ('declassify', 'wrapper', 'uniquify', 'gcflatten', 'gcrefcount',
+               'explicate', 'heapify', 'closureconvert') + BACKEND_PASSES[:-1]
+
+def default_socket_path():
+    """Where compileserver.py listens and compileclient.py connects unless
+    told otherwise with --socket."""
+    return os.path.join(tempfile.gettempdir(), 'p3compile-%d.sock' % os.getuid())
+
+def option_parser():
+    parser = OptionParser(usage='%prog [options] <source-file> [source-files...]')
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', default=1,
+                      help='compile the functions of a program on N processes (default: 1)')
+    parser.add_option('--cache', dest='cache', action='store_true', default=False,
+                      help='reuse assembly cached for the same source and compiler, '
+                           'and for functions that did not change')
+    parser.add_option('--cache-dir', dest='cache_dir', default=None,
+                      help='cache directory (default: $P3_CACHE_DIR or ~/.cache/p3compile)')
+    parser.add_option('--time-passes', '--stats', dest='time_passes', action='store_true', default=False,
+                      help='print time, memory, IR size and temporaries for every pass to stderr')
+    parser.add_option('--stats-json', dest='stats_json', default=None,
+                      help='write the --time-passes numbers to this file as JSON')
+    parser.add_option('--profile-dir', dest='profile_dir', default=None,
+                      help='run every pass under cProfile and write the profiles to this directory')
+    parser.add_option('--no-refcount', dest='refcount', action='store_false', default=True,
+                      help='do not insert reference counting')
+    parser.add_option('--no-fuse', dest='fuse', action='store_false', default=True,
+                      help='run each front end pass in a traversal of its own')
+    parser.add_option('--allocator', dest='allocator', default=DEFAULT_ALLOCATOR,
+                      choices=list(ALLOCATOR_NAMES),
+                      help='how variables are given storage: %s; auto is reg, or linear for '
+                           'functions of more than %d instructions; reg also uses linear for '
+                           'functions whose interference graph is too large (default: %%default)'
+                           % (', '.join(ALLOCATOR_NAMES), LINEAR_SCAN_THRESHOLD))
+    parser.add_option('--stop-after', dest='stop_after', default=None,
+                      choices=list(CHECKPOINTS),
+                      help='stop after the pass PASS and write the IR to <source>.PASS.ir '
+                           'instead of the assembly; PASS is one of %s' % ', '.join(CHECKPOINTS))
+    parser.add_option('--start-from', dest='start_from', default=None,
+                      choices=list(CHECKPOINTS),
+                      help='continue from the IR that --stop-after PASS wrote, running only '
+                           'the passes after PASS; the source file is not read')
+    parser.add_option('--runtime', dest='runtime', default=None,
+                      choices=sorted(RUNTIMES.keys()),
+                      help='also link an executable against the release or instrumented runtime')
+    return parser
+
+def parse_args(parser, args=None):
+    """Parses the command line with parser, one made by option_parser, and
+    returns (options, source files), exiting with a message if the options
+    do not go together."""
+    (options, testcases) = parser.parse_args(args)
+    if len(testcases) < 1:
+        parser.exit(1)
+    if options.stop_after or options.start_from:
+        if options.cache:
+            parser.error('--cache cannot be used with --stop-after or --start-from')
+        if options.start_from and options.stop_after and \
+           CHECKPOINTS.index(options.stop_after) <= CHECKPOINTS.index(options.start_from):
+            parser.error('--stop-after must name a pass after --start-from')
+    if options.stop_after and options.runtime:
+        parser.error('--runtime needs the assembly, which --stop-after does not write')
+    return options, testcases
@@ -0,0 +1,123 @@
+#! /usr/bin/python
+# vim: set ts=4 sw=4 expandtab:
+#
+# Long running compile daemon.  Importing all of the passes is most of the
+# time spent compiling a small test program, so this keeps them loaded and
+# answers compile requests coming in over a Unix socket.  Every request is
+# handled in a forked child, so requests are served concurrently and one
+# compile can never leave state behind for the next one.
+#
+# Protocol: the client sends a single line of JSON
+#     {"file": "/abs/path/to/source.py", "options": {"jobs": 1, ...}}
+# where options are those of compile.py (see compileopts.py), by dest, with
+# any paths in them absolute; those left out take their defaults.  The server
+# writes the .s file, or the IR --stop-after asks for, next to the source as
+# compile.py would, answers with a single JSON object and closes the
+# connection: {"stats": null} or, if the options ask for pass statistics,
+# {"stats": {"passes": <PassStats.as_json()>, "report": <PassStats.report()>}},
+# or {"error": "<traceback>"} if the compile failed.  Linking and writing
+# --stats-json are left to the client.
+#
+# See compileclient.py for the matching client.
+
+from __future__ import print_function
+import os, sys, signal, socket, traceback
+import logging
+import json
+import multiprocessing
+try:
+    import SocketServer
+except ImportError:
+    import socketserver as SocketServer
+from optparse import OptionParser
+
+import compile
+import compileopts
+from compileopts import default_socket_path
+from compcache import Cache
+
+logger = logging.getLogger('compiler.server')
+
+class CompileHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # someone checking whether the server is up, see serve()
+            return
+        try:
+            request = json.loads(line)
+            testcase = request['file']
+            options = compileopts.option_parser().get_default_values()
+            for name, value in request.get('options', {}).items():
+                setattr(options, name, value)
+            logger.info("Working on test case '%s'" % testcase)
+            if options.profile_dir and not os.path.isdir(options.profile_dir):
+                os.makedirs(options.profile_dir)
+            pool = None
+            if options.jobs > 1:
+                pool = multiprocessing.Pool(options.jobs)
+            cache = None
+            if options.cache:
+                cache = Cache(options.cache_dir)
+            try:
+                stats = compile.compile_testcase(testcase, options, pool, cache)
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+            if cache is not None:
+                cache.trim()
+                cache.save_stats()
+            reply = {'stats': None}
+            if stats is not None:
+                reply['stats'] = {'passes': stats.as_json(), 'report': stats.report()}
+        except Exception:
+            reply = {'error': traceback.format_exc()}
+        self.wfile.write(json.dumps(reply).encode('utf-8'))
+
+class CompileServer(SocketServer.ForkingMixIn, SocketServer.UnixStreamServer):
+    pass
+
+def serve(path):
+    # a socket file left behind by a daemon that died is not an error, but a
+    # live daemon listening on it is
+    if os.path.exists(path):
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            s.connect(path)
+        except socket.error:
+            os.unlink(path)
+        else:
+            s.close()
+            print('A compile server is already listening on %s' % path, file=sys.stderr)
+            sys.exit(1)
+
+    server = CompileServer(path, CompileHandler)
+    os.chmod(path, 0o600)
+
+    def shutdown(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+if __name__ == "__main__":
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-s', '--socket', dest='socket', default=default_socket_path(),
+                      help='listen on this Unix socket (default: %default)')
+    (options, args) = parser.parse_args()
+
+    # same setup compile.py does for every invocation, done once
+    logging.basicConfig(level=logging.ERROR)
+    logging.disable(logging.ERROR)
+    sys.setrecursionlimit(10000)
+
+    serve(options.socket)
+    logging.shutdown()
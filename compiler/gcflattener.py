@@ -1,5 +1,6 @@
 # vim: set ts=4 sw=4 expandtab:
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from p3declassify import P3Declassify
 from p3wrapper import P3Wrapper
@@ -7,6 +8,7 @@ from p3explicate import P3Explicate
 from p3uniquifyvars import P3UniquifyVars
 from p3closureconvert import P3ClosureConversion
 import operator
+from visitor import Visitor
 
 def cleanup_tempvars(tmpvars):
     stmts = []
@@ -16,8 +18,11 @@ def cleanup_tempvars(tmpvars):
     return stmts
 
 
-class GCFlattener:
+class GCFlattener(Visitor):
     """Class to performing flattening of complex expressions for the garbage collection phase (pre-explicate)"""
+    name = 'gcflatten'
+    requires = ('uniquify',)
+
     def __init__ (self, varalloc, validate=False):
         self.validate = validate
         self.varalloc = varalloc
@@ -29,21 +34,12 @@ class GCFlattener:
         self.log.info('Finished gcflattener')
         return ret
     
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        self.log.info(meth_name)
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-    
     def visit_Module(self, node, *args, **kwargs):
         return Module(None, self.visit(node.node), None)
     
     def visit_Stmt(self, node, *args, **kwargs):
         flat = [self.visit(x) for x in node.nodes]
-        return Stmt(reduce(lambda x,y:x+y, flat, []), None)
+        return Stmt(concat(flat), None)
     
     def visit_Printnl(self, node, *args, **kwargs):
         if len(node.nodes) > 0:
@@ -96,10 +92,10 @@ class GCFlattener:
         varlist =  [x[0] for x in varstmtlist]
         
         # get any temporary variables created
-        tmpvarlist = reduce(lambda x,y: x+y, [x[1] for x in varstmtlist], [])
+        tmpvarlist = concat([x[1] for x in varstmtlist])
         
         #print varlist
-        stmtlist = reduce(lambda x,y: x+y, [x[2] for x in varstmtlist], [])
+        stmtlist = concat([x[2] for x in varstmtlist])
         #print stmtlist
         # return a CallFunc with the variables substituted in
         return (Name(varname), [varname]+tmpvarlist, stmtlist + [Assign([AssName(varname, 'OP_ASSIGN')], CallFunc(node.node, varlist))])
@@ -164,9 +160,9 @@ class GCFlattener:
         stmts = [self.visit(x) for x in node.nodes]
         varlist = [x for x,y,z in stmts]
         # convert the list of lists into a single list of statements
-        stmtlist = reduce(lambda x,y: x+y, [y for x,z,y in stmts if y != []], [])
+        stmtlist = concat([y for x,z,y in stmts if y != []])
         
-        tmpvars = reduce(lambda x,y: x+y, [y for x,y,z in stmts if y != []], [])
+        tmpvars = concat([y for x,y,z in stmts if y != []])
         
         varname = self.varalloc.get_next_var()
         return (Name(varname), [varname]+tmpvars, stmtlist + [Assign([AssName(varname, 'OP_ASSIGN')], List(varlist))])
@@ -174,17 +170,17 @@ class GCFlattener:
     def visit_Dict(self, node, *args, **kwargs):
         keys = [self.visit(x[0]) for x in node.items]
         keyvarlist = [x for x,y,z in keys]
-        keytmpvars = reduce(lambda x,y: x+y, [y for x,y,z in keys if y != []], [])
-        keystmtlist = reduce(lambda x,y: x+y, [y for x,z,y in keys if y != []], [])
+        keytmpvars = concat([y for x,y,z in keys if y != []])
+        keystmtlist = concat([y for x,z,y in keys if y != []])
         
         values = [self.visit(x[1]) for x in node.items]
         valuevarlist = [x for x,y,z in values]
-        valuetmpvars = reduce(lambda x,y: x+y, [y for x,y,z in values if y != []], [])
-        valuestmtlist = reduce(lambda x,y: x+y, [y for x,z,y in values if y != []], [])
+        valuetmpvars = concat([y for x,y,z in values if y != []])
+        valuestmtlist = concat([y for x,z,y in values if y != []])
         
         # keyvaluelist becomes a list of tuples, where each tuple is a key,value corresponding to the 
         # temp variables for the key/value
-        keyvaluelist = map(lambda x: (keyvarlist[x],valuevarlist[x]), range(0,len(keyvarlist)))
+        keyvaluelist = list(zip(keyvarlist, valuevarlist))
         varname = self.varalloc.get_next_var()
         return (Name(varname), [varname]+keytmpvars+valuetmpvars, keystmtlist + valuestmtlist + [Assign([AssName(varname, 'OP_ASSIGN')], Dict(keyvaluelist))])
     
@@ -208,10 +204,10 @@ class GCFlattener:
         retvar, tmplist, retstmtlist = self.visit(node.value)
         # if the return variable is in our temp list, remove it, since
         # we need to keep the reference count at 1
-        self.log.info('visit_Return: retvar=%s' % retvar)
-        self.log.info('visit_Return: tmplist=%s' % tmplist)
+        self.log.info('visit_Return: retvar=%s', retvar)
+        self.log.info('visit_Return: tmplist=%s', tmplist)
         if isinstance(retvar,Name) and retvar.name in tmplist:
-            self.log.info('visit_Return: Removing %s from tmplist' % retvar.name)
+            self.log.info('visit_Return: Removing %s from tmplist', retvar.name)
             tmplist.remove(retvar.name)
         return retstmtlist + cleanup_tempvars(tmplist) + [Return(retvar)]
     
@@ -226,8 +222,8 @@ class GCFlattener:
             varargs.append(a)
             tmpvars.append(b)
             varstmts.append(c)
-        tmpvars = reduce(lambda x,y: x+y, tmpvars, [])
-        varstmts = reduce(lambda x,y: x+y, varstmts, [])
+        tmpvars = concat(tmpvars)
+        varstmts = concat(varstmts)
         varname = self.varalloc.get_next_var()
         stmts = nodestmtlist + varstmts + [Assign([AssName(varname, 'OP_ASSIGN')], CallFuncIndirect(nodevar, varargs))]
         return (Name(varname), [varname]+nodetmpvars+tmpvars, stmts)
@@ -261,8 +257,8 @@ class GCFlattener:
         # second element in the tuple is a Stmt object.  Each tuple in the list corresponds to
         # an "if" or "elif" clause.  The else_ attribute is a Stmt object corresponding to the 
         # "else" clause.
-        self.log.debug('then=%s' % then)
-        self.log.debug('else_=%s' % then)
+        self.log.debug('then=%s', then)
+        self.log.debug('else_=%s', then)
         return test + [If([(vartes, then)], else_)] + cleanup_tempvars(tmpvars)
     
     def visit_Getattr(self, node, *args, **kwargs):
@@ -312,7 +308,8 @@ class GCFlattener:
 
 
 if __name__ == "__main__":
-    import compiler, sys
+    import sys
+    from p0parser import parseFile
     import logging.config
     
     if len(sys.argv) < 2:
@@ -329,11 +326,11 @@ if __name__ == "__main__":
         explicator = P3Explicate(varalloc)
         flatten = GCFlattener(varalloc,True)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         ast = declassify.transform(ast)
         ast = wrapper.transform(ast)
         ast = unique.transform(ast)        
         ast = flatten.transform(ast)
-        print ast
-        print prettyAST(ast)
+        print(ast)
+        print(prettyAST(ast))
 
@@ -1,67 +1,19 @@
 # vim: set ts=4 sw=4 expandtab:
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from p3declassify import P3Declassify
 from p3wrapper import P3Wrapper
 from p3uniquifyvars import P3UniquifyVars
 from gcflattener import GCFlattener
 import operator
+from visitor import Visitor
 
-def getLocals(n):
-    """
-    Returns the set of variables that are assigned to within the current scope,
-    ignoring assignments in nested scopes (functions).
-    """
-    if isinstance(n, Module):
-        return getLocals(n.node)
-    elif isinstance(n, Stmt):
-        assigns = [getLocals(x) for x in n.nodes]
-        return reduce(lambda x,y: x|y, assigns, set([]))
-    elif isinstance(n, Printnl):
-        return set([])
-    elif isinstance(n, Assign):
-        if isinstance(n.nodes[0], (Subscript,AssAttr)):
-             ##assigning to a subscript of a variable does not constitute
-             ##assigning to the variable itself.  Return empty set.
-             ##ditto for an object attribute
-            return set([])
-        elif isinstance(n.nodes[0], AssName):
-            return set([n.nodes[0].name])
-        else:
-            raise Exception('Unhandled Assign case: %s' % n.nodes[0])
-    elif isinstance(n, Discard):
-        # there shouldn't ever be a case where there will be an assignment in a Discard
-        # since a Discard is, by definition, a statement that produced no assignments
-        return set([])
-    elif isinstance(n, Return):
-        return set([])
-    elif isinstance(n, Function):
-        # a function definition is equivalent to an assignment to a 
-        # variable with the same name as the function
-        # No need to recurse into the Function since the intent of the function
-        # is to only find assigments for the local scope
-        return set([n.name])
-    elif isinstance(n, If):
-        testset = getLocals(n.tests[0][0])
-        thenset = getLocals(n.tests[0][1])
-        elseset = getLocals(n.else_)
-        return testset | thenset | elseset
-    elif isinstance(n, While):
-        testset = getLocals(n.test[1])
-        bodyset = getLocals(n.body)
-        elseset = getLocals(n.else_) if n.else_ is not None and n.else_ != [] else set()
-        return testset | bodyset | elseset
-    elif isinstance(n, (Add,UnarySub,CallFunc,Const,Name,Or,And,IfExp,List,Dict,Compare,Not,Subscript,Lambda,CallFuncIndirect)):
-        # these are all expressions, so no assignments
-        return set([])
-    elif isinstance(n, Class):
-        return set([n.name])
-    else:
-        raise Exception('Unhandled expression: "%s"' % repr(n))
-
-
-class GCRefCount:
+class GCRefCount(Visitor):
     """Class to insert reference counting for garbage collection phase"""
+    name = 'gcrefcount'
+    requires = ('gcflatten',)
+
     def __init__ (self, varalloc):
         self.varalloc = varalloc
         self.varset = set()
@@ -74,22 +26,16 @@ class GCRefCount:
         self.log.info('Finished gcrefcounter')
         return ret
     
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        self.log.debug('%s' % meth_name)
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-    
     def visit_Module(self, node, *args, **kwargs):
-        self.log.debug('localAssigns = %s' % getLocals(node))
+        # names are sorted wherever code is made for each of a set of them;
+        # the order of a set of strings changes from run to run on Python 3
+        localvars = sorted(getLocalAssigns(node))
+        self.log.debug('localAssigns = %s', localvars)
         decrefstmts = []
         initialassigns = []
-        for localvar in getLocals(node):
+        for localvar in localvars:
             initialassigns.append(Assign([AssName(localvar, 'OP_ASSIGN')],Const(0)))
-        for localvar in getLocals(node):
+        for localvar in localvars:
             decrefstmts.append(Discard(CallFunc(Name('dec_ref_ctr'),[Name(localvar)])))
         stmt = self.visit(node.node)
         stmt.nodes = initialassigns + stmt.nodes + decrefstmts
@@ -97,7 +43,7 @@ class GCRefCount:
 
     def visit_Stmt(self, node, *args, **kwargs):
         stmts = [self.visit(x) for x in node.nodes]
-        return Stmt(reduce(lambda x,y:x+y, stmts, []), None)
+        return Stmt(concat(stmts), None)
 
     def visit_Assign(self, node, *args, **kwargs):
         assnode = node.nodes[0]
@@ -113,7 +59,7 @@ class GCRefCount:
             return [Assign([assnode], self.visit(node.expr))]
         elif isinstance(assnode, AssName):
             stmtlist = []
-            self.log.info('varset=%s' % self.varset)
+            self.log.info('varset=%s', self.varset)
             self.varset.add(assnode.name)
             stmtlist.append(Discard(CallFunc(Name('dec_ref_ctr'),[Name(assnode.name)])))
             stmtlist.append(Assign([AssName(assnode.name,'OP_ASSIGN')], self.visit(node.expr)))
@@ -171,11 +117,11 @@ class GCRefCount:
     
     def visit_Return(self, node, *args, **kwargs):
         localAssigns, argset = self.lambda_local_vars[-1]
-        self.log.debug('visit_Return: localAssigns=%s' % localAssigns)
-        self.log.debug('visit_Return: node=%s' % node)
+        self.log.debug('visit_Return: localAssigns=%s', localAssigns)
+        self.log.debug('visit_Return: node=%s', node)
         decrefstmts=[]
         # call dec_ref on all local variables, unless the this value is being returned.
-        for localvar in localAssigns | argset:
+        for localvar in sorted(localAssigns | argset):
             if not isinstance(node.value, Name) or node.value.name != localvar:
                 decrefstmts.append(Discard(CallFunc(Name('dec_ref_ctr'),[Name(localvar)])))
         # Call set_autorelease on the variable being returned from the function
@@ -217,18 +163,18 @@ class GCRefCount:
         increfstmts = []
         decrefstmts = []
         initialassigns = []
-        localAssigns = getLocals(node.code)
-        self.log.info('visit_Lambda: localAssigns=%s' % localAssigns)
+        localAssigns = getLocalAssigns(node.code)
+        self.log.info('visit_Lambda: localAssigns=%s', localAssigns)
         # Assign every local variable the value zero, except for arguments to the function
         # This eliminates the need to know where a variable is first assigned, which may
         # not be able to be determined statically.  
         for argvar in node.argnames:
             increfstmts.append(Discard(CallFunc(Name('inc_ref_ctr'),[Name(argvar)])))
-        for localvar in localAssigns:
+        for localvar in sorted(localAssigns):
             if localvar not in node.argnames:
                 initialassigns.append(Assign([AssName(localvar, 'OP_ASSIGN')],Const(0)))
         allvars = localAssigns | set(node.argnames)
-        for localvar in allvars:
+        for localvar in sorted(allvars):
             decrefstmts.append(Discard(CallFunc(Name('dec_ref_ctr'),[Name(localvar)])))
         self.lambda_local_vars.append((localAssigns,set(node.argnames)))
         code = self.visit(node.code)
@@ -243,7 +189,8 @@ class GCRefCount:
 
 
 if __name__ == "__main__":
-    import compiler, sys
+    import sys
+    from p0parser import parseFile
     import logging.config
     
     if len(sys.argv) < 2:
@@ -260,11 +207,11 @@ if __name__ == "__main__":
         flatten = GCFlattener(varalloc,True)
         refcount = GCRefCount(varalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         ast = declassify.transform(ast)
         ast = wrapper.transform(ast)
         ast = unique.transform(ast)        
         ast = flatten.transform(ast)
         ast = refcount.transform(ast)
-        print ast
-        print prettyAST(ast)
+        print(ast)
+        print(prettyAST(ast))
@@ -0,0 +1,10 @@
+a = [[1, 2], [3, 4]]
+d = {1: 2}
+print a[1]
+print a[1,]
+x = a[0, 1]
+y = a[0, 1,]
+d[1, 2] = a[
+    1,
+    0]
+print a[d[1, 2], a[0][1, 0]]
@@ -1,11 +1,13 @@
 # vim: set ts=4 sw=4 expandtab:
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from p0parser import P0Parser
 
 import logging
+from visitor import Visitor
 
-class P0Flattener:
+class P0Flattener(Visitor):
     """Class to performing flattening of complex expressions."""
     def __init__ (self, varalloc):
         self.varalloc = varalloc
@@ -13,62 +15,73 @@ class P0Flattener:
 
     def flatten (self, node):
         """Takes an AST as input, and then "flattens" the tree into a list of statements."""
+        return self.visit(node)
+
+    def visit_default(self, node, *args, **kwargs):
+        raise Exception('Unknown node: %s: %s' % (node.__class__, node))
+
+    def visit_Module(self, node):
+        return Module(None, self.visit(node.node), None)
+
+    def visit_Stmt(self, node):
+        stmts = concat([self.visit(x) for x in node.nodes])
+        if self.log.isEnabledFor(logging.DEBUG):
+            for y in stmts:
+                self.log.debug('flatten_Stmt: %s', y)
+        return Stmt(stmts, None)
+
+    def visit_Printnl(self, node):
+        if len(node.nodes) > 0:
+            var, stmtlist = self.visit(node.nodes[0])
+            return stmtlist + [Printnl([var], node.dest)]
+
+    def visit_Assign(self, node):
+        self.log.debug('flatten_Assign: %s',node)
+        if isinstance(node.nodes[0],Subscript):
+            self.varalloc.add_var(node.nodes[0].expr.name)
+        else:
+            self.varalloc.add_var(node.nodes[0].name)
+        var, stmtlist = self.visit(node.expr)
+        return stmtlist + [Assign(node.nodes, var)]
+
+    def visit_Discard(self, node):
+        # discard nodes should be ignored; except for function calls with side effects.
+        var, stmtlist = self.visit(node.expr)
+        return stmtlist
+
+    def visit_Add(self, node):
+        left, stmtleft = self.visit(node.left)
+        right, stmtright = self.visit(node.right)
+        varname = self.varalloc.get_next_var()
+        return (Name(varname), stmtleft + stmtright + [Assign([AssName(varname, 'OP_ASSIGN')], Add((left,right)))] )
+
+    def visit_UnarySub(self, node):
         # XXX: optimization.  If direct descendant in AST is also UnarySub, then
         # we should be able to optimize the two UnarySub nodes away.
-        # X = UnarySub(UnarySub(X))  
-        while isinstance(node, UnarySub) and isinstance(node.expr, UnarySub):
-            node = node.expr.expr
-        if isinstance(node, Module):
-            return Module(None, self.flatten(node.node), None)
-        elif isinstance(node, Stmt):
-            flat = [self.flatten(x) for x in node.nodes]
-            l=[]
-            for x in flat:
-                for y in x:
-                    self.log.debug('flatten_Stmt: %s', y)
-                l = l + x
-            return Stmt(reduce(lambda x,y: x+y, flat, []), None)
-        elif isinstance(node, Printnl):
-            if len(node.nodes) > 0:
-                var, stmtlist = self.flatten(node.nodes[0])
-                return stmtlist + [Printnl([var], node.dest)]
-        elif isinstance(node, Assign):
-            self.log.debug('flatten_Assign: %s',node)
-            if isinstance(node.nodes[0],Subscript):
-                self.varalloc.add_var(node.nodes[0].expr.name)
-            else:
-                self.varalloc.add_var(node.nodes[0].name)
-            var, stmtlist = self.flatten(node.expr)
-            return stmtlist + [Assign(node.nodes, var)]
-        elif isinstance(node, Discard):
-            # discard nodes should be ignored; except for function calls with side effects.
-            var, stmtlist = self.flatten(node.expr)
-            return stmtlist
-        elif isinstance(node, Add):
-            left, stmtleft = self.flatten(node.left)
-            right, stmtright = self.flatten(node.right)
-            varname = self.varalloc.get_next_var()
-            return (Name(varname), stmtleft + stmtright + [Assign([AssName(varname, 'OP_ASSIGN')], Add((left,right)))] )
-        elif isinstance(node, UnarySub):
-            f, stmtlist = self.flatten(node.expr)
-            varname = self.varalloc.get_next_var()
-            return (Name(varname), stmtlist + [Assign([AssName(varname, 'OP_ASSIGN')], UnarySub(f))])
-        elif isinstance(node, CallFunc):
-            varname = self.varalloc.get_next_var()
-            return (Name(varname), [Assign([AssName(varname, 'OP_ASSIGN')], node)])
-        elif isinstance(node, Const):
-            return (node, [])
-        elif isinstance(node, Name):
-            return (node, [])
-        elif isinstance(node, AssName):
-            stmtlist.varalloc.add_var(node.assname)
-            return (node, [])
-        else:
-            raise Exception('Unknown node: %s: %s' % (node.__class__, node))
+        # X = UnarySub(UnarySub(X))
+        if isinstance(node.expr, UnarySub):
+            return self.visit(node.expr.expr)
+        f, stmtlist = self.visit(node.expr)
+        varname = self.varalloc.get_next_var()
+        return (Name(varname), stmtlist + [Assign([AssName(varname, 'OP_ASSIGN')], UnarySub(f))])
+
+    def visit_CallFunc(self, node):
+        varname = self.varalloc.get_next_var()
+        return (Name(varname), [Assign([AssName(varname, 'OP_ASSIGN')], node)])
+
+    def visit_Const(self, node):
+        return (node, [])
+
+    def visit_Name(self, node):
+        return (node, [])
+
+    def visit_AssName(self, node):
+        stmtlist.varalloc.add_var(node.assname)
+        return (node, [])
 
 
 if __name__ == "__main__":
-    import compiler, sys
+    import sys
     if len(sys.argv) < 2:
         sys.exit(1)
 
@@ -76,8 +89,8 @@ if __name__ == "__main__":
     for testcase in testcases:
         parser = P0Parser()
         parser.build()
-        #ast = compiler.parseFile(testcase)
+        #ast = parseFile(testcase)
         ast = parser.parseFile(testcase)
         p0flattener = P0Flattener(VariableAllocator())
         stmtlist = p0flattener.flatten(ast)
-        print stmtlist
+        print(stmtlist)
@@ -1,10 +1,12 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from x86ir import *
 import logging
+from visitor import Visitor
 
 
-class P0Generator(object):
+class P0Generator(Visitor):
     def __init__(self, allowMem2Mem=True):
         self.log = logging.getLogger('compiler.generator')
         self.maxslot = 0
@@ -19,14 +21,6 @@ class P0Generator(object):
         self.log.info ('Finished assembly generate')
         return ret
 
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-
     def visit_Program(self, node, *args, **kwargs):
         program = "\n".join([self.visit(x) for x in node.statements])
         return """
@@ -35,6 +29,9 @@ main:
 \tpushl %%ebp
 \tmovl %%esp, %%ebp
 \tsubl $%s,%%esp # make stack space for variables
+\tpushl %%esi # callee-save registers the register allocator may use
+\tpushl %%edi
+\tpushl %%ebx
 \tcall pymem_init
 \tcall runtime_init
 
@@ -42,6 +39,9 @@ main:
 \tcall runtime_shutdown
 \tcall pymem_print_stats
 \tcall pymem_shutdown
+\tpopl %%ebx
+\tpopl %%edi
+\tpopl %%esi
 \tmovl $0, %%eax # put return value in eax
 \tleave
 \tret
@@ -58,7 +58,7 @@ main:
         # if the source and destination are the same, then this is a no-op, return nothing
         if isinstance(node.src,Var) and isinstance(node.dst,Var):
             if node.src.storage.__class__ == node.dst.storage.__class__ and node.src.storage == node.dst.storage:
-                self.log.debug('Removing unnecessary assignment: %s (%s)' % (Movl(node.src,node.dst), Movl(node.src.storage, node.dst.storage)))
+                self.log.debug('Removing unnecessary assignment: %s (%s)', Movl(node.src,node.dst), Movl(node.src.storage, node.dst.storage))
                 return None
             # handle memory to memory moves
             if isinstance(node.src.storage,StackSlot) and isinstance(node.dst.storage, StackSlot):
@@ -67,6 +67,12 @@ main:
                     node.src = Register('eax')
                 else:
                     raise Exception ('Detected memory to memory during %s"' % node.__class__.__name__)
+        # likewise a move between a register and a variable given that register
+        # (registers are interned, so they compare by identity)
+        if (isinstance(node.src,Register) and isinstance(node.dst,Var) and node.dst.storage is node.src) or \
+           (isinstance(node.dst,Register) and isinstance(node.src,Var) and node.src.storage is node.dst):
+            self.log.debug('Removing unnecessary assignment: %s', node)
+            return None
         if isinstance(node.src,Var) and isinstance(node.src.storage, StackSlot) and isinstance(node.dst, StackSlot):
             if self.allowMem2Mem:
                 stmtlist.append('\tmovl %s, %s' % (self.visit(node.src), self.visit(Register('eax'))))
@@ -140,7 +146,7 @@ if __name__ == "__main__":
     for testcase in testcases:
         parser = P0Parser()
         parser.build()
-        #ast = compiler.parseFile(testcase)
+        #ast = parseFile(testcase)
         ast = parser.parseFile(testcase)
         varalloc = VariableAllocator()
         p0flattener = P0Flattener(varalloc)
@@ -152,5 +158,5 @@ if __name__ == "__main__":
         #stackallocator = P0StackAllocator(program)
         #program = stackallocator.substitute()
         generator = P0Generator()
-        print generator.generate(program)
+        print(generator.generate(program))
         
@@ -1,35 +1,29 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 
 import logging
+from visitor import Visitor
 
 # Concept borrowed from http://peter-hoffmann.com/2010/extrinsic-visitor-pattern-python-inheritance.html
-class P0InstructionSelector(object):
+class P0InstructionSelector(Visitor):
     def __init__(self, varalloc):
         self.varalloc = varalloc
         self.log = logging.getLogger('compiler.insselect')
 
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-
     def visit_Module(self, node, *args, **kwargs):
         return Program(self.visit(node.node))
 
     def visit_Stmt(self, node, *args, **kwargs):
         stmtlist=[]
         for x in node.nodes:
-            self.log.debug('x=%s' % x)
+            self.log.debug('x=%s', x)
             instrlist = self.visit(x)
-            self.log.debug('instrlist=%s' % instrlist)
+            self.log.debug('instrlist=%s', instrlist)
             source = pretty(x)
-            self.log.debug('source=%s' % source)
+            self.log.debug('source=%s', source)
             stmtlist.append(Statement(instrlist,source))
         return stmtlist
 #        ret = [Statement(self.visit(x),pretty(x)) for x in node.nodes]
@@ -41,7 +35,7 @@ class P0InstructionSelector(object):
         if not self.varalloc.is_allocated(assname.name):
             raise Exception('Attempt to assign to previously unseen variable: %s' % assname.name)
         loc, stmtlist = self.visit(node.expr)
-        return stmtlist + [Movl(loc, Var(assname.name))]
+        return stmtlist + [Movl(loc, self.varalloc.var(assname.name))]
         
     def visit_Printnl(self, node, *args, **kwargs):
         loc, stmtlist = self.visit(node.nodes[0])
@@ -53,20 +47,19 @@ class P0InstructionSelector(object):
         left, leftstmt = self.visit(node.left)
         right, rightstmt = self.visit(node.right)
         # need to create a temporary variable here to store the result.
-        varname = self.varalloc.get_next_var()
-        return (Var(varname), leftstmt + rightstmt + [Movl(right, Var(varname)), Addl(left, Var(varname))])
+        tmpvar = self.varalloc.var(self.varalloc.get_next_var())
+        return (tmpvar, leftstmt + rightstmt + [Movl(right, tmpvar), Addl(left, tmpvar)])
 
     def visit_UnarySub(self, node, *args, **kwargs):
         loc, stmtlist = self.visit(node.expr)
         # need to create a temporary variable here to store the result.
-        varname = self.varalloc.get_next_var()
-        tmpvar = Var(varname)
+        tmpvar = self.varalloc.var(self.varalloc.get_next_var())
         return (tmpvar, stmtlist + [Movl(loc, tmpvar), Negl(tmpvar)])
 
     def visit_CallFunc(self, node, *args, **kwargs):
         # need to create a temporary variable here to store the result.
-        varname = self.varalloc.get_next_var()
-        return (Var(varname), [Call('input'), Movl(Register('eax'),Var(varname))])
+        tmpvar = self.varalloc.var(self.varalloc.get_next_var())
+        return (tmpvar, [Call('input'), Movl(Register('eax'),tmpvar)])
 
     def visit_Const(self, node, *args, **kwargs):
         return (Imm32(node.value), [])
@@ -74,12 +67,12 @@ class P0InstructionSelector(object):
     def visit_Name(self, node, *args, **kwargs):
         if not self.varalloc.is_allocated(node.name):
             raise Exception("Attempt to access an undefined variable '%s' node '%s'" % (node.name, node))
-        return (Var(node.name), [])
+        return (self.varalloc.var(node.name), [])
 
 
 if __name__ == "__main__":
-    import sys, compiler
-    from p0parser import P0Parser
+    import sys
+    from p0parser import P0Parser, parseFile
     from p0flattener import P0Flattener
     if len(sys.argv) < 2:
         sys.exit(1)
@@ -87,12 +80,12 @@ if __name__ == "__main__":
     for testcase in testcases:
         #parser = P0Parser()
         #parser.build()
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         #ast = parser.parseFile(testcase)
         varalloc = VariableAllocator()
         p0flattener = P0Flattener(varalloc)
         stmtlist = p0flattener.flatten(ast)
         instruction_selector = P0InstructionSelector(varalloc)
-        print stmtlist
+        print(stmtlist)
         program = instruction_selector.visit(stmtlist)
-        print program
+        print(program)
@@ -2,26 +2,50 @@
 # CSCI5225
 # HW2
 # Lexer implementation
+#
+# The token rules are compiled into p0lextab.py, which build() loads instead
+# of compiling the regular expressions again.  Run `make tables` after
+# changing a rule; lex does not notice that p0lextab.py is out of date.
+from __future__ import print_function
+import os, codecs
+from functools import partial
 import ply.lex as lex
 
+TABDIR = os.path.dirname(os.path.abspath(__file__))
+
+def unescape(s):
+    """Replaces the backslash escapes in the body of a string literal."""
+    if bytes is str:
+        return s.decode('string_escape')
+    # Python 3 only has the codec for bytes
+    return codecs.escape_decode(s.encode('latin-1'))[0].decode('latin-1')
+
+# how much a token changes the bracket depth by
+BRACKETS = {'LPAREN': 1, 'LBRACKET': 1, 'LBRACE': 1,
+            'RPAREN': -1, 'RBRACKET': -1, 'RBRACE': -1}
+
 class P0Lexer:
     # reserved words.
     # this is suggested by the PLY documentation instead of having
     # separate tokens for each reserved word
     reserved = {
         'print' : 'PRINT',
-        'input' : 'INPUT',
-        'True' : 'TRUE',
-        'False' : 'FALSE',
         'and' : 'AND',
         'or' : 'OR',
+        'not' : 'NOT',
         'is' : 'IS',
-        'if' : 'IF',        
-        'else':'ELSE'
+        'if' : 'IF',
+        'elif' : 'ELIF',
+        'else' : 'ELSE',
+        'while' : 'WHILE',
+        'def' : 'DEF',
+        'return' : 'RETURN',
+        'lambda' : 'LAMBDA',
+        'class' : 'CLASS',
+        'pass' : 'PASS',
     }
 
     tokens = (
-              'NOT',
               'LBRACKET',
               'RBRACKET',
               'LBRACE',
@@ -30,7 +54,10 @@ class P0Lexer:
               'NOTEQUALS',
               'COMMA',
               'COLON',
+              'SEMI',
+              'DOT',
               'CONST',       # constant integer
+              'STRING',      # string literal
               'NAME',        # identifier (variable or function name)
               'PLUS',        # addition operator (+)
               'EQUALS',      # assignment operator (=)
@@ -38,23 +65,30 @@ class P0Lexer:
               'LPAREN',      # (
               'RPAREN',      # )
               'NEWLINE',     # a new line to separate statements.
+              'INDENT',      # inserted by filter()
+              'DEDENT',      # inserted by filter()
               'ENDMARKER',   # end of file
-             ) + tuple(reserved.values())
+              'ISNOT',       # is not, made from IS NOT by filter()
+             ) + tuple(sorted(reserved.values()))
 
     # whitespace
-    t_ignore = ' \t'  # ignore space and horizontal tab
+    t_ignore = ' \t\f'  # ignore space, horizontal tab and form feed
 
     # newline handling
     def t_newline(self, t):
         r'\n+'
-        t.lexer.lineno += t.value.count("\n")
+        t.lexer.lineno += len(t.value)
         t.type = 'NEWLINE'
         return t
 
+    # a backslash joins two lines into one
+    def t_continuation(self, t):
+        r'\\\n'
+        t.lexer.lineno += 1
+
     # error handling
     def t_error(self, t):
-        print "Illegal character '%s'" % t.value[0]
-        t.lexer.skip(1)
+        raise SyntaxError("Illegal character '%s' on line %d" % (t.value[0], t.lineno))
 
     # basic tokens
     t_PLUS    = r'\+'
@@ -67,19 +101,26 @@ class P0Lexer:
     t_LBRACE = r'{'
     t_RBRACE = r'}'
     t_COLON = r':'
+    t_SEMI = r';'
+    t_DOT = r'\.'
     t_EQUALITY = r'=='
-    t_AND = r'and'
-    t_OR = r'or'
     t_NOTEQUALS = r'!='
-    t_IF = r'if'
-    t_ELSE = r'else'
     t_COMMA = r','
     t_ignore_COMMENT = r'\#.*'
-    t_TRUE = r'True'
-    t_FALSE = r'False'
-    t_NOT = r'not'
     # advanced tokens (defined as functions)
 
+    # string literals, with the escapes of Python's; a long string may span
+    # lines, and has the line it ends on like in compiler.parse
+    def t_STRING(self, t):
+        r'''\'\'\'(?:[^\'\\]|\\(?:.|\n)|\'(?!\'\'))*\'\'\'|"""(?:[^"\\]|\\(?:.|\n)|"(?!""))*"""|\'(?:[^\'\\\n]|\\(?:.|\n))*\'|"(?:[^"\\\n]|\\(?:.|\n))*"'''
+        t.lexer.lineno += t.value.count('\n')
+        t.lineno = t.lexer.lineno
+        if t.value[:3] in ("'''", '"""'):
+            t.value = unescape(t.value[3:-3])
+        else:
+            t.value = unescape(t.value[1:-1])
+        return t
+
     # identifiers (names)
     def t_NAME(self, t):
         r'[a-zA-Z_][a-zA-Z_0-9]*'
@@ -89,55 +130,123 @@ class P0Lexer:
         t.type = self.reserved.get(t.value,'NAME')
         return t
 
-    # constants (numeric)
+    # constants (numeric), decimal, octal or hex like Python's
     def t_CONST(self, t):
-        r'\d+'
-        try:
-            t.value = int(t.value)
-        except:
-            print "Integer value too large: ", t.value
-            t.value = 0
+        r'0[xX][0-9a-fA-F]+|\d+'
+        t.value = int(t.value, 0)
         return t
 
-    # Build the lexer
+    # Build the lexer from p0lextab.py
     def build(self,**kwargs):
+        kwargs.setdefault('optimize', 1)
+        kwargs.setdefault('lextab', 'p0lextab')
+        kwargs.setdefault('outputdir', TABDIR)
         self.lexer = lex.lex(module=self, **kwargs)
 
-    # add an ENDMARKER at the very end of the token stream
-    # this marks the end of the file
+    def _token(self, type, lineno, lexpos):
+        token = lex.LexToken()
+        token.type = type
+        token.value = None
+        token.lineno = lineno
+        token.lexpos = lexpos
+        return token
+
+    def _indentation(self, token):
+        """The column the line of token starts its first token at, tabs
+        going to the next multiple of 8 as in Python."""
+        data = self.lexer.lexdata
+        col = 0
+        for c in data[data.rfind('\n', 0, token.lexpos) + 1:token.lexpos]:
+            if c == '\t':
+                col = (col // 8 + 1) * 8
+            elif c == ' ':
+                col += 1
+            elif c == '\f':
+                col = 0
+            else:
+                # only after a backslash continuation, which is no line start
+                break
+        return col
+
+    # Turn the raw tokens into Python's logical lines: NEWLINEs inside
+    # brackets and those ending blank or comment lines are dropped, the
+    # indentation of every line becomes INDENT and DEDENT tokens, is not
+    # becomes one ISNOT token, and an ENDMARKER is added at the very end of
+    # the token stream.
     def filter(self, add_endmarker=True):
-        tokens = iter(self.lexer.token,None)
-        for token in tokens:
+        indents = [0]
+        depth = 0
+        at_line_start = True
+        is_token = None
+        for token in iter(self.lexer.token, None):
+            type = token.type
+            if type == 'NEWLINE':
+                if depth == 0 and not at_line_start:
+                    at_line_start = True
+                    if is_token is not None:
+                        yield is_token
+                        is_token = None
+                    yield token
+                continue
+            if is_token is not None:
+                if type == 'NOT':
+                    is_token.type = 'ISNOT'
+                    is_token.value = 'is not'
+                    yield is_token
+                    is_token = None
+                    continue
+                yield is_token
+                is_token = None
+            if at_line_start:
+                at_line_start = False
+                col = self._indentation(token)
+                if col > indents[-1]:
+                    indents.append(col)
+                    yield self._token('INDENT', token.lineno, token.lexpos)
+                elif col < indents[-1]:
+                    while col < indents[-1]:
+                        indents.pop()
+                        yield self._token('DEDENT', token.lineno, token.lexpos)
+                    if col != indents[-1]:
+                        raise SyntaxError("Unindent does not match any outer indentation level on line %d" % token.lineno)
+            if type in BRACKETS:
+                depth += BRACKETS[type]
+            elif type == 'IS':
+                is_token = token
+                continue
             yield token
 
+        if is_token is not None:
+            yield is_token
+        lineno = self.lexer.lineno
+        lexpos = self.lexer.lexpos
+        if not at_line_start:
+            yield self._token('NEWLINE', lineno, lexpos)
+        for i in range(len(indents) - 1):
+            yield self._token('DEDENT', lineno, lexpos)
         if add_endmarker:
-            token = lex.LexToken()
-            token.type = 'ENDMARKER'
-            token.value = None
-            token.lineno = 0 
-            token.lexpos = 0 
-            yield token
+            yield self._token('ENDMARKER', lineno, lexpos)
 
     def input(self, data, add_endmarker=True):
         self.lexer.input(data)
+        self.lexer.lineno = 1
         self.token_stream = self.filter(add_endmarker)
+        # yacc calls token() once for every token, this saves a frame
+        self.token = partial(next, self.token_stream, None)
 
     # implement the token interface
     def token(self):
-        try:
-            return self.token_stream.next()
-        except StopIteration:
-            return None
+        return next(self.token_stream, None)
 
     def __iter__(self):
         return self.token_stream
 
 # main function
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
 
     if len(sys.argv) < 2:
-        print "Usage: %s <input-file> [input-files...]" % sys.argv[0]
+        print("Usage: %s <input-file> [input-files...]" % sys.argv[0])
         sys.exit(1)
 
     # build the lexer and run
@@ -150,4 +259,4 @@ if __name__ == "__main__":
         f.close()
         lexer.input(data)
         for token in lexer:
-            print token
+            print(token)
@@ -0,0 +1,9 @@
+# p0lextab.py. This file automatically created by PLY (version 3.4). Don't edit!
+_tabversion   = '3.4'
+_lextokens    = {'DEDENT': 1, 'NOTEQUALS': 1, 'ELIF': 1, 'CONST': 1, 'LBRACKET': 1, 'WHILE': 1, 'COLON': 1, 'PRINT': 1, 'ENDMARKER': 1, 'MINUS': 1, 'DOT': 1, 'STRING': 1, 'EQUALITY': 1, 'SEMI': 1, 'NEWLINE': 1, 'PLUS': 1, 'DEF': 1, 'ISNOT': 1, 'COMMA': 1, 'CLASS': 1, 'RBRACE': 1, 'IS': 1, 'EQUALS': 1, 'ELSE': 1, 'LPAREN': 1, 'PASS': 1, 'RPAREN': 1, 'IF': 1, 'AND': 1, 'RETURN': 1, 'LBRACE': 1, 'INDENT': 1, 'NAME': 1, 'NOT': 1, 'RBRACKET': 1, 'OR': 1, 'LAMBDA': 1}
+_lexreflags   = 0
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_newline>\\n+)|(?P<t_continuation>\\\\\\n)|(?P<t_STRING>\\\'\\\'\\\'(?:[^\\\'\\\\]|\\\\(?:.|\\n)|\\\'(?!\\\'\\\'))*\\\'\\\'\\\'|"""(?:[^"\\\\]|\\\\(?:.|\\n)|"(?!""))*"""|\\\'(?:[^\\\'\\\\\\n]|\\\\(?:.|\\n))*\\\'|"(?:[^"\\\\\\n]|\\\\(?:.|\\n))*")|(?P<t_NAME>[a-zA-Z_][a-zA-Z_0-9]*)|(?P<t_CONST>0[xX][0-9a-fA-F]+|\\d+)|(?P<t_ignore_COMMENT>\\#.*)|(?P<t_LBRACKET>\\[)|(?P<t_PLUS>\\+)|(?P<t_DOT>\\.)|(?P<t_NOTEQUALS>!=)|(?P<t_LPAREN>\\()|(?P<t_RBRACKET>\\])|(?P<t_RPAREN>\\))|(?P<t_EQUALITY>==)|(?P<t_RBRACE>})|(?P<t_COLON>:)|(?P<t_COMMA>,)|(?P<t_LBRACE>{)|(?P<t_SEMI>;)|(?P<t_MINUS>-)|(?P<t_EQUALS>=)', [None, ('t_newline', 'newline'), ('t_continuation', 'continuation'), ('t_STRING', 'STRING'), ('t_NAME', 'NAME'), ('t_CONST', 'CONST'), (None, None), (None, 'LBRACKET'), (None, 'PLUS'), (None, 'DOT'), (None, 'NOTEQUALS'), (None, 'LPAREN'), (None, 'RBRACKET'), (None, 'RPAREN'), (None, 'EQUALITY'), (None, 'RBRACE'), (None, 'COLON'), (None, 'COMMA'), (None, 'LBRACE'), (None, 'SEMI'), (None, 'MINUS'), (None, 'EQUALS')])]}
+_lexstateignore = {'INITIAL': ' \t\x0c'}
+_lexstateerrorf = {'INITIAL': 't_error'}
@@ -1,181 +1,474 @@
 # vim: set ts=4 sw=4 expandtab:
 # start of parser
-from compiler.ast import *
-from p0lexer import P0Lexer
+#
+# Parses P3 into the same tree, line numbers included, that compiler.parse
+# gives, made of the nodes in pyast.  The LALR tables are pickled in
+# p0parsetab.pickle next to this file; build() loads them and only generates
+# them again (rewriting the pickle) if the grammar below has changed since.
+# `make tables` regenerates them along with the lexer's.
+#
+# Line numbers follow compiler.transformer: an operator chain (or, and, +/-)
+# gets the line of its first operator and a comparison that of its last, a
+# call or subscript the line of the first token of its first argument, and
+# so on.  yacc's position tracking would slow down every reduction, so the
+# line of a first argument is looked up in the source instead, see
+# line_after().  Lists are built in place, appending to a copy would make
+# long blocks quadratic.
+from __future__ import print_function
+import os, re
+from pyast import *
+from p0lexer import P0Lexer, TABDIR
 import ply.yacc as yacc
 
-class P0Parser:
-    # precedence
-    precedence = (
-        ('nonassoc','PRINT'),
-        ('left','PLUS'),
-        ('left','MINUS')
-    )
+PICKLEFILE = os.path.join(TABDIR, 'p0parsetab.pickle')
+
+# what the lexer skips between two tokens
+SKIPPED = re.compile(r'(?:[ \t\f\n]|\\\n|\#[^\n]*)*')
 
+# raised by the grammar rules; a SyntaxError would make yacc try to recover
+class RuleError(Exception):
+    pass
+
+class P0Parser:
     def __init__(self):
         self.lexer = P0Lexer()
         self.lexer.build()
         self.tokens = self.lexer.tokens
 
+    # Statements
+    # ================================================================================
     def p_module(self, p):
-        r'module : statements'
-        p[0] = Module(None,p[1])
-    
-    def p_empty(self, p):
-        r'''empty : '''
-    
+        r'''module : ENDMARKER
+                   | statements ENDMARKER'''
+        if len(p) == 2:
+            p[0] = Module(None, Stmt([]))
+        else:
+            code = Stmt(p[1])
+            p[0] = Module(self.docstring(code), code)
+
+    # the rules yacc reduces for nearly every statement or operand have one
+    # function per production, which saves the len(p)
+
+    def p_statements_first(self, p):
+        r'''statements : statement'''
+        p[0] = p[1]
+
     def p_statements(self, p):
-        r'''statements : endofstmt
-                       | statement endofstmt
-                       | statements endofstmt
-                       | statements statement endofstmt'''
-        if len(p) == 4:
-            p[0] = Stmt(p[1].nodes + [p[2]])
-        elif len(p) == 3:
-            if isinstance(p[1], Stmt):
-                p[0] = p[1]
-            else:
-                p[0] = Stmt([p[1]])
-        else:
-            p[0] = Stmt([])
-           
-    def p_dict(self, p):
-        r'''expression : LBRACE key_datum_list RBRACE'''
-        p[0] = Dict(p[2])
-        
-    def p_keydatum(self, p):
-        r'''key_datum : expression COLON expression'''
-        p[0] = (p[1], p[3]) 
-    def p_keydatum_list(self, p):
-        r'''key_datum_list : empty
-                           | key_datum
-                           | key_datum key_datum_list'''
+        r'''statements : statements statement'''
+        p[1].extend(p[2])
+        p[0] = p[1]
+
+    def p_statement_simple(self, p):
+        r'''statement : simple_statements NEWLINE'''
+        p[0] = p[1]
+
+    # compiler.parse makes a Discard of None out of a trailing ';'
+    def p_statement_simple_semi(self, p):
+        r'''statement : simple_statements SEMI NEWLINE'''
+        p[1].append(Discard(Const(None)))
+        p[0] = p[1]
+
+    def p_statement_compound(self, p):
+        r'''statement : if_statement
+                      | while_statement
+                      | funcdef
+                      | classdef'''
+        p[0] = [p[1]]
+
+    def p_simple_statements_first(self, p):
+        r'''simple_statements : simple_statement'''
+        p[0] = [p[1]]
+
+    def p_simple_statements(self, p):
+        r'''simple_statements : simple_statements SEMI simple_statement'''
+        p[1].append(p[3])
+        p[0] = p[1]
+
+    def p_suite(self, p):
+        r'''suite : simple_statements NEWLINE
+                  | simple_statements SEMI NEWLINE
+                  | NEWLINE INDENT statements DEDENT'''
+        if len(p) == 5:
+            p[0] = Stmt(p[3])
+        elif len(p) == 4:
+            p[1].append(Discard(Const(None)))
+            p[0] = Stmt(p[1])
+        else:
+            p[0] = Stmt(p[1])
+
+    def p_statement_print(self, p):
+        r'''simple_statement : PRINT
+                             | PRINT print_list
+                             | PRINT print_list COMMA'''
         if len(p) == 2:
-            p[0] = Dict([p[1]])
-        else:
-            p[0] = Dict([p[1]]+p[2].items)
-        
-    def p_endofstmt(self, p):
-        r'''endofstmt : ENDMARKER
-                      | NEWLINE
-                      | NEWLINE ENDMARKER'''
-        return None
+            p[0] = Printnl([], None, lineno=p.lineno(1))
+        elif len(p) == 3:
+            p[0] = Printnl(p[2], None, lineno=p.lineno(1))
+        else:
+            p[0] = Print(p[2], None, lineno=p.lineno(1))
 
-    def p_expression_notequals(self, p):
-        r'''expression : expression NOTEQUALS expression'''
-        p[0] = Compare('!=', [p[1],p[3]])
-        
-    def p_expression_equality(self, p):
-        r'''expression : expression EQUALITY expression'''
-        p[0] = Compare('==', [p[1],p[3]])
-
-    def p_expression_or(self, p):
-        r'''expression : expression OR expression'''
-        p[0] = Or(p[1], p[3])
-    def p_expression_and(self, p):
-        r'''expression : expression AND expression'''
-        p[0] = And(p[1], p[3])
-
-    def p_expression_if(self, p):
-        r'''expression : expression IF expression ELSE expression'''
-        p[0] = IfExp(p[3], p[1], p[5])
-
-    def p_expression_is(self, p):
-        r'''expression : expression IS expression'''
-        p[0] = Compare('is', p[1], p[3])
-
-    def p_expression_list(self, p):
-        r'''expression : LBRACKET expr_list RBRACKET'''
-        p[0] = List(p[2])
-        
-    def p_expr_list(self,p):
-        r'''expr_list : empty
-                      | expression
-                      | expression COMMA expression'''
+    def p_print_list(self, p):
+        r'''print_list : test
+                       | print_list COMMA test'''
         if len(p) == 2:
             p[0] = [p[1]]
-        elif len(p) == 4:
-            p[0] = [p[1],p[3]].flatten()
-            
-    def p_expression_not(self, p):
-        r'''expression : NOT expression'''
-        p[0] = Not(p[2])
+        else:
+            p[1].append(p[3])
+            p[0] = p[1]
 
-    def p_statement_print(self, p):
-        r'''statement : PRINT expression'''
-        p[0] = Printnl([p[2]], None)
+    def p_statement_return(self, p):
+        r'''simple_statement : RETURN
+                             | RETURN test'''
+        if len(p) == 2:
+            p[0] = Return(Const(None), lineno=p.lineno(1))
+        else:
+            p[0] = Return(p[2], lineno=p.lineno(1))
 
-    def p_statement_assign(self, p):
-        r'''statement : NAME EQUALS expression'''
-        p[0] = Assign([AssName(p[1],'OP_ASSIGN')],p[3])
+    def p_statement_pass(self, p):
+        r'''simple_statement : PASS'''
+        p[0] = Pass(lineno=p.lineno(1))
 
     def p_statement_expr(self, p):
-        r'''statement : expression'''
-        p[0] = Discard(p[1])
+        r'''simple_statement : test'''
+        p[0] = Discard(p[1], lineno=p[1].lineno)
 
-    def p_expression_const(self, p):
-        r'expression : CONST'
-        p[0] = Const(p[1])
+    def p_statement_assign(self, p):
+        r'''simple_statement : targets test'''
+        nodes, lineno = p[1]
+        p[0] = Assign(nodes, p[2], lineno=lineno)
 
-    def p_expression_name(self, p):
-        r'expression : NAME'
-        p[0] = Name(p[1])
+    # the left hand sides of a = b = ..., with the line of the first '='
+    def p_targets(self, p):
+        r'''targets : test EQUALS
+                    | targets test EQUALS'''
+        if len(p) == 3:
+            p[0] = ([self.target(p[1])], p.lineno(2))
+        else:
+            p[1][0].append(self.target(p[2]))
+            p[0] = p[1]
 
-    def p_expression_add(self, p):
-        r'expression : expression PLUS expression'
-        p[0] = Add((p[1],p[3]))
+    def target(self, node):
+        """The assignment target for an expression parsed on the left of
+        an '='."""
+        if isinstance(node, Name):
+            return AssName(node.name, 'OP_ASSIGN', lineno=node.lineno)
+        elif isinstance(node, Getattr):
+            return AssAttr(node.expr, node.attrname, 'OP_ASSIGN', lineno=node.lineno)
+        elif isinstance(node, Subscript):
+            return Subscript(node.expr, 'OP_ASSIGN', node.subs, lineno=node.lineno)
+        raise RuleError("can't assign to %s on line %s" % (node.__class__.__name__, node.lineno))
 
-    def p_expression_unarysub(self, p):
-        r'expression : MINUS expression'
-        p[0] = UnarySub(p[2])
+    def p_if_statement(self, p):
+        r'''if_statement : if_tests
+                         | if_tests ELSE COLON suite'''
+        tests, lineno = p[1]
+        if len(p) == 2:
+            p[0] = If(tests, None, lineno=lineno)
+        else:
+            p[0] = If(tests, p[4], lineno=lineno)
 
-    def p_expression_input(self, p):
-        r'expression : INPUT LPAREN RPAREN'
-        p[0] = CallFunc(Name('input'),[])
+    def p_if_tests(self, p):
+        r'''if_tests : IF test COLON suite
+                     | if_tests ELIF test COLON suite'''
+        if len(p) == 5:
+            p[0] = ([(p[2], p[4])], p.lineno(1))
+        else:
+            p[1][0].append((p[3], p[5]))
+            p[0] = p[1]
 
-    def p_expression_paren(self, p):
-        r'expression : LPAREN expression RPAREN'
-        p[0] = p[2]
-    
-    def p_expression_boolean_true(self, p):
-        r'''expression : TRUE'''
-        p[0] = Const(1)
-        
-    def p_expression_boolean_false(self, p):
-        r'''expression : FALSE'''
-        p[0] = Const(0)    
-        
-    def p_target(self,p):
-        r'''target : NAME
-                   | subscription'''
+    def p_while_statement(self, p):
+        r'''while_statement : WHILE test COLON suite'''
+        p[0] = While(p[2], p[4], None, lineno=p.lineno(1))
+
+    def p_funcdef(self, p):
+        r'''funcdef : DEF NAME LPAREN RPAREN COLON suite
+                    | DEF NAME LPAREN parameters RPAREN COLON suite'''
+        if len(p) == 7:
+            p[0] = Function(None, p[2], (), (), 0, self.docstring(p[6]), p[6], lineno=p.lineno(2))
+        else:
+            p[0] = Function(None, p[2], p[4], [], 0, self.docstring(p[7]), p[7], lineno=p.lineno(2))
+
+    def p_parameters(self, p):
+        r'''parameters : NAME
+                       | parameters COMMA NAME'''
+        if len(p) == 2:
+            p[0] = [p[1]]
+        else:
+            p[1].append(p[3])
+            p[0] = p[1]
+
+    def p_classdef(self, p):
+        r'''classdef : CLASS NAME COLON suite
+                     | CLASS NAME LPAREN RPAREN COLON suite
+                     | CLASS NAME LPAREN arguments RPAREN COLON suite'''
+        if len(p) == 5:
+            p[0] = Class(p[2], [], self.docstring(p[4]), p[4], lineno=p.lineno(2))
+        elif len(p) == 7:
+            p[0] = Class(p[2], [], self.docstring(p[6]), p[6], lineno=p.lineno(2))
+        else:
+            p[0] = Class(p[2], p[4], self.docstring(p[7]), p[7], lineno=p.lineno(2))
+
+    def docstring(self, code):
+        """Takes the docstring, a string on its own as the first statement,
+        out of the Stmt code and returns it; None if there is none."""
+        if code.nodes and code.nodes[0].__class__ is Discard:
+            expr = code.nodes[0].expr
+            if expr.__class__ is Const and isinstance(expr.value, str) and id(expr) not in self.parens:
+                del code.nodes[0]
+                return expr.value
+        return None
+
+    # Expressions
+    # ================================================================================
+    # Below test, expressions are one ambiguous nonterminal whose operators
+    # are told apart by the precedence table, so an operand is a single
+    # reduction instead of one per level of Python's grammar.  The nodes of
+    # parenthesized expressions are remembered in self.parens: a chain of
+    # operators (a or b or c, a == b != c, a + b - c) becomes one node, or
+    # shares one line number, only as far as no parentheses split it.
+    precedence = (
+        ('left', 'OR'),
+        ('left', 'AND'),
+        ('right', 'NOT'),
+        ('left', 'EQUALITY', 'NOTEQUALS', 'IS', 'ISNOT'),
+        ('left', 'PLUS', 'MINUS'),
+        ('right', 'UMINUS'),
+        ('left', 'LPAREN', 'LBRACKET', 'DOT'),
+    )
+
+    def operand(self, node):
+        """Python's grammar has no place for a bare not below the and
+        level, e.g. a == not b, which the precedence table would take."""
+        if node.__class__ is Not and id(node) not in self.parens:
+            raise RuleError("invalid syntax at 'not' on line %d" % node.lineno)
+        return node
+
+    def p_test(self, p):
+        r'''test : expr
+                 | lambdef'''
+        p[0] = p[1]
+
+    def p_test_ifexp(self, p):
+        r'''test : expr IF expr ELSE test'''
+        p[0] = IfExp(p[3], p[1], p[5], lineno=p.lineno(2))
+
+    def p_lambdef(self, p):
+        r'''lambdef : LAMBDA COLON test
+                    | LAMBDA parameters COLON test'''
+        if len(p) == 4:
+            p[0] = Lambda((), (), 0, p[3], lineno=p.lineno(1))
+        else:
+            p[0] = Lambda(p[2], [], 0, p[4], lineno=p.lineno(1))
+
+    def p_expr_or(self, p):
+        r'''expr : expr OR expr'''
+        left = p[1]
+        if left.__class__ is Or and id(left) not in self.parens:
+            left.nodes.append(p[3])
+            p[0] = left
+        else:
+            p[0] = Or([left, p[3]], lineno=p.lineno(2))
+
+    def p_expr_and(self, p):
+        r'''expr : expr AND expr'''
+        left = p[1]
+        if left.__class__ is And and id(left) not in self.parens:
+            left.nodes.append(p[3])
+            p[0] = left
+        else:
+            p[0] = And([left, p[3]], lineno=p.lineno(2))
+
+    def p_expr_not(self, p):
+        r'''expr : NOT expr'''
+        p[0] = Not(p[2], lineno=p.lineno(1))
+
+    # a comparison has the line of its last operator
+    def p_expr_compare(self, p):
+        r'''expr : expr EQUALITY expr
+                 | expr NOTEQUALS expr
+                 | expr IS expr
+                 | expr ISNOT expr'''
+        left = p[1]
+        op = p[2]
+        if left.__class__ is Compare and id(left) not in self.parens:
+            left.ops.append((op, self.operand(p[3])))
+            left.lineno = p.lineno(2)
+            p[0] = left
+        else:
+            p[0] = Compare(left, [(op, self.operand(p[3]))], lineno=p.lineno(2))
+
+    # every + and - of a chain has the line of the chain's first operator
+    def p_expr_arith(self, p):
+        r'''expr : expr PLUS expr
+                 | expr MINUS expr'''
+        left = p[1]
+        if (left.__class__ is Add or left.__class__ is Sub) and id(left) not in self.parens:
+            lineno = left.lineno
+        else:
+            lineno = p.lineno(2)
+        if p[2] == '+':
+            p[0] = Add((left, self.operand(p[3])), lineno=lineno)
+        else:
+            p[0] = Sub((left, self.operand(p[3])), lineno=lineno)
+
+    def p_expr_unary(self, p):
+        r'''expr : MINUS expr %prec UMINUS
+                 | PLUS expr %prec UMINUS'''
+        if p[1] == '-':
+            p[0] = UnarySub(self.operand(p[2]), lineno=p.lineno(1))
+        else:
+            p[0] = UnaryAdd(self.operand(p[2]), lineno=p.lineno(1))
+
+    def p_expr_call(self, p):
+        r'''expr : expr LPAREN RPAREN
+                 | expr LPAREN arguments RPAREN
+                 | expr LPAREN arguments COMMA RPAREN'''
+        if len(p) == 4:
+            p[0] = CallFunc(p[1], [], None, None, lineno=p.lineno(3))
+        else:
+            p[0] = CallFunc(p[1], p[3], None, None, lineno=self.line_after(p, 2))
+
+    # a[i, j] has one sub per index, as compiler.parse gives it
+    def p_expr_subscript(self, p):
+        r'''expr : expr LBRACKET subscriptlist RBRACKET
+                 | expr LBRACKET subscriptlist COMMA RBRACKET'''
+        p[0] = Subscript(p[1], 'OP_APPLY', p[3], lineno=self.line_after(p, 2))
+
+    def p_subscriptlist_first(self, p):
+        r'''subscriptlist : test'''
+        p[0] = [p[1]]
+
+    def p_subscriptlist(self, p):
+        r'''subscriptlist : subscriptlist COMMA test'''
+        p[1].append(p[3])
         p[0] = p[1]
-        
-    def p_target_statement(self, p):
-        r'''statement : target EQUALS expression'''
-        Assign([AssName(p[1],'OP_ASSIGN')],p[3])
-        
+
+    def p_expr_getattr(self, p):
+        r'''expr : expr DOT NAME'''
+        p[0] = Getattr(p[1], p[3], lineno=p.lineno(3))
+
+    def line_after(self, p, n):
+        """The line of the token after the token p[n]."""
+        data = self.lexer.lexer.lexdata
+        start = p.lexpos(n) + 1
+        return p.lineno(n) + data.count('\n', start, SKIPPED.match(data, start).end())
+
+    def p_arguments_first(self, p):
+        r'''arguments : test'''
+        p[0] = [p[1]]
+
+    def p_arguments(self, p):
+        r'''arguments : arguments COMMA test'''
+        p[1].append(p[3])
+        p[0] = p[1]
+
+    def p_expr_name(self, p):
+        r'expr : NAME'
+        p[0] = Name(p[1], lineno=p.lineno(1))
+
+    def p_expr_const(self, p):
+        r'expr : CONST'
+        p[0] = Const(p[1], lineno=p.lineno(1))
+
+    def p_expr_string(self, p):
+        r'expr : strings'
+        p[0] = p[1]
+
+    # adjacent string literals are one constant
+    def p_strings(self, p):
+        r'''strings : STRING
+                    | strings STRING'''
+        if len(p) == 2:
+            p[0] = Const(p[1], lineno=p.lineno(1))
+        else:
+            p[1].value += p[2]
+            p[0] = p[1]
+
+    def p_expr_paren(self, p):
+        r'expr : LPAREN test RPAREN'
+        self.parens.add(id(p[2]))
+        p[0] = p[2]
+
+    def p_expr_list(self, p):
+        r'''expr : LBRACKET RBRACKET
+                 | LBRACKET arguments RBRACKET
+                 | LBRACKET arguments COMMA RBRACKET'''
+        if len(p) == 3:
+            p[0] = List((), lineno=p.lineno(1))
+        else:
+            p[0] = List(p[2], lineno=p[2][0].lineno)
+
+    def p_expr_dict(self, p):
+        r'''expr : LBRACE RBRACE
+                 | LBRACE dict_items RBRACE
+                 | LBRACE dict_items COMMA RBRACE'''
+        if len(p) == 3:
+            p[0] = Dict((), lineno=p.lineno(1))
+        else:
+            p[0] = Dict(p[2], lineno=p[2][0][0].lineno)
+
+    def p_dict_items(self, p):
+        r'''dict_items : test COLON test
+                       | dict_items COMMA test COLON test'''
+        if len(p) == 4:
+            p[0] = [(p[1], p[3])]
+        else:
+            p[1].append((p[3], p[5]))
+            p[0] = p[1]
+
     # Error rule for syntax errors
     def p_error(self, p):
-        raise SyntaxError(p)
+        if p is None:
+            raise SyntaxError('unexpected end of file')
+        if p.type in ('NEWLINE', 'INDENT', 'DEDENT', 'ENDMARKER'):
+            raise SyntaxError("unexpected %s on line %d" % (p.type, p.lineno))
+        raise SyntaxError("invalid syntax at '%s' on line %d" % (p.value, p.lineno))
 
     def build(self, **kwargs):
+        kwargs.setdefault('picklefile', PICKLEFILE)
+        kwargs.setdefault('debug', 0)
         self.parser = yacc.yacc(module=self, **kwargs)
 
     def parse(self, data):
-        return self.parser.parse(data, lexer=self.lexer, debug=0)
+        self.parens = set()
+        try:
+            return self.parser.parse(data, lexer=self.lexer)
+        except RuleError as e:
+            raise SyntaxError(str(e))
+        finally:
+            self.parens = None
 
     def parseFile(self, filename):
         f = open(filename,'r')
         data = f.read()
         f.close()
-        return self.parse(data)
+        # like compiler.parseFile, so the last line needs no newline
+        return self.parse(data + '\n')
+
+# the parser parse() and parseFile() share, built on first use
+_parser = None
+
+def _shared():
+    global _parser
+    if _parser is None:
+        _parser = P0Parser()
+        _parser.build()
+    return _parser
+
+def parse(data):
+    """Parses P3 source text, like compiler.parse."""
+    return _shared().parse(data)
+
+def parseFile(filename):
+    """Parses a P3 source file, like compiler.parseFile."""
+    return _shared().parseFile(filename)
 
 # main function
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
 
     if len(sys.argv) < 2:
-        print "Usage: %s <input-file> [input-files...]" % sys.argv[0]
+        print("Usage: %s <input-file> [input-files...]" % sys.argv[0])
         sys.exit(1)
 
     # build the lexer and run
@@ -186,4 +479,4 @@ if __name__ == "__main__":
         f = open(filename, 'r')
         data = f.read()
         f.close()
-        print str(pars.parse(data))
+        print(str(pars.parse(data)))
@@ -1,12 +1,14 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 from p0spillgenerator import P0SpillGenerator
 import logging
+from visitor import Visitor
 
 
-class P0RegAllocator:
+class P0RegAllocator(Visitor):
     ALL_REGS = [Register('eax'), Register('ebx'), Register('ecx'), Register('edx'), Register('edi'), Register('esi')]
     CALLER_SAVE = [Register('eax'), Register('ecx'), Register('edx')]
     ALL_SLOTS = set(range(0,500))
@@ -45,6 +47,21 @@ class P0RegAllocator:
         self._add_directed_edge(a,b)
         self._add_directed_edge(b,a)
 
+    def _add_edges(self, a, others):
+        """Adds an edge between a and every vertex in others other than a,
+        like _add_edge on each but with one set update for a's side."""
+        graph = self.interf_graph
+        if a not in graph:
+            self._add_vertex(a)
+        adjacent = graph[a]
+        adjacent.update(others)
+        adjacent.discard(a)
+        for b in others:
+            if b is not a:
+                if b not in graph:
+                    self._add_vertex(b)
+                graph[b].add(a)
+
     def liveness_analyze(self):
         instructions = self.program.instructions()
         num_instr = len(instructions)
@@ -98,67 +115,79 @@ class P0RegAllocator:
                 registerset.add(self.register_assgnmnt[neighbor])
         return len(registerset)
 
+    def priority(self, node, saturation):
+        """The priority queue key of node: the negated saturation, to
+        produce the same effect as a max-heap.  Unspillable variables, the
+        temporaries the spill generator introduces, come before all others,
+        so they always find a register."""
+        if node.spillable:
+            return -saturation
+        return -saturation - len(P0RegAllocator.ALL_SLOTS)
+
     def color_graph(self):
         # get the list of vertices that need assignments
         # only include vertices of type 'Var' (ignore Registers)
         vertices = set(filter(lambda x: isinstance(x,Var), self.interf_graph.keys()))
-        # compute the saturation for all the vertices up front
-        # This gets a list of tuples of the form (sat(x),x)
-        nodesat = map(lambda x:(x,self.saturation(x)), vertices)
+        # the registers and stack slots taken by the neighbours of every
+        # vertex; the saturation is the size of the set, kept up to date as
+        # vertices are coloured instead of being counted again
+        neighborcolors = {}
+        for node in vertices:
+            registerset = set()
+            for neighbor in self.interf_graph[node]:
+                if neighbor in self.register_assgnmnt:
+                    registerset.add(self.register_assgnmnt[neighbor])
+            neighborcolors[node] = registerset
         # create a priority queue (see comp_util module) and add all nodes
         # with their corresponding priority
         UNSPILLABLE=1
         SPILLABLE=2
-        saturation_q = priorityq()
-        for node, sat in nodesat:
-            # we negate the saturation to produce the same effect as a max-heap
+        saturation_q = bucketq()
+        for node in vertices:
+            # ties go to unspillable vertices, then to the lower Var id; as
+            # one number, so that the heap never has to compare the Vars
             spillable = SPILLABLE if node.spillable else UNSPILLABLE
-            saturation_q.add_task(-sat, node, spillable)
+            saturation_q.add_task(self.priority(node, len(neighborcolors[node])), node, spillable << 32 | node.id)
         while len(vertices) > 0:
             # find the entry in the list with the highest saturation
             # this corresponds to the "most-constrained" node; we tackle this first 
             sat, node = saturation_q.get_top_priority()
-            #print "Node with highest saturation = %s (%s)" % (node, sat)
-            registerset = set()
-            for neighbor in self.interf_graph[node]:
-                if neighbor in self.register_assgnmnt:
-                    registerset.add(self.register_assgnmnt[neighbor])
-            #print "Register set for node = %s" % (registerset)
-            lowest_unused = min(P0RegAllocator.ALL_SLOTS-registerset)
-            #print "Lowest unused register = %s" % (lowest_unused)
+            registerset = neighborcolors.pop(node)
+            lowest_unused = 0
+            while lowest_unused in registerset:
+                lowest_unused = lowest_unused + 1
             self.register_assgnmnt[node] = lowest_unused
-            #self.print_register_alloc()
             # finally, remove the node from the set of vertices that need colored
-            vertices = vertices - set([node])
-            # We have to re-compute the saturation for all the neighbors of the node, 
-            # and update the priority queue.
+            vertices.discard(node)
+            # The saturation of a neighbour only grows if node's register is
+            # new to it; update those in the priority queue.
             for neighbor in self.interf_graph[node]:
-                # we should never need to know the saturation for a register, so don't
-                # update registers' saturation value
-                if isinstance(neighbor, Var):
-                    # only update saturations for nodes that are still in our list
-                    # of vertices, since the nodes that have already been colored have
-                    # have been removed from the priority queue
-                    if neighbor in vertices:
-                        saturation_q.incr_priority(neighbor,inc=-1)
+                # only nodes that are still in our list of vertices, since the
+                # nodes that have already been colored have been removed from
+                # the priority queue (registers never are in it)
+                if neighbor in vertices:
+                    colors = neighborcolors[neighbor]
+                    if lowest_unused not in colors:
+                        colors.add(lowest_unused)
+                        saturation_q.reprioritize(self.priority(neighbor, len(colors)), neighbor)
 
     def print_liveness(self):
         instructions = self.program.instructions()
         for k in range(0,len(instructions)):
             instr = instructions[k]
-            print "%5s. %-40s : %s" % (k, instr, self.liveness_after_k_dict[k])
+            print("%5s. %-40s : %s" % (k, instr, self.liveness_after_k_dict[k]))
             k = k + 1
 
     def print_graph(self):
-        print "\nGraph:"
-        for k in sorted(self.interf_graph.iterkeys(),key=lambda x:x.name):
-            print "%-20s : %s" % (k,self.interf_graph[k])
+        print("\nGraph:")
+        for k in sorted(self.interf_graph,key=lambda x:x.name):
+            print("%-20s : %s" % (k,self.interf_graph[k]))
 
     def print_register_alloc(self):
-        print "\nRegister allocation:"
-        for k in sorted(self.register_assgnmnt.iterkeys(),key=lambda x:x.name):
+        print("\nRegister allocation:")
+        for k in sorted(self.register_assgnmnt,key=lambda x:x.name):
             if isinstance(k,Var):
-                print "%-20s : %s" % (k,self.get_assignment(k))
+                print("%-20s : %s" % (k,self.get_assignment(k)))
 
     def get_assignment(self,varname):
         if varname not in self.register_assgnmnt:
@@ -190,21 +219,13 @@ class P0RegAllocator:
         self.log.info ('Finished register allocation')
         return self.program
 
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-
     def visit_Program(self, node, *args, **kwargs):
         return Program([self.visit(x) for x in node.statements])
 
     def visit_Statement(self, node, *args, **kwargs):
         instructions = [self.visit(x) for x in node.instructions]
         # filter out any no-ops
-        instructions = filter(lambda x: x is not None, instructions)
+        instructions = [x for x in instructions if x is not None]
         return Statement(instructions,node.source)
 
     def visit_Movl(self, node, *args, **kwargs):
@@ -249,7 +270,7 @@ if __name__ == "__main__":
     for testcase in testcases:
         parser = P0Parser()
         parser.build()
-        #ast = compiler.parseFile(testcase)
+        #ast = parseFile(testcase)
         ast = parser.parseFile(testcase)
         varalloc = VariableAllocator()
         p0flattener = P0Flattener(varalloc)
@@ -257,7 +278,7 @@ if __name__ == "__main__":
         instruction_selector = P0InstructionSelector(varalloc)
         program = instruction_selector.visit(stmtlist)
         regallocator = P0RegAllocator(program, varalloc)
-        print regallocator.substitute()
+        print(regallocator.substitute())
         #import cProfile as profile
         #import pstats
         #output_file = 'profile.out'
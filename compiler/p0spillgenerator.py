@@ -1,11 +1,13 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 import logging
+from visitor import Visitor
 
 
-class P0SpillGenerator:
+class P0SpillGenerator(Visitor):
     def __init__(self, varalloc):
         self.varalloc = varalloc
         self.log = logging.getLogger('compiler.spill')
@@ -18,14 +20,6 @@ class P0SpillGenerator:
         spilled, program = self.visit(program)
         return (spilled, program)
 
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-
     def visit_Program(self, node, *args, **kwargs):
         stmts = []
         spilled = False
@@ -55,18 +49,18 @@ class P0SpillGenerator:
             assert(src.storage is not None)
             assert(dst.storage is not None)
             if isinstance(src.storage, StackSlot) and isinstance(dst.storage, StackSlot):
-                self.log.debug('Detected spill: %s' % node)
-                var = Var(self.varalloc.get_next_var(),False)  # 2nd arg False = unspillable
-                self.log.debug('Introducing variable: %s' % var)
+                self.log.debug('Detected spill: %s', node)
+                var = self.varalloc.var(self.varalloc.get_next_var(),False)  # 2nd arg False = unspillable
+                self.log.debug('Introducing variable: %s', var)
                 # return true for 1st element in tuple, to indicate a spill has happened.
                 return (True, [Movl(src, var), Movl(var, dst)])
         # the following is a special case for Function prologues
         elif isinstance(src, StackSlot) and isinstance(dst, Var):
             assert(dst.storage is not None)
             if isinstance(dst.storage, StackSlot):
-                self.log.debug('Detected spill: %s' % node)
-                var = Var(self.varalloc.get_next_var(),False)  # 2nd arg False = unspillable
-                self.log.debug('Introducing variable: %s' % var)
+                self.log.debug('Detected spill: %s', node)
+                var = self.varalloc.var(self.varalloc.get_next_var(),False)  # 2nd arg False = unspillable
+                self.log.debug('Introducing variable: %s', var)
                 # return true for 1st element in tuple, to indicate a spill has happened.
                 return (True, [Movl(src, var), Movl(var, dst)])
         return (False, [Movl(src,dst)])
@@ -82,9 +76,9 @@ class P0SpillGenerator:
             assert(src.storage is not None)
             assert(dst.storage is not None)
             if isinstance(src.storage, StackSlot) and isinstance(dst.storage, StackSlot):
-                self.log.debug('Detected spill: %s' % node)
-                var = Var(self.varalloc.get_next_var(),False) 
-                self.log.debug('Introducing variable: %s' % var)
+                self.log.debug('Detected spill: %s', node)
+                var = self.varalloc.var(self.varalloc.get_next_var(),False) 
+                self.log.debug('Introducing variable: %s', var)
                 return (True, [Movl(dst, var), Addl(src, var), Movl(var, dst)])
         return (False, [Addl(src,dst)])
 
@@ -97,7 +91,7 @@ class P0SpillGenerator:
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
     from comp_util import *
     from p0parser import P0Parser
     from p0flattener import P0Flattener
@@ -108,7 +102,7 @@ if __name__ == "__main__":
     for testcase in testcases:
         parser = P0Parser()
         parser.build()
-        #ast = compiler.parseFile(testcase)
+        #ast = parseFile(testcase)
         ast = parser.parseFile(testcase)
         varalloc = VariableAllocator()
         flattener = P0Flattener(varalloc)
@@ -116,4 +110,4 @@ if __name__ == "__main__":
         insselector = P0InstructionSelector(varalloc)
         program = insselector.visit(stmtlist)
         regallocator = P0RegAllocator(program, varalloc)
-        print regallocator.substitute()
+        print(regallocator.substitute())
@@ -1,25 +1,94 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from x86ir import *
+import heapq
 import logging
+from visitor import Visitor
+
+def live_ranges(instructions):
+    """Returns a dict mapping every Var in instructions to the (first, last)
+    positions at which it is used.  Instructions are numbered in order, with
+    both branches of an x86If one after the other.  A Var used anywhere in an
+    x86While is taken to live through the whole loop, since its value may be
+    carried around to the next iteration."""
+    ranges = {}
+    pos = [0]
+    def use(x, loopvars):
+        if not isinstance(x, Var):
+            return
+        if x in ranges:
+            ranges[x] = (ranges[x][0], pos[0])
+        else:
+            ranges[x] = (pos[0], pos[0])
+        if loopvars is not None:
+            loopvars.add(x)
+    def walk(instructions, loopvars):
+        for instr in instructions:
+            pos[0] = pos[0] + 1
+            if isinstance(instr, x86If):
+                use(instr.test, loopvars)
+                walk(instr.then, loopvars)
+                walk(instr.else_, loopvars)
+            elif isinstance(instr, x86While):
+                start = pos[0]
+                inloop = set()
+                use(instr.test[0], inloop)
+                walk(instr.test[1], inloop)
+                walk(instr.body, inloop)
+                for x in inloop:
+                    ranges[x] = (min(ranges[x][0], start), pos[0])
+                if loopvars is not None:
+                    loopvars.update(inloop)
+            else:
+                for x in instr.reads():
+                    use(x, loopvars)
+                for x in instr.writes():
+                    use(x, loopvars)
+    walk(instructions, None)
+    return ranges
+
+def assign_slots(ranges):
+    """Numbers stack slots from 1 and gives every Var in ranges one of them,
+    such that Vars whose live ranges overlap never share a slot.  A slot is
+    handed out again as soon as the Var holding it is dead, so the number of
+    slots is the largest number of Vars live at the same time.  Returns
+    ({varname: slot}, number of slots)."""
+    slots = {}
+    numslots = 0
+    active = []     # (last use, slot) of the Vars holding a slot
+    free = []
+    for var in sorted(ranges, key=lambda x: (ranges[x][0], x.id)):
+        first, last = ranges[var]
+        while active and active[0][0] < first:
+            heapq.heappush(free, heapq.heappop(active)[1])
+        if free:
+            slot = heapq.heappop(free)
+        else:
+            numslots = numslots + 1
+            slot = numslots
+        slots[var.name] = slot
+        heapq.heappush(active, (last, slot))
+    return slots, numslots
 
-class P0StackAllocator(object):
+class P0StackAllocator(Visitor):
     """ Class whose sole purpose is to replace Var instances with
-    instances of StackSlot"""
+    instances of StackSlot.  Vars that are never live at the same time
+    share a slot (see assign_slots)."""
     def __init__(self, program):
         self.program = program
         self.numvars = 0
         self.varmap = {}
+        self.defined = set()
         self.log = logging.getLogger('compiler.stackalloc')
 
     def allocate_var(self, varname):
         if self.is_allocated(varname):
             raise Exception("Variable '%s' already allocated" % varname)
-        self.numvars = self.numvars + 1
-        self.varmap[varname] = self.numvars
+        self.defined.add(varname)
 
     def is_allocated(self, varname):
-        if varname in self.varmap:
+        if varname in self.defined:
             return True
         return False
 
@@ -32,17 +101,9 @@ class P0StackAllocator(object):
         return self.numvars*4
 
     def substitute(self):
+        self.varmap, self.numvars = assign_slots(live_ranges(self.program.instructions()))
         return self.visit(self.program)
 
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        self.log.debug(node)
-        return meth(node, *args, **kwargs)
-
     def visit_Program(self, node, *args, **kwargs):
         return Program([self.visit(x) for x in node.statements])
 
@@ -104,7 +165,7 @@ if __name__ == "__main__":
     for testcase in testcases:
         parser = P0Parser()
         parser.build()
-        #ast = compiler.parseFile(testcase)
+        #ast = parseFile(testcase)
         ast = parser.parseFile(testcase)
         varalloc = VariableAllocator()
         p0flattener = P0Flattener(varalloc)
@@ -112,4 +173,4 @@ if __name__ == "__main__":
         instruction_selector = P0InstructionSelector(varalloc)
         program = instruction_selector.visit(stmtlist)
         stackallocator = P0StackAllocator(program)
-        print stackallocator.substitute()
+        print(stackallocator.substitute())
@@ -1,10 +1,12 @@
 # vim: set ts=4 sw=4 expandtab:
 
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from x86ir import *
 
 import logging
+from visitor import Visitor
 
 class GetTag(Node):
     def __init__(self, arg):
@@ -58,7 +60,9 @@ compareTag = lambda x,y: Compare(GetTag(x),[('==',y)])
 isIntOrBoolExp = lambda x: Or([compareTag(x,intTag),compareTag(x,boolTag)])
 
 # Concept borrowed from http://peter-hoffmann.com/2010/extrinsic-visitor-pattern-python-inheritance.html
-class P1Explicate(object):
+class P1Explicate(Visitor):
+    name = 'explicate'
+
     def __init__(self, varalloc):
         self.log = logging.getLogger('compiler.explicate')
         self.varalloc = varalloc
@@ -72,15 +76,10 @@ class P1Explicate(object):
     def explicate(self, node):
         return self.visit(node)
 
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
+    def visit_default(self, node, *args, **kwargs):
         # we return the node passed in by default so we do not have to handle
         # every case unless necessary
-        if not meth:
-            return node
-        return meth(node, *args, **kwargs)
+        return node
 
     def visit_Module(self, node):
         return Module(None, self.visit(node.node), None)
@@ -362,9 +361,9 @@ class P1Explicate(object):
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
     import logging.config
-    from p0parser import P0Parser
+    from p0parser import P0Parser, parseFile
     if len(sys.argv) < 2:
         sys.exit(1)
     # configure logging 
@@ -373,7 +372,7 @@ if __name__ == "__main__":
     for testcase in testcases:
         #parser = P0Parser()
         #parser.build()
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         #ast = parser.parseFile(testcase)
         p1explicator = P1Explicate(VariableAllocator())
-        print prettyAST(p1explicator.transform(ast))
+        print(prettyAST(p1explicator.transform(ast)))
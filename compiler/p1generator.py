@@ -3,7 +3,8 @@ Created on Oct 1, 2011
 
 @author: relsner
 '''
-from compiler import parseFile
+from __future__ import print_function
+from p0parser import parseFile
 from x86ir import *
 from p0generator import P0Generator 
 
@@ -121,4 +122,4 @@ if __name__ == "__main__":
         ifinsselector = P1IfInstructionSelector(varalloc,insselector.labelalloc)
         program = ifinsselector.visit(program)
         generator = P1Generator()
-        print generator.generate(program)
+        print(generator.generate(program))
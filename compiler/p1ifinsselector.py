@@ -1,30 +1,23 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 # to flatten nested lists into a flat list
-from compiler.ast import flatten
+from pyast import flatten
 import logging
+from visitor import Visitor
 
 # Concept borrowed from http://peter-hoffmann.com/2010/extrinsic-visitor-pattern-python-inheritance.html
-class P1IfInstructionSelector(object):
+class P1IfInstructionSelector(Visitor):
     def __init__(self, varalloc, labelalloc):
         self.varalloc = varalloc
         self.labelalloc = labelalloc
         self.log = logging.getLogger('compiler.ifinsselect')
 
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        # we cannot blindly return the node itself, if there is no visit 
-        # function for that type.  This is because the children of that node may need
-        # to be recursed upon: ex.  Printnl(CallFuncIndirect(...))
-        self.log.warn(node)
-        if not meth:
-            return node
-#            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
+    def visit_default(self, node, *args, **kwargs):
+        # nodes with nothing to select are handed back unchanged
+        return node
 
     def visit_Program(self, node):
         return Program([self.visit(x) for x in node.statements])
@@ -33,7 +26,7 @@ class P1IfInstructionSelector(object):
         # flattened the returned list since it may be nested, due to nested x86If instructions
         instructions = flatten([self.visit(x) for x in node.instructions])
         # filter out any no-ops
-        instructions = filter(lambda x: x is not None, instructions)
+        instructions = [x for x in instructions if x is not None]
         return Statement(instructions,node.source)
 
     def visit_x86If(self, node):
@@ -61,8 +54,8 @@ class P1IfInstructionSelector(object):
         return stmts
 
 if __name__ == "__main__":
-    import sys, compiler
-    from p0parser import P0Parser
+    import sys
+    from p0parser import P0Parser, parseFile
     from p1explicate import P1Explicate
     from p1flattener import P1Flattener
     from p1insselector import P1InstructionSelector
@@ -74,9 +67,9 @@ if __name__ == "__main__":
     for testcase in testcases:
         #parser = P0Parser()
         #parser.build()
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         #ast = parser.parseFile(testcase)
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         varalloc = VariableAllocator()
         explicate = P1Explicate(varalloc)
         ast = explicate.explicate(ast)
@@ -88,5 +81,5 @@ if __name__ == "__main__":
         program = regallocator.substitute()
         ifinsselector = P1IfInstructionSelector(varalloc,insselector.labelalloc)
         program = ifinsselector.visit(program)
-        print program
-        print prettyAST(program)
+        print(program)
+        print(prettyAST(program))
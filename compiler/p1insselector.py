@@ -1,5 +1,5 @@
 # vim: set ts=4 sw=4 expandtab:
-import compiler
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 from p0insselector import P0InstructionSelector
@@ -10,11 +10,14 @@ BOOL_TAG = 1
 BIG_TAG = 3
 
 class LabelAllocator(object):
-    def __init__(self):
+    def __init__(self, prefix=''):
+        # the prefix keeps labels from different functions apart when each
+        # function is given its own allocator (see compile_function in compile.py)
+        self.prefix = prefix
         self.count = 0
         
     def get_next_label(self):
-        label= '_label_%s' % self.count
+        label= '_label_%s%s' % (self.prefix, self.count)
         self.count= self.count+1
         return label
 
@@ -22,9 +25,9 @@ class LabelAllocator(object):
 # Concept borrowed from http://peter-hoffmann.com/2010/extrinsic-visitor-pattern-python-inheritance.html
 class P1InstructionSelector(P0InstructionSelector):
     '''Instruction selection for dynamic types as well as if, also converts an If node to Labels and Jumps'''
-    def __init__(self, varalloc):
+    def __init__(self, varalloc, labelalloc=None):
         P0InstructionSelector.__init__(self, varalloc)
-        self.labelalloc = LabelAllocator()
+        self.labelalloc = labelalloc if labelalloc is not None else LabelAllocator()
     def visit_Not(self, node, *args, **kwargs):
         (var, stmt) = self.visit(node.expr)
         return stmt+[BitwiseNot(var)]
@@ -32,12 +35,12 @@ class P1InstructionSelector(P0InstructionSelector):
         stmts = []
         lhsvar, lhs = self.visit(node.expr)
         rhsvar, rhs = self.visit(node.ops[0][1])
-        result = Var(self.varalloc.get_next_var())
+        result = self.varalloc.var(self.varalloc.get_next_var())
         # If the rhs operand is an Imm32, then we need to move it
         # into a temp var since Imm32 can only appear on the LHS
         # for a Cmp (it does a subtract but doesn't store the result)
         if isinstance(rhsvar,Imm32):
-            tempvar = Var(self.varalloc.get_next_var())
+            tempvar = self.varalloc.var(self.varalloc.get_next_var())
             stmts = stmts + [Movl(rhsvar, tempvar)]
             rhsvar = tempvar
         # take care of any necessary flattening for the statements
@@ -73,10 +76,10 @@ class P1InstructionSelector(P0InstructionSelector):
         elsestmts = self.visit(else_)
         thenstmts = self.visit(then)
         # get rid of the pesky Statement nodes
-        elsestmts = reduce(lambda x,y: x+y, [x.instructions for x in elsestmts], [])
-        thenstmts = reduce(lambda x,y: x+y, [x.instructions for x in thenstmts], [])
+        elsestmts = concat([x.instructions for x in elsestmts])
+        thenstmts = concat([x.instructions for x in thenstmts])
         # encapsulate the flattened code into an If again.
-        return [x86If(Var(test.name), thenstmts, elsestmts)]
+        return [x86If(self.varalloc.var(test.name), thenstmts, elsestmts)]
     def visit_InjectFrom(self, node, *args, **kwargs):
         loc, stmtlist = self.visit(node.arg)
         # convert a simple value to a pyobj
@@ -89,45 +92,45 @@ class P1InstructionSelector(P0InstructionSelector):
         else:
             raise Exception("Unknown tag type '%s'" % node.typ)
         # need to create a temporary variable to store the result of the shift
-        varname = self.varalloc.get_next_var()
-        stmts = [Movl(loc,Var(varname))]
+        tmpvar = self.varalloc.var(self.varalloc.get_next_var())
+        stmts = [Movl(loc,tmpvar)]
         # only shift left if we are converting from an int or bool
         if node.typ == 'int' or node.typ == 'bool':
-            stmts.extend([BitShift(Imm32(TAG_SIZE), Var(varname), 'left')])
-        stmts.extend([BitwiseOr(Imm32(tag),Var(varname))])
-        return (Var(varname), stmtlist + stmts)
+            stmts.extend([BitShift(Imm32(TAG_SIZE), tmpvar, 'left')])
+        stmts.extend([BitwiseOr(Imm32(tag),tmpvar)])
+        return (tmpvar, stmtlist + stmts)
     def visit_ProjectTo(self, node, *args, **kwargs):
         # int project_int(pyobj val) { assert((val & MASK) == INT_TAG); return val >> SHIFT; }
         # int project_bool(pyobj val) { assert((val & MASK) == BOOL_TAG); return val >> SHIFT; }
         # big_pyobj* project_big(pyobj val) { assert((val & MASK) == BIG_TAG); return (big_pyobj*)(val & ~MASK); }
         loc, stmtlist = self.visit(node.arg)
         # need to create a temporary variable to store the result of the shift
-        varname = self.varalloc.get_next_var()
+        tmpvar = self.varalloc.var(self.varalloc.get_next_var())
         # only shift to the right if we are converting to int or bool
-        stmts = [Movl(loc,Var(varname))]
+        stmts = [Movl(loc,tmpvar)]
         if node.typ == 'int' or node.typ == 'bool':
-            stmts.extend([BitShift(Imm32(TAG_SIZE), Var(varname), 'right')])
+            stmts.extend([BitShift(Imm32(TAG_SIZE), tmpvar, 'right')])
         else:
-            stmts.extend([BitwiseAnd(Imm32(~3), Var(varname))])
-        return (Var(varname), stmtlist + stmts)
+            stmts.extend([BitwiseAnd(Imm32(~3), tmpvar)])
+        return (tmpvar, stmtlist + stmts)
     def visit_GetTag(self, node, *args, **kwargs):
         loc, stmtlist = self.visit(node.arg)
         # need to create a temporary variable to store the result of the shift
-        varname = self.varalloc.get_next_var()
+        tmpvar = self.varalloc.var(self.varalloc.get_next_var())
         # int tag(pyobj val) { return val & MASK; }
-        return (Var(varname), stmtlist + [Movl(loc,Var(varname)), BitwiseAnd(Imm32(3), Var(varname))])
+        return (tmpvar, stmtlist + [Movl(loc,tmpvar), BitwiseAnd(Imm32(3), tmpvar)])
     def visit_Or(self, node, *args, **kwargs):
         left,  leftstmtlist  = self.visit(node.nodes[0])
         right, rightstmtlist = self.visit(node.nodes[1])
         # need to create a temporary variable to store the result
-        varname = self.varalloc.get_next_var()
-        return (Var(varname), leftstmtlist + rightstmtlist + [Movl(left, Var(varname)), BitwiseOr(right, Var(varname))])
+        tmpvar = self.varalloc.var(self.varalloc.get_next_var())
+        return (tmpvar, leftstmtlist + rightstmtlist + [Movl(left, tmpvar), BitwiseOr(right, tmpvar)])
     def visit_And(self, node, *args, **kwargs):
         left,  leftstmtlist  = self.visit(node.nodes[0])
         right, rightstmtlist = self.visit(node.nodes[1])
         # need to create a temporary variable to store the result
-        varname = self.varalloc.get_next_var()
-        return (Var(varname), leftstmtlist + rightstmtlist + [Movl(left, Var(varname)), BitwiseAnd(right, Var(varname))])
+        tmpvar = self.varalloc.var(self.varalloc.get_next_var())
+        return (tmpvar, leftstmtlist + rightstmtlist + [Movl(left, tmpvar), BitwiseAnd(right, tmpvar)])
     # overridden from p0insselector.py to use print_any instead of print_int_nl
     def visit_Printnl(self, node, *args, **kwargs):
         loc, stmtlist = self.visit(node.nodes[0])
@@ -138,7 +141,7 @@ class P1InstructionSelector(P0InstructionSelector):
     # overridden from p0insselector.py to allow for arguments to CallFunc
     def visit_CallFunc(self, node, *args, **kwargs):
         # need to create a temporary variable here to store the result.
-        varname = self.varalloc.get_next_var()
+        tmpvar = self.varalloc.var(self.varalloc.get_next_var())
         instructions = []
         # We have to generate a Pushl for each argument, but in reverse order to
         # be consistent with the cdecl calling convention.
@@ -148,15 +151,15 @@ class P1InstructionSelector(P0InstructionSelector):
         # Convert the CallFunc to a Call() node in our x86IR
         instructions.extend([Call(node.node.name)])
         # Move the result from the eax register to the new temp var.
-        instructions.extend([Movl(Register('eax'),Var(varname))])
+        instructions.extend([Movl(Register('eax'),tmpvar)])
         # Generate an Addl instruction to restore the stack pointer
         instructions.extend([Addl(Imm32(4*len(node.args)), Register('esp'))])
-        return (Var(varname), instructions)
+        return (tmpvar, instructions)
 
 
 if __name__ == "__main__":
     import sys
-    from p0parser import P0Parser
+    from p0parser import P0Parser, parseFile
     from p1flattener import P1Flattener
     if len(sys.argv) < 2:
         sys.exit(1)
@@ -165,7 +168,7 @@ if __name__ == "__main__":
         #parser = P0Parser()
         #parser.build()
         #ast = parser.parseFile(testcase)
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         
         varalloc = VariableAllocator()
         explicator = P1Explicate(varalloc)
@@ -174,5 +177,5 @@ if __name__ == "__main__":
         stmtlist = flattener.flatten(ast)
         instruction_selector = P1InstructionSelector(varalloc)
         program = instruction_selector.visit(stmtlist)
-        print program
-        print prettyAST(program)
+        print(program)
+        print(prettyAST(program))
@@ -1,10 +1,10 @@
 # vim: set ts=4 sw=4 expandtab:
 
-import compiler
-
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 from p0regallocator import P0RegAllocator
+from liveness import Liveness
 from p1spillgenerator import P1SpillGenerator
 
 class P1RegAllocator(P0RegAllocator):
@@ -13,40 +13,14 @@ class P1RegAllocator(P0RegAllocator):
         P0RegAllocator.__init__(self, program, varalloc)
         self.spillgenerator = P1SpillGenerator(varalloc)
 
-    def Lbefore(self, instructionlist, Lafter=set()):
-        """Computes liveness recursively.  Liveness is stored as an attribute on
-        the instruction itself, to be used later during construction of the
-        interference graph."""
-        # our base case
-        if len(instructionlist) < 1:
-            return Lafter
-        instr = instructionlist[0]
-        # compute Lafter (haha, laughter, get it?)
-        laughter = self.Lbefore(instructionlist[1:], Lafter)
-        # just store the liveness set in the instruction node itself.
-        instr.liveafter = laughter
-        # Now, return the liveness before. How this is computed depends on whether 
-        # we have an x86If or a real Instruction.
-        if isinstance(instr, x86If):
-            return (set(instr.test) | self.Lbefore(instr.then,instr.liveafter) | self.Lbefore(instr.else_,instr.liveafter))
-        elif isinstance(instr, Instruction):
-            # get reads/writes performed by instruction, but only for variables
-            writes = set(filter(lambda x: isinstance(x,Var), instr.writes()))
-            reads = set(filter(lambda x: isinstance(x,Var), instr.reads()))
-            # add all variables to the graph
-            for x in writes: self._add_vertex(x)
-            for x in reads: self._add_vertex(x)
-            # For all x86 instructions, Lbefore(instr,Lafter) = Lafter - writes | reads
-            return (instr.liveafter - writes) | reads
-        else:
-            raise Exception("Unknown instruction: '%s'" % instr)
-
     # overridden from p0regallocator.py since we are changing our strategy
     # to handle structured control flow (If)
     def liveness_analyze(self):
-        instructions = self.program.instructions()
-        # compute liveness recursively
-        self.Lbefore(instructions)
+        self.liveness = Liveness(self.program.instructions())
+        # add all variables to the graph
+        for x in self.liveness.vars.values():
+            self._add_vertex(x)
+        self.liveness.annotate()
 
     def build_interference_graph_instr(self, instructions):
         for instr in instructions:
@@ -79,16 +53,11 @@ class P1RegAllocator(P0RegAllocator):
     def build_interference_graph(self):
         self.build_interference_graph_instr(self.program.instructions())
 
-    def print_liveness_instr(self, instructions):
-        for instr in instructions:
-            print "%5s. %-40s : %s" % (self.instrcnt, instr, instr.liveafter)
-            if isinstance(instr,x86If):
-                self.print_liveness_instr(instr.then)
-                self.print_liveness_instr(instr.else_)
-
     # override from p0regallocator.py
     def print_liveness(self):
-        self.print_liveness_instr(self.program.instructions())
+        for block in self.liveness.blocks:
+            for instr, live in reversed(list(self.liveness.backward(block))):
+                print("%-40s : %s" % (instr, self.liveness.members(live)))
 
     def visit_x86If(self, node, *args, **kwargs):
         then = [self.visit(x) for x in node.then]
@@ -126,7 +95,7 @@ if __name__ == "__main__":
     import sys
     import logging.config
     from comp_util import *
-    from p0parser import P0Parser
+    from p0parser import P0Parser, parseFile
     from p1flattener import P1Flattener
     from p1insselector import P1InstructionSelector
     if len(sys.argv) < 2:
@@ -138,7 +107,7 @@ if __name__ == "__main__":
         #parser = P0Parser()
         #parser.build()
         #ast = parser.parseFile(testcase)
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         varalloc = VariableAllocator()
         explicate = P1Explicate(varalloc)
         ast = explicate.explicate(ast)
@@ -146,9 +115,9 @@ if __name__ == "__main__":
         stmtlist = flattener.flatten(ast)
         instruction_selector = P1InstructionSelector(varalloc)
         program = instruction_selector.visit(stmtlist)
-        print prettyAST(program)
+        print(prettyAST(program))
         regallocator = P1RegAllocator(program, varalloc)
-        print prettyAST(regallocator.substitute())
+        print(prettyAST(regallocator.substitute()))
         #import cProfile as profile
         #import pstats
         #output_file = 'profile.out'
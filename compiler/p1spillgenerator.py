@@ -1,5 +1,6 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 from p0spillgenerator import P0SpillGenerator
@@ -24,21 +25,28 @@ class P1SpillGenerator(P0SpillGenerator):
             # filter out no-ops
             else_instr_list.extend(instrlist)
             if spill: spilled = True
-        return (False, [x86If(test, then_instr_list, else_instr_list)])
+        return (spilled, [x86If(test, then_instr_list, else_instr_list)])
 
     def visit_Cmp(self, node, *args, **kwargs):
-        src = node.rhs
-        dst = node.lhs
-        # do spill logic (see comment in Movl in p0spillgenerator)
-        if isinstance(src,Var) and isinstance(dst, Var):
-            assert(src.storage is not None)
-            assert(dst.storage is not None)
-            if isinstance(src.storage, StackSlot) and isinstance(dst.storage, StackSlot):
-                self.log.debug('Detected spill: %s' % node)
-                var = Var(self.varalloc.get_next_var(),False) 
-                self.log.debug('Introducing variable: %s' % var)
-                return (True, [Movl(dst, var), Cmp(src, var)])
-        return (False, [Cmp(src, dst)])
+        lhs = node.lhs
+        rhs = node.rhs
+        # do spill logic (see comment in Movl in p0spillgenerator); cmpl
+        # cannot compare two memory operands, and its second operand cannot
+        # be an immediate
+        if isinstance(lhs,Var) and isinstance(rhs, Var):
+            assert(lhs.storage is not None)
+            assert(rhs.storage is not None)
+            if isinstance(lhs.storage, StackSlot) and isinstance(rhs.storage, StackSlot):
+                self.log.debug('Detected spill: %s', node)
+                var = self.varalloc.var(self.varalloc.get_next_var(),False) 
+                self.log.debug('Introducing variable: %s', var)
+                return (True, [Movl(rhs, var), Cmp(lhs, var)])
+        elif isinstance(rhs, Imm32):
+            self.log.debug('Detected spill: %s', node)
+            var = self.varalloc.var(self.varalloc.get_next_var(),False) 
+            self.log.debug('Introducing variable: %s', var)
+            return (True, [Movl(rhs, var), Cmp(lhs, var)])
+        return (False, [node])
 
     def visit_JumpEquals(self, node, *args, **kwargs):
         return (False, [node])
@@ -60,9 +68,9 @@ class P1SpillGenerator(P0SpillGenerator):
             assert(src.storage is not None)
             assert(dst.storage is not None)
             if isinstance(src.storage, StackSlot) and isinstance(dst.storage, StackSlot):
-                self.log.debug('Detected spill: %s' % node)
-                var = Var(self.varalloc.get_next_var(),False) 
-                self.log.debug('Introducing variable: %s' % var)
+                self.log.debug('Detected spill: %s', node)
+                var = self.varalloc.var(self.varalloc.get_next_var(),False) 
+                self.log.debug('Introducing variable: %s', var)
                 return (True, [Movl(dst, var), BitwiseAnd(src, var), Movl(var, dst)])
         return (False, [BitwiseAnd(src, dst)])
 
@@ -74,9 +82,9 @@ class P1SpillGenerator(P0SpillGenerator):
             assert(src.storage is not None)
             assert(dst.storage is not None)
             if isinstance(src.storage, StackSlot) and isinstance(dst.storage, StackSlot):
-                self.log.debug('Detected spill: %s' % node)
-                var = Var(self.varalloc.get_next_var(),False) 
-                self.log.debug('Introducing variable: %s' % var)
+                self.log.debug('Detected spill: %s', node)
+                var = self.varalloc.var(self.varalloc.get_next_var(),False) 
+                self.log.debug('Introducing variable: %s', var)
                 return (True, [Movl(dst, var), BitwiseOr(src, var), Movl(var, dst)])
         return (False, [BitwiseOr(src, dst)])
 
@@ -88,17 +96,17 @@ class P1SpillGenerator(P0SpillGenerator):
             assert(src.storage is not None)
             assert(dst.storage is not None)
             if isinstance(src.storage, StackSlot) and isinstance(dst.storage, StackSlot):
-                self.log.debug('Detected spill: %s' % node)
-                var = Var(self.varalloc.get_next_var(),False) 
-                self.log.debug('Introducing variable: %s' % var)
+                self.log.debug('Detected spill: %s', node)
+                var = self.varalloc.var(self.varalloc.get_next_var(),False) 
+                self.log.debug('Introducing variable: %s', var)
                 return (True, [Movl(dst, var), BitShift(src, var), Movl(var, dst)])
         return (False, [BitShift(src, dst, node.dir)])
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
     from comp_util import *
-    from p0parser import P0Parser
+    from p0parser import P0Parser, parseFile
     from p1flattener import P1Flattener
     from p1insselector import P1InstructionSelector
     if len(sys.argv) < 2:
@@ -109,7 +117,7 @@ if __name__ == "__main__":
         #parser = P0Parser()
         #parser.build()
         #ast = parser.parseFile(testcase)
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         varalloc = VariableAllocator()
         explicate = P1Explicate(varalloc)
         ast = explicate.explicate(ast)
@@ -117,6 +125,6 @@ if __name__ == "__main__":
         stmtlist = flattener.flatten(ast)
         instruction_selector = P1InstructionSelector(varalloc)
         program = instruction_selector.visit(stmtlist)
-        print prettyAST(program)
+        print(prettyAST(program))
         regallocator = P1RegAllocator(program, varalloc)
-        print prettyAST(regallocator.substitute())
+        print(prettyAST(regallocator.substitute()))
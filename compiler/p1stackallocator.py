@@ -1,5 +1,6 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from p0stackallocator import *
 from x86ir import *
 
@@ -40,10 +41,10 @@ class P1StackAllocator(P0StackAllocator):
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
     import logging, logging.config
     from comp_util import *
-    from p0parser import P0Parser
+    from p0parser import P0Parser, parseFile
     from p1flattener import P1Flattener
     from p1insselector import P1InstructionSelector
     if len(sys.argv) < 2:
@@ -54,7 +55,7 @@ if __name__ == "__main__":
     for testcase in testcases:
         #parser = P0Parser()
         #parser.build()
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         #ast = parser.parseFile(testcase)
         varalloc = VariableAllocator()
         explicator = P1Explicate(varalloc)
@@ -65,4 +66,4 @@ if __name__ == "__main__":
         ast = instruction_selector.visit(ast)
         stackallocator = P1StackAllocator(ast)
         ast = stackallocator.substitute()
-        print prettyAST(ast)
+        print(prettyAST(ast))
@@ -1,4 +1,5 @@
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from x86ir import *
 
@@ -9,8 +10,12 @@ from p2freevars import P2FreeVars
 
 
 import logging
+from visitor import Visitor
     
-class P2ClosureConversion(object):
+class P2ClosureConversion(Visitor):
+    name = 'closureconvert'
+    requires = ('heapify',)
+
     def __init__(self, explicate, varalloc):
         self.log = logging.getLogger('compiler.closure')
         self.varalloc = varalloc
@@ -32,27 +37,16 @@ class P2ClosureConversion(object):
         self.log.info ('Finished closure conversion')
         return [main] + self.functions
 
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        # we cannot blindly return the node itself, if there is no visit 
-        # function for that type.  This is because the children of that node may need
-        # to be recursed upon: ex.  Printnl(CallFuncIndirect(...))
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-    
     def visit_Module(self,node, *args, **kwargs):
         return Module(None, self.visit(node.node), None)
     def visit_Stmt(self,node, *args, **kwargs):
         visited = [self.visit(x) for x in node.nodes]
-        self.log.debug('Visited and produced %s'%visited)
+        self.log.debug('Visited and produced %s', visited)
         return Stmt(visited)
     def visit_Printnl(self, node, *args, **kwargs):
         return Printnl([self.visit(node.nodes[0])], node.dest)
     def visit_Assign(self, node, *args, **kwargs):
-        self.log.debug('Visiting rhs of assign %s'%node.expr)
+        self.log.debug('Visiting rhs of assign %s', node.expr)
         return Assign(node.nodes, self.visit(node.expr)) 
     def visit_Discard(self, node, *args, **kwargs):
         return Discard(self.visit(node.expr))
@@ -98,21 +92,22 @@ class P2ClosureConversion(object):
     def visit_Lambda(self, node, *args, **kwargs):
         # allocate a new function name
         name = self.get_next_name(node.lineno)
-        self.log.debug('Creating function definition for %s' % name)
+        self.log.debug('Creating function definition for %s', name)
         
         # Add the function definition to the functions
         # Function(decorators, name, argnames, defaults, flags, doc, code, lineno=None)
 
-        # get free variables in Lambda; returns a set
+        # get free variables in Lambda; returns a set, which is sorted to
+        # give the same order in every run
         bound, free = self.freevars.visit(node)
-        fvars = list(free)
+        fvars = sorted(free)
 
         # add assignments
         i = 0
         assigns=[]
         for fvar in fvars:
             subscript = self.explicate.explicate(Subscript(Name('fvs'),'OP_APPLY',[Const(i)]))
-            self.log.debug('visit_Lambda: Subscript = %s' % subscript)
+            self.log.debug('visit_Lambda: Subscript = %s', subscript)
             assigns.append(Assign([AssName(fvar,'OP_ASSIGN')],subscript))
             i = i + 1
 
@@ -154,7 +149,8 @@ class P2ClosureConversion(object):
 
     
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     if len(sys.argv) < 2:
         sys.exit(1)
@@ -168,11 +164,11 @@ if __name__ == "__main__":
         p2heap = P2Heapify(p2explicator)
         p2closure = P2ClosureConversion(p2explicator, varalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         unique = p2unique.transform(ast)        
         explicated = p2explicator.explicate(unique)
         heaped = p2heap.transform(explicated)
         astlist = p2closure.transform(heaped)
         for ast in astlist:
-            print '\nFunction\n================='
-            print prettyAST(ast)
+            print('\nFunction\n=================')
+            print(prettyAST(ast))
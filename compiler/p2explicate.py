@@ -1,4 +1,5 @@
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from x86ir import *
 import logging
@@ -44,9 +45,9 @@ class P2Explicate(P1Explicate):
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
     import logging.config
-    from p0parser import P0Parser
+    from p0parser import P0Parser, parseFile
     if len(sys.argv) < 2:
         sys.exit(1)
     # configure logging 
@@ -55,9 +56,9 @@ if __name__ == "__main__":
     for testcase in testcases:
         #parser = P0Parser()
         #parser.build()
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         #ast = parser.parseFile(testcase)
         p2unique = P2UniquifyVars()
         unique = p2unique.transform(ast)        
         p2explicator = P2Explicate(VariableAllocator())
-        print prettyAST(p2explicator.transform(unique))
+        print(prettyAST(p2explicator.transform(unique)))
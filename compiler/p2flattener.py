@@ -1,5 +1,6 @@
 # vim: set ts=4 sw=4 expandtab:
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from p1flattener import P1Flattener
 from p2explicate import P2Explicate
@@ -15,40 +16,37 @@ class P2Flattener(P1Flattener):
         P1Flattener.__init__(self, varalloc)
         self.validate = validate
     
-    def flatten (self, node):
-        """Takes an AST as input, and then "flattens" the tree into a list of statements."""
+    def visit_Function(self, node):
+        # This is not a Function returned from the parse stage, but a top-level function
+        # that is created in the closure-conversion pass.
+        # We just need to flatten the "code" attribute, which is a Stmt.
+        # Function(decorators, name, argnames, defaults, flags, doc, code, lineno=None)
+        self.log.debug('in visit_Function, node.code = %s',node.code)
+        code = self.visit(node.code)
+        for x in node.argnames:
+            self.varalloc.add_var(x)
+        return Function(node.decorators, node.name, node.argnames, node.defaults, node.flags, node.doc, code, node.lineno)
 
-        if isinstance(node, Function):
-            # This is not a Function returned from the parse stage, but a top-level function
-            # that is created in the closure-conversion pass.
-            # We just need to flatten the "code" attribute, which is a Stmt.
-            # Function(decorators, name, argnames, defaults, flags, doc, code, lineno=None)
-            self.log.debug('in visit_Function, node.code = %s',node.code)
-            code = self.flatten(node.code)
-            for x in node.argnames:
-                self.varalloc.add_var(x)
-            return Function(node.decorators, node.name, node.argnames, node.defaults, node.flags, node.doc, code, node.lineno)
-        elif isinstance(node, Return):
-            x = self.flatten(node.value)
-            retvar, retstmtlist = self.flatten(node.value)
-            return retstmtlist + [Return(retvar)]
-        elif isinstance(node, CallFuncIndirect):
-            self.log.debug('CallFuncIndirect: args: %s', node.args)
-            nodevar, nodestmtlist = self.flatten(node.node)
-            tuplelist = [self.flatten(x) for x in node.args]
-            varargs = [x[0] for x in tuplelist]
-            varstmts = [x[1] for x in tuplelist]
-            varname = self.varalloc.get_next_var()
-            stmts = nodestmtlist + reduce(lambda x,y: x+y, varstmts, []) + [Assign([AssName(varname, 'OP_ASSIGN')], CallFuncIndirect(nodevar, varargs))]
-            return (Name(varname), stmts)
-        else:
-            return P1Flattener.flatten(self, node)
+    def visit_Return(self, node):
+        x = self.visit(node.value)
+        retvar, retstmtlist = self.visit(node.value)
+        return retstmtlist + [Return(retvar)]
+
+    def visit_CallFuncIndirect(self, node):
+        self.log.debug('CallFuncIndirect: args: %s', node.args)
+        nodevar, nodestmtlist = self.visit(node.node)
+        tuplelist = [self.visit(x) for x in node.args]
+        varargs = [x[0] for x in tuplelist]
+        varstmts = [x[1] for x in tuplelist]
+        varname = self.varalloc.get_next_var()
+        stmts = nodestmtlist + concat(varstmts) + [Assign([AssName(varname, 'OP_ASSIGN')], CallFuncIndirect(nodevar, varargs))]
+        return (Name(varname), stmts)
 
 
 if __name__ == "__main__":
-    import compiler, sys
+    import sys
     import logging.config
-    from p0parser import P0Parser
+    from p0parser import P0Parser, parseFile
     from p1explicate import P1Explicate
     if len(sys.argv) < 2:
         sys.exit(1)
@@ -64,12 +62,12 @@ if __name__ == "__main__":
         p2closure = P2ClosureConversion(p2explicator, varalloc)
         p2flatten = P2Flattener(varalloc,True)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         unique = p2unique.transform(ast)        
         explicated = p2explicator.explicate(unique)
         heaped = p2heap.transform(explicated)
         astlist = p2closure.transform(heaped)
         for ast in astlist:
             ast = p2flatten.flatten(ast)
-            print ast
-            print prettyAST(ast)
+            print(ast)
+            print(prettyAST(ast))
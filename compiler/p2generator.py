@@ -1,3 +1,4 @@
+from __future__ import print_function
 from x86ir import *
 from p1generator import P1Generator 
 
@@ -8,12 +9,13 @@ class P2Generator(P1Generator):
     def visit_CallAddress(self, node, *args, **kwargs):
         return '\tcall *%s' %  self.visit(node.address)    
 
+    # the value is moved first, it may be in one of the registers popped
     def visit_Ret(self, node, *args, **kwargs):
         return '''
+\tmovl %s,%%eax
 \tpopl %%ebx
 \tpopl %%edi
 \tpopl %%esi
-\tmovl %s,%%eax
 \tleave
 \tret
 ''' %  self.visit(node.value)    
@@ -30,6 +32,9 @@ class P2Generator(P1Generator):
 \tpushl %%ebx
 
 %s
+\tpopl %%ebx
+\tpopl %%edi
+\tpopl %%esi
 \tmovl $0, %%eax # put return value in eax
 \tleave
 \tret
@@ -40,7 +45,8 @@ class P2Generator(P1Generator):
 
     
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     from comp_util import *
     from p2uniquifyvars import P2UniquifyVars
@@ -67,7 +73,7 @@ if __name__ == "__main__":
         ifinsselector = P2IfInstructionSelector(varalloc,p2insselector.labelalloc)
         p2generator = P2Generator(False)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         unique = p2unique.transform(ast)        
         explicated = p2explicator.explicate(unique)
         heaped = p2heap.transform(explicated)
@@ -78,4 +84,4 @@ if __name__ == "__main__":
             p2regallocator = P2RegAllocator(program, varalloc)
             program = p2regallocator.substitute()
             program = ifinsselector.visit(program)
-            print p2generator.generate(program)
+            print(p2generator.generate(program))
@@ -1,93 +1,40 @@
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from x86ir import *
 
 from p2explicate import P2Explicate
 from p2uniquifyvars import P2UniquifyVars
-from p2freevars import P2FreeVars
 
 import logging
+from visitor import Visitor
 
 
-class P2Heapify(object):
+class P2Heapify(Visitor):
+    name = 'heapify'
+    requires = ('explicate',)
+
     def __init__(self, explicate):
         self.log = logging.getLogger('compiler.heapify')
         self.explicate = P2Explicate(explicate.varalloc,False)
-        self.freevars = P2FreeVars()
         self.heapvarset = set([])
 
-    def getLambdaFreeVars(self, n):
-        if isinstance(n, Module):
-            return self.getLambdaFreeVars(n.node)
-        elif isinstance(n, Stmt):
-            fvars = [self.getLambdaFreeVars(x) for x in n.nodes]
-            return squash(fvars)
-        elif isinstance(n, Printnl):
-            return self.getLambdaFreeVars(n.nodes[0])
-        elif isinstance(n, Assign):
-            return self.getLambdaFreeVars(n.expr)
-        elif isinstance(n, (Discard,UnarySub,Not)):
-            return self.getLambdaFreeVars(n.expr)
-        elif isinstance(n, Add):
-            return self.getLambdaFreeVars(n.left) | self.getLambdaFreeVars(n.right)
-        elif isinstance(n, IfExp):
-            return self.getLambdaFreeVars(n.test) | self.getLambdaFreeVars(n.then) | self.getLambdaFreeVars(n.else_)
-        elif isinstance(n, (And,Or)):
-            fvars = [self.getLambdaFreeVars(x) for x in n.nodes]
-            return squash(fvars)
-        elif isinstance(n, CallFunc):
-            fvars = [self.getLambdaFreeVars(x) for x in n.args]
-            return squash(fvars)
-        elif isinstance(n, CallFuncIndirect):
-            fvars = [self.getLambdaFreeVars(x) for x in n.args]
-            return squash(fvars) | self.getLambdaFreeVars(n.node)
-        elif isinstance(n, Compare):
-            return self.getLambdaFreeVars(n.expr) | self.getLambdaFreeVars(n.ops[0][1])
-#        elif isinstance(n, Subscript):
-#            return self.getLambdaFreeVars(n.expr) | self.getLambdaFreeVars(n.subs[0])
-        elif isinstance(n, Return):
-            return self.getLambdaFreeVars(n.value)
-        elif isinstance(n, (Name,Const)):
-            return set([])
-        elif isinstance(n, Lambda):
-            return n.free
-        elif isinstance(n, (InjectFrom,ProjectTo,GetTag)):
-            return self.getLambdaFreeVars(n.arg)
-        elif isinstance(n, Let):
-            return self.getLambdaFreeVars(n.rhs) | self.getLambdaFreeVars(n.body)
-        else:
-            raise Exception('Unhandled node: %s' % n)
-        
-
     def transform(self, node):
         self.log.info('Starting heapify')
-        # Do the freevars visitor on the whole tree. The ensures that
-        # the free and bound attributes are set on all Lambdas.
-        self.freevars.visit(node)
         ret = self.visit(node)
         self.log.info('Finished heapify')
         return ret
         
-    def visit(self, node):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        # we cannot blindly return the node itself, if there is no visit 
-        # function for that type.  This is because the children of that node may need
-        # to be recursed upon: ex.  Printnl(CallFuncIndirect(...))
-        self.log.debug('Visiting %s' % node.__class__)
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node)
-
     def visit_Module(self, node):
         # Need to find the free variables on all immediate child Lambdas
         # These are the variables that need heapification
-        vars_to_heapify = self.getLambdaFreeVars(node)
+        vars_to_heapify = scopes.captured_vars(node)
         self.heapvarset = self.heapvarset | vars_to_heapify
         self.log.debug('visit_Module: Variables to Heapify: %s', vars_to_heapify)
         heaplist = []
-        for fvar in vars_to_heapify:
+        # sorted, the order of a set of strings changes from run to run
+        # on Python 3
+        for fvar in sorted(vars_to_heapify):
             listast = self.explicate.explicate(List([Const(-1)]))
             heaplist.append(Assign([AssName(fvar,'OP_APPLY')],listast))
         v = self.visit(node.node)
@@ -187,7 +134,7 @@ class P2Heapify(object):
 
     def visit_Lambda(self, node):
         # First, get the variables to heapify and add them to the global set
-        vars_to_heapify = self.getLambdaFreeVars(node.code) - node.free
+        vars_to_heapify = scopes.captured_vars(node.code) - scopes.free_vars(node)
         self.log.debug('visit_Lambda: (%-10.10s) Variables to Heapify: %s', node.lineno, vars_to_heapify)
         self.heapvarset = self.heapvarset | vars_to_heapify
         # Next, rename arguments in this Lambda that need to be heapified to new, unique argument names
@@ -209,7 +156,7 @@ class P2Heapify(object):
         for arg in args_to_heapify:
            paramInits.append(Discard(CallFunc(Name('set_subscript'),[Name(arg),InjectFrom('int',Const(0)),Name(argmap[arg])])))
         # Finally, create our list of statements, localAllocs, to heapify local variables (that are not arguments)
-        locals_to_heapify = [x for x in vars_to_heapify if x not in node.argnames]
+        locals_to_heapify = [x for x in sorted(vars_to_heapify) if x not in node.argnames]
         localAllocs = []
         for local in locals_to_heapify:
            listast = self.explicate.explicate(List([Const(-1)]))
@@ -224,7 +171,8 @@ class P2Heapify(object):
         return CallFuncIndirect(self.visit(node.node), [self.visit(x) for x in node.args])
     
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     if len(sys.argv) < 2:
         sys.exit(1)
@@ -236,10 +184,10 @@ if __name__ == "__main__":
         p2explicator = P2Explicate(VariableAllocator())
         p2heap = P2Heapify(p2explicator)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         unique = p2unique.transform(ast)        
         explicated = p2explicator.explicate(unique)
         ast = p2heap.transform(explicated)
         
-        print prettyAST(ast)
+        print(prettyAST(ast))
         #print ast
@@ -1,9 +1,10 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 # to flatten nested lists into a flat list
-from compiler.ast import flatten
+from pyast import flatten
 from p1ifinsselector import P1IfInstructionSelector
 
 # Concept borrowed from http://peter-hoffmann.com/2010/extrinsic-visitor-pattern-python-inheritance.html
@@ -16,7 +17,8 @@ class P2IfInstructionSelector(P1IfInstructionSelector):
         return x86Function(node.name, node.argnames, [self.visit(x) for x in node.statements], node.lineno)
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     from p2uniquifyvars import P2UniquifyVars
     from p2explicate import P2Explicate
     from p2heapify import P2Heapify
@@ -38,7 +40,7 @@ if __name__ == "__main__":
         p2insselector = P2InstructionSelector(varalloc)
         ifinsselector = P2IfInstructionSelector(varalloc,p2insselector.labelalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         unique = p2unique.transform(ast)        
         explicated = p2explicator.explicate(unique)
         heaped = p2heap.transform(explicated)
@@ -49,5 +51,5 @@ if __name__ == "__main__":
             p2regallocator = P2RegAllocator(program, varalloc)
             program = p2regallocator.substitute()
             program = ifinsselector.visit(program)
-            print '\nFunction\n================='
-            print prettyAST(program)
+            print('\nFunction\n=================')
+            print(prettyAST(program))
@@ -1,5 +1,5 @@
 # vim: set ts=4 sw=4 expandtab:
-import compiler
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 from p1insselector import P1InstructionSelector
@@ -8,8 +8,8 @@ from p1insselector import P1InstructionSelector
 # Concept borrowed from http://peter-hoffmann.com/2010/extrinsic-visitor-pattern-python-inheritance.html
 class P2InstructionSelector(P1InstructionSelector):
     '''Instruction selection for dynamic types as well as if, also converts an If node to Labels and Jumps'''
-    def __init__(self, varalloc):
-        P1InstructionSelector.__init__(self, varalloc)
+    def __init__(self, varalloc, labelalloc=None):
+        P1InstructionSelector.__init__(self, varalloc, labelalloc)
 
     def transform(self, node):
         self.log.info('Starting instruction selection')
@@ -17,18 +17,6 @@ class P2InstructionSelector(P1InstructionSelector):
         self.log.info('Finished instruction selection')
         return ret
 
-    def visit(self, node, *args, **kwargs):
-        self.log.debug(node)
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        # we cannot blindly return the node itself, if there is no visit 
-        # function for that type.  This is because the children of that node may need
-        # to be recursed upon: ex.  Printnl(CallFuncIndirect(...))
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-
     def visit_Function(self, node, *args, **kwargs):
         # Have to move the parameters into local variables 
         instructions = []
@@ -36,7 +24,7 @@ class P2InstructionSelector(P1InstructionSelector):
         for arg in node.argnames:
             #varname = self.varalloc.get_next_var()
             #var = Var(varname,True,storage=StackSlot(i))
-            instructions.append(Movl(StackSlot(i), Var(arg)))
+            instructions.append(Movl(StackSlot(i), self.varalloc.var(arg)))
             i = i - 1
         statements = [Statement(instructions,'param inits')] + self.visit(node.code)
         return x86Function(node.name, node.argnames, statements, node.lineno)
@@ -47,7 +35,7 @@ class P2InstructionSelector(P1InstructionSelector):
 
     def visit_CallFuncIndirect(self, node, *args, **kwargs):
         # need to create a temporary variable here to store the result.
-        varname = self.varalloc.get_next_var()
+        tmpvar = self.varalloc.var(self.varalloc.get_next_var())
         instructions = []
         # We have to generate a Pushl for each argument, but in reverse order to
         # be consistent with the cdecl calling convention.
@@ -59,16 +47,16 @@ class P2InstructionSelector(P1InstructionSelector):
         instructions.extend(stmtlist)
         instructions.extend([CallAddress(var)])
         # Move the result from the eax register to the new temp var.
-        instructions.extend([Movl(Register('eax'),Var(varname))])
+        instructions.extend([Movl(Register('eax'),tmpvar)])
         # Generate an Addl instruction to restore the stack pointer
         instructions.extend([Addl(Imm32(4*len(node.args)), Register('esp'))])
-        return (Var(varname), instructions)
+        return (tmpvar, instructions)
     
 
 if __name__ == "__main__":
     import sys
     import logging.config
-    from p0parser import P0Parser
+    from p0parser import P0Parser, parseFile
     from p2explicate import P2Explicate
     from p2uniquifyvars import P2UniquifyVars
     from p2heapify import P2Heapify
@@ -89,7 +77,7 @@ if __name__ == "__main__":
         p2flatten = P2Flattener(varalloc)
         p2insselector = P2InstructionSelector(varalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         unique = p2unique.transform(ast)        
         explicated = p2explicator.explicate(unique)
         heaped = p2heap.transform(explicated)
@@ -97,5 +85,5 @@ if __name__ == "__main__":
         for ast in astlist:
             ast = p2flatten.flatten(ast)
             ast = p2insselector.transform(ast)
-            print '\nFunction\n================='
-            print prettyAST(ast)
+            print('\nFunction\n=================')
+            print(prettyAST(ast))
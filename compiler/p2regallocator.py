@@ -1,5 +1,6 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 from p0regallocator import P0RegAllocator
@@ -52,7 +53,8 @@ class P2RegAllocator(P1RegAllocator):
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     from comp_util import *
     from p2uniquifyvars import P2UniquifyVars
@@ -75,7 +77,7 @@ if __name__ == "__main__":
         p2flatten = P2Flattener(varalloc)
         p2insselector = P2InstructionSelector(varalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         unique = p2unique.transform(ast)        
         explicated = p2explicator.explicate(unique)
         heaped = p2heap.transform(explicated)
@@ -85,5 +87,5 @@ if __name__ == "__main__":
             program = p2insselector.transform(ast)
             p2regallocator = P2RegAllocator(program, varalloc)
             program = p2regallocator.substitute()
-            print '\nFunction\n================='
-            print prettyAST(program)
+            print('\nFunction\n=================')
+            print(prettyAST(program))
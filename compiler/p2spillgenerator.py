@@ -1,5 +1,6 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 from p1spillgenerator import P1SpillGenerator
@@ -29,13 +30,14 @@ class P2SpillGenerator(P1SpillGenerator):
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     from comp_util import *
     if len(sys.argv) < 2:
         sys.exit(1)
     testcases = sys.argv[1:]
     for testcase in testcases:
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         varalloc = VariableAllocator()
         explicate = P1Explicate(varalloc)
         ast = explicate.explicate(ast)
@@ -43,6 +45,6 @@ if __name__ == "__main__":
         stmtlist = flattener.flatten(ast)
         instruction_selector = P1InstructionSelector(varalloc)
         program = instruction_selector.visit(stmtlist)
-        print prettyAST(program)
+        print(prettyAST(program))
         regallocator = P1RegAllocator(program, varalloc)
-        print prettyAST(regallocator.substitute())
+        print(prettyAST(regallocator.substitute()))
@@ -1,5 +1,6 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from p1stackallocator import *
 from x86ir import *
 
@@ -21,7 +22,8 @@ class P2StackAllocator(P1StackAllocator):
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging, logging.config
     from comp_util import *
     from p2uniquifyvars import P2UniquifyVars
@@ -44,7 +46,7 @@ if __name__ == "__main__":
         flatten = P2Flattener(varalloc)
         insselector = P2InstructionSelector(varalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         unique = unique.transform(ast)        
         explicated = explicator.explicate(unique)
         heaped = heap.transform(explicated)
@@ -54,5 +56,5 @@ if __name__ == "__main__":
             program = insselector.transform(ast)
             allocator = P2StackAllocator(program)
             program = allocator.substitute()
-            print '\nFunction\n================='
-            print prettyAST(program)
+            print('\nFunction\n=================')
+            print(prettyAST(program))
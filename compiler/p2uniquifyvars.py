@@ -1,10 +1,12 @@
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 
 import logging, logging.config
+from visitor import Visitor
 
 
-class P2UniquifyVars:
+class P2UniquifyVars(Visitor):
     def __init__(self):
         self.log = logging.getLogger('compiler.uniquify')
         self.vardict = {}
@@ -38,14 +40,6 @@ class P2UniquifyVars:
         self.log.info('Finished uniquify')
         return ret
 
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-
     def visit_Module(self, node):
         # figure out the set of variables that are assigned to in this scope.
         localvars = getLocalAssigns(node)
@@ -96,7 +90,7 @@ class P2UniquifyVars:
     def visit_Dict(self, node):
         keys = [self.visit(x[0]) for x in node.items]
         values = [self.visit(x[1]) for x in node.items]
-        items = map(lambda x: (keys[x],values[x]), range(0,len(keys)))
+        items = list(zip(keys, values))
         return Dict(items)
 
     def visit_Compare(self, node):
@@ -170,7 +164,8 @@ class P2UniquifyVars:
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     if len(sys.argv) < 2:
         sys.exit(1)
@@ -178,8 +173,8 @@ if __name__ == "__main__":
     logging.config.fileConfig('logging.cfg')
     testcases = sys.argv[1:]
     for testcase in testcases:
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         uniquify = P2UniquifyVars()
         ast = uniquify.transform(ast)
-        print ast
-        print prettyAST(ast)
+        print(ast)
+        print(prettyAST(ast))
@@ -1,32 +1,22 @@
 # vim: set ts=4 sw=4 expandtab:
-from compiler.ast import *
+from pyast import *
 from comp_util import *
 import logging
+from visitor import Visitor
 
-class P3ClassTransform(object):
+class P3ClassTransform(Visitor):
     def __init__(self, classtmpvar, localassigns, outsidescope):
         self.classtmpvar = classtmpvar
         self.localassigns = localassigns
         self.outsidescope = outsidescope
         
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        # we cannot blindly return the node itself, if there is no visit 
-        # function for that type.  This is because the children of that node may need
-        # to be recursed upon: ex.  Printnl(CallFuncIndirect(...))
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-
     # P0
     # ================================================================================
     def visit_Module(self, node):
         return Module(None, self.visit(node.node), None)
 
     def visit_Stmt(self, node):
-        stmts = reduce(lambda x,y: x+y, [self.visit(x) for x in node.nodes], [])
+        stmts = concat([self.visit(x) for x in node.nodes])
         return Stmt(stmts,None)
 
     def visit_Printnl(self, node):
@@ -99,7 +89,7 @@ class P3ClassTransform(object):
     def visit_Dict(self, node):
         keys = [self.visit(x[0]) for x in node.items]
         values = [self.visit(x[1]) for x in node.items]
-        items = map(lambda x: (keys[x],values[x]), range(0,len(keys)))
+        items = list(zip(keys, values))
         return Dict(items)
 
     def visit_Compare(self, node):
@@ -140,7 +130,7 @@ class P3ClassTransform(object):
     def visit_If(self, node):
         tests = [self.visit(x[0]) for x in node.tests]
         thens = [self.visit(x[1]) for x in node.tests]
-        return [If(zip(tests, thens), self.visit(node.else_))]
+        return [If(list(zip(tests, thens)), self.visit(node.else_))]
 
     # do not handle visit_Class, as all class definitions
     # should have been removed by declassify
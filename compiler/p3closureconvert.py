@@ -1,4 +1,5 @@
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from x86ir import *
 
@@ -24,7 +25,8 @@ class P3ClosureConversion(P2ClosureConversion):
 
     
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     from p3declassify import P3Declassify
     from gcflattener import GCFlattener
@@ -49,7 +51,7 @@ if __name__ == "__main__":
         heap = P3Heapify(explicator)
         closure = P3ClosureConversion(explicator, varalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         ast = declassify.transform(ast)
         ast = wrapper.transform(ast)
         ast = unique.transform(ast)        
@@ -59,5 +61,5 @@ if __name__ == "__main__":
         ast = heap.transform(ast)
         astlist = closure.transform(ast)
         for ast in astlist:
-            print '\nFunction\n================='
-            print prettyAST(ast)
+            print('\nFunction\n=================')
+            print(prettyAST(ast))
@@ -1,10 +1,14 @@
 # vim: set ts=4 sw=4 expandtab:
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 import logging
 from p3classtransform import *
+from visitor import Visitor
+
+class P3Declassify(Visitor):
+    name = 'declassify'
 
-class P3Declassify:
     def __init__(self, varalloc):
         self.varalloc = varalloc
         self.log = logging.getLogger('compiler.declassify')
@@ -16,17 +20,6 @@ class P3Declassify:
         self.log.info ('Finished declassify')
         return ret
 
-    def visit(self, node, *args, **kwargs):
-        meth = None
-        meth_name = 'visit_'+node.__class__.__name__
-        meth = getattr(self, meth_name, None)
-        # we cannot blindly return the node itself, if there is no visit 
-        # function for that type.  This is because the children of that node may need
-        # to be recursed upon: ex.  Printnl(CallFuncIndirect(...))
-        if not meth:
-            raise Exception('Unknown node: %s method: %s' % (node.__class__, meth_name))
-        return meth(node, *args, **kwargs)
-
     # P0
     # ================================================================================
     def visit_Module(self, node):
@@ -36,7 +29,7 @@ class P3Declassify:
         return Module(None, self.visit(node.node), None)
 
     def visit_Stmt(self, node):
-        stmts = reduce(lambda x,y: x+y, [self.visit(x) for x in node.nodes], [])
+        stmts = concat([self.visit(x) for x in node.nodes])
         return Stmt(stmts,None)
 
     def visit_Printnl(self, node):
@@ -91,7 +84,7 @@ class P3Declassify:
     def visit_Dict(self, node):
         keys = [self.visit(x[0]) for x in node.items]
         values = [self.visit(x[1]) for x in node.items]
-        items = map(lambda x: (keys[x],values[x]), range(0,len(keys)))
+        items = list(zip(keys, values))
         return Dict(items)
 
     def visit_Compare(self, node):
@@ -132,13 +125,13 @@ class P3Declassify:
     def visit_If(self, node):
         tests = [self.visit(x[0]) for x in node.tests]
         thens = [self.visit(x[1]) for x in node.tests]
-        return [If(zip(tests, thens), self.visit(node.else_))]
+        return [If(list(zip(tests, thens)), self.visit(node.else_))]
 
     def visit_Class(self, node):
         # Before doing anything else, declassify the class body to handle
         # nested class definitions
         code = self.visit(node.code)
-        self.log.debug('class %s: code = %s' % (node.name,code))
+        self.log.debug('class %s: code = %s', node.name,code)
         # allocate a temporary to hold the return value from create_class
         classvar = self.varalloc.get_next_var()
 
@@ -148,8 +141,8 @@ class P3Declassify:
         
         # create a transformer for this class
         localassigns = getLocalAssigns(code)
-        self.log.debug('getLocalAssigns = %s' % localassigns)
-        self.log.debug('current scope   = %s' % currentscope)
+        self.log.debug('getLocalAssigns = %s', localassigns)
+        self.log.debug('current scope   = %s', currentscope)
         classtransform = P3ClassTransform(classvar,localassigns, currentscope)
         stmts = []
         # assignment to temp class variable
@@ -169,7 +162,8 @@ class P3Declassify:
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     if len(sys.argv) < 2:
         sys.exit(1)
@@ -177,8 +171,8 @@ if __name__ == "__main__":
     logging.config.fileConfig('logging.cfg')
     testcases = sys.argv[1:]
     for testcase in testcases:
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         varalloc = VariableAllocator()
         declassify = P3Declassify(varalloc)
         ast = declassify.transform(ast)
-        print prettyAST(ast)
+        print(prettyAST(ast))
@@ -1,4 +1,5 @@
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from x86ir import *
 import logging
@@ -6,6 +7,8 @@ import logging
 from p2explicate import P2Explicate
 
 class P3Explicate(P2Explicate):
+    requires = ('uniquify',)
+
     def __init__(self, varalloc, handleLambdas=True):
         P2Explicate.__init__(self, varalloc, handleLambdas)
             
@@ -20,8 +23,8 @@ class P3Explicate(P2Explicate):
     def visit_While(self, node, *args, **kwargs):
         test0  = self.visit(node.test[0])
         test1  = self.visit(node.test[1])
-        self.log.info('visit_While: test0=%s' % test0)
-        self.log.info('visit_While: test1=%s' % test1)
+        self.log.info('visit_While: test0=%s', test0)
+        self.log.info('visit_While: test1=%s', test1)
         body  = self.visit(node.body)
         var = Name(self.varalloc.get_next_var())
         # explicate the test so we can compare it to 0
@@ -148,7 +151,8 @@ class P3Explicate(P2Explicate):
             return P2Explicate.visit_Assign(self, node)
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     from p3declassify import P3Declassify
     from p3wrapper import P3Wrapper
@@ -168,10 +172,10 @@ if __name__ == "__main__":
         uniquify  = P3UniquifyVars()
         explicator = P3Explicate(varalloc, handleLambdas=False)
         gcrefcount = GCRefCount(varalloc)
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         ast = declassify.transform(ast)
         ast = wrapper.transform(ast)
         ast = uniquify.transform(ast)
         ast = gcflatten.transform(ast)
         ast = gcrefcount.transform(ast)         
-        print prettyAST(explicator.transform(ast))
+        print(prettyAST(explicator.transform(ast)))
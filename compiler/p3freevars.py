@@ -1,4 +1,5 @@
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from x86ir import *
 
@@ -10,35 +11,11 @@ import logging
 from p2freevars import P2FreeVars
 
 class P3FreeVars(P2FreeVars):
-    '''Returns for each visited node return a set of variables not bound in that node'''
+    '''P2FreeVars for P3: comp_util.scopes handles While and If too'''
     def __init__(self):
         P2FreeVars.__init__(self)
         
-    def getLocalAssigns(self,n):
-        self.log.debug('getLocalAssigns %s'%n)
 
-        if isinstance(n, (While, If)):
-            # these are all expressions, so no assignments
-            return set([])
-        elif isinstance(n, (Let)):
-            return set([n.var.name])
-        else:
-            return P2FreeVars.getLocalAssigns(self, n)
-    
-    def visit_While(self, node, *args, **kwargs):
-        self.log.debug('visit_While %s'%node)
-        test_b, test_f = self.visit(node.test[1])
-        then_b, then_f = self.visit(node.body)
-        return (set([]), test_f | then_f )
-
-    def visit_If(self, node, *args, **kwargs):
-        self.log.debug('visit_If %s'%node)
-        test_b, test_f = self.visit(node.tests[0][0])
-        then_b, then_f = self.visit(node.tests[0][1])
-        else_b, else_f = self.visit(node.else_)
-        return (set([]), test_f | then_f | else_f)
-
-    
 if __name__ == "__main__":
     # create logger
     log = logging.getLogger('freevars')
@@ -57,7 +34,8 @@ if __name__ == "__main__":
     # add ch to logger
     log.addHandler(ch)
 
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     if len(sys.argv) < 2:
         sys.exit(1)
     testcases = sys.argv[1:]
@@ -67,10 +45,10 @@ if __name__ == "__main__":
         p3explicator = P3Explicate(VariableAllocator())
         p3free = P3FreeVars()
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         unique = p3unique.visit(ast)        
         explicated = p3explicator.explicate(unique)
-        print prettyAST(explicated)
+        print(prettyAST(explicated))
         ast = p3free.visit(explicated)
         
-        print ast            
+        print(ast)            
@@ -1,30 +1,37 @@
+from __future__ import print_function
 from x86ir import *
 from p2generator import P2Generator 
 
 class P3Generator(P2Generator):
-    def __init__(self, allowMem2Mem=True):
+    def __init__(self, allowMem2Mem=True, labelprefix=''):
         P2Generator.__init__(self, allowMem2Mem)
+        self.labelprefix = labelprefix
         self.labelcnt = 1
         self.strlabeldict = {}
+        # the strings in the order they got their labels, which the dict
+        # does not keep on Python 2
+        self.strings = []
 
     def get_next_str_label(self, string):
         if string in self.strlabeldict:
             return self.strlabeldict[string]
         else:
-            label = '.str%s' % self.labelcnt
+            label = '.str%s%s' % (self.labelprefix, self.labelcnt)
             self.strlabeldict[string] = label
+            self.strings.append(string)
             self.labelcnt = self.labelcnt + 1
             return label
 
     def get_string_decls(self):
         decls=[]
-        for string,label in self.strlabeldict.items():
-            decls.append('%s:\n\t.string "%s"' % (label, string))
+        for string in self.strings:
+            decls.append('%s:\n\t.string "%s"' % (self.strlabeldict[string], string))
         # this is kind of nasty to introduce a side effect like this,
         # but we don't want to print out duplicate strings if this
         # generator is used again (for example to print out top-level
         # function definitions)
         self.strlabeldict = {}
+        self.strings = []
         return "\n".join(decls)
 
     # override to handle string constants
@@ -46,7 +53,8 @@ class P3Generator(P2Generator):
     
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     from comp_util import *
     from p3declassify import P3Declassify
@@ -76,7 +84,7 @@ if __name__ == "__main__":
         ifinsselector = P3IfInstructionSelector(varalloc,insselector.labelalloc)
         generator = P3Generator(True)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         ast = declassify.transform(ast)
         ast = unique.transform(ast)
         ast = explicator.explicate(ast)
@@ -89,4 +97,4 @@ if __name__ == "__main__":
 #            allocator = P3RegAllocator(program, varalloc)
             program = allocator.substitute()
             program = ifinsselector.visit(program)
-            print generator.generate(program)
+            print(generator.generate(program))
@@ -1,10 +1,10 @@
 # vim: set ts=4 sw=4 expandtab:
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 from x86ir import *
 import logging
 
-from p3freevars import P3FreeVars
 from gcflattener import GCFlattener
 from gcrefcount import GCRefCount
 from p3wrapper import P3Wrapper
@@ -15,24 +15,8 @@ class P3Heapify(P2Heapify):
     def __init__(self, explicate):
         self.log = logging.getLogger('compiler.heapify')
         self.explicate = P3Explicate(explicate.varalloc,False)
-        self.freevars = P3FreeVars()
         self.heapvarset = set([])
 
-    def getLambdaFreeVars(self, n):
-        if isinstance(n, (While)):
-            test_fv = self.getLambdaFreeVars(n.test[1])
-            body_fv = self.getLambdaFreeVars(n.body)
-            return test_fv | body_fv
-        elif isinstance(n, If):
-            test_fv = self.getLambdaFreeVars(n.tests[0][0])
-            then_fv = self.getLambdaFreeVars(n.tests[0][1])
-            else_fv = self.getLambdaFreeVars(n.else_)
-            # ignore n.else_ for now
-            return test_fv | then_fv | else_fv
-        else:
-            return P2Heapify.getLambdaFreeVars(self,n)
-            #return super(P3Heapify, self).getLambdaFreeVars(n)
-    
     def visit_While(self, node):
         return While((self.visit(node.test[0]),self.visit(node.test[1])), self.visit(node.body), [], node.lineno)
 
@@ -40,7 +24,8 @@ class P3Heapify(P2Heapify):
         return If([(self.visit(node.tests[0][0]), self.visit(node.tests[0][1]))], self.visit(node.else_))
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     from p3declassify import P3Declassify
     from p3uniquifyvars import P3UniquifyVars
@@ -59,7 +44,7 @@ if __name__ == "__main__":
         explicator = P3Explicate(varalloc, handleLambdas=False)
         heap = P3Heapify(explicator)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         ast = declassify.transform(ast)
         ast = wrapper.transform(ast)
         ast = unique.transform(ast)        
@@ -67,5 +52,5 @@ if __name__ == "__main__":
         ast = gcrefcount.transform(ast)        
         ast = explicator.explicate(ast)
         ast = heap.transform(ast)
-        print prettyAST(ast)
-        print ast
+        print(prettyAST(ast))
+        print(ast)
@@ -1,9 +1,10 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 # to flatten nested lists into a flat list
-from compiler.ast import flatten
+from pyast import flatten
 from p2ifinsselector import P2IfInstructionSelector
 
 # Concept borrowed from http://peter-hoffmann.com/2010/extrinsic-visitor-pattern-python-inheritance.html
@@ -29,7 +30,8 @@ class P3IfInstructionSelector(P2IfInstructionSelector):
     
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     from p3declassify import P3Declassify
     from p3uniquifyvars import P3UniquifyVars
     from p3explicate import P3Explicate
@@ -55,7 +57,7 @@ if __name__ == "__main__":
         insselector = P3InstructionSelector(varalloc)
         ifinsselector = P3IfInstructionSelector(varalloc,insselector.labelalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         ast = declassify.transform(ast)
         ast = unique.transform(ast)        
         ast = explicator.explicate(ast)
@@ -67,5 +69,5 @@ if __name__ == "__main__":
             regallocator = P3RegAllocator(program, varalloc)
             program = regallocator.substitute()
             program = ifinsselector.visit(program)
-            print '\nFunction\n================='
-            print prettyAST(program)
+            print('\nFunction\n=================')
+            print(prettyAST(program))
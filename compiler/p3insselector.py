@@ -1,5 +1,5 @@
 # vim: set ts=4 sw=4 expandtab:
-import compiler
+from __future__ import print_function
 from comp_util import *
 from x86ir import *
 from p2insselector import P2InstructionSelector
@@ -8,8 +8,8 @@ from p2insselector import P2InstructionSelector
 # Concept borrowed from http://peter-hoffmann.com/2010/extrinsic-visitor-pattern-python-inheritance.html
 class P3InstructionSelector(P2InstructionSelector):
     '''Instruction selection for dynamic types as well as if, also converts an If node to Labels and Jumps'''
-    def __init__(self, varalloc):
-        P2InstructionSelector.__init__(self, varalloc)
+    def __init__(self, varalloc, labelalloc=None):
+        P2InstructionSelector.__init__(self, varalloc, labelalloc)
 
     def visit_While(self, node, *args, **kwargs):
         # need to create a temporary variable here to store the result.
@@ -19,14 +19,15 @@ class P3InstructionSelector(P2InstructionSelector):
         testvar, dummy = self.visit(node.test[0])
         teststmts = self.visit(node.test[1])
         bodystmts = self.visit(node.body)
-        teststmts = reduce(lambda x,y: x+y, [x.instructions for x in teststmts], [])
-        bodystmts = reduce(lambda x,y: x+y, [x.instructions for x in bodystmts], [])
+        teststmts = concat([x.instructions for x in teststmts])
+        bodystmts = concat([x.instructions for x in bodystmts])
         return [x86While((testvar,teststmts),bodystmts,[],node.lineno)]
 
 
 if __name__ == "__main__":
     import sys
     import logging.config
+    from p0parser import parseFile
     
     from p3declassify import P3Declassify
     from p3wrapper import P3Wrapper
@@ -56,7 +57,7 @@ if __name__ == "__main__":
         flatten = P3Flattener(varalloc)
         insselector = P3InstructionSelector(varalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         ast = declassify.transform(ast)
         ast = wrapper.transform(ast)
         ast = unique.transform(ast)        
@@ -68,5 +69,5 @@ if __name__ == "__main__":
         for ast in astlist:
             ast = flatten.flatten(ast)
             ast = insselector.transform(ast)
-            print '\nFunction\n================='
-            print prettyAST(ast)
+            print('\nFunction\n=================')
+            print(prettyAST(ast))
@@ -0,0 +1,236 @@
+# vim: set ts=4 sw=4 expandtab:
+#
+# Linear scan register allocation (Poletto and Sarkar, "Linear Scan Register
+# Allocation", TOPLAS 1999) for the P3 back end.  Instead of an interference
+# graph every variable gets one live interval over the instructions in the
+# order the generator lays them out, and the intervals are given registers in
+# a single pass in order of their start.  Where P3RegAllocator's graph and
+# colouring grow with the square of the number of variables live at the same
+# time, this takes time about linear in the size of the function, at the
+# price of somewhat worse code: a variable is given one location for the
+# whole of its interval, holes included.
+#
+# Everything else is shared with P3RegAllocator: the liveness analysis, the
+# substitution of the locations and the P3SpillGenerator, run until no more
+# spill code is needed.
+
+from __future__ import print_function
+import heapq
+from bisect import bisect_left
+from comp_util import *
+from x86ir import *
+from p0regallocator import P0RegAllocator
+from p3regallocator import P3RegAllocator
+
+class Interval(object):
+    """The positions from start to end, both included, a variable needs a
+    location for.  The instruction numbered k reads its operands at
+    position 2k and writes them at 2k+1, so that the source of an
+    instruction may share a register with its destination when it is not
+    live after it."""
+    __slots__ = ('var', 'start', 'end', 'forbidden')
+    def __init__(self, var, position):
+        self.var = var
+        self.start = position
+        self.end = position
+        # indexes into ALL_REGS of the registers the variable cannot be
+        # given, because they are written while it is live
+        self.forbidden = set()
+    def extend(self, position):
+        if position < self.start:
+            self.start = position
+        elif position > self.end:
+            self.end = position
+    def __str__(self):
+        return 'Interval(%s, %d, %d)' % (self.var, self.start, self.end)
+
+class P3LinearScanAllocator(P3RegAllocator):
+    def __init__(self, program, varalloc):
+        P3RegAllocator.__init__(self, program, varalloc)
+
+    def _reset(self):
+        P3RegAllocator._reset(self)
+        self.intervals = {}
+        # for every index into ALL_REGS, the positions at which that
+        # register is written and the variable that may keep it, the source
+        # of the move that writes it, if any
+        self.clobbers = [[] for reg in P0RegAllocator.ALL_REGS]
+        self.position = 0
+
+    def _use(self, var, position):
+        interval = self.intervals.get(var)
+        if interval is None:
+            self.intervals[var] = Interval(var, position)
+        else:
+            interval.extend(position)
+
+    def _number(self, instructions):
+        """Numbers instructions in layout order and records the positions
+        every variable is read and written at, and those registers are
+        written at.  Returns the bits of the variables live at the top of the
+        loops in instructions, with the first and last position of each
+        loop."""
+        loops = []
+        for instr in instructions:
+            k = self.position
+            self.position = k + 2
+            if isinstance(instr, x86If):
+                if isinstance(instr.test, Var):
+                    self._use(instr.test, k)
+                loops.extend(self._number(instr.then))
+                loops.extend(self._number(instr.else_))
+            elif isinstance(instr, x86While):
+                loops.extend(self._number(instr.test[1]))
+                if isinstance(instr.test[0], Var):
+                    self._use(instr.test[0], self.position)
+                self.position += 2
+                loops.extend(self._number(instr.body))
+                # what is live at the top of the loop is live at its end,
+                # the jump back
+                top = self.liveness.loops[instr].livein
+                loops.append((top, k, self.position))
+                self.position += 2
+            else:
+                for var in instr.reads():
+                    if isinstance(var, Var):
+                        self._use(var, k)
+                src = instr.src if isinstance(instr, Movl) and isinstance(instr.src, Var) else None
+                for var in instr.writes():
+                    if isinstance(var, Var):
+                        self._use(var, k + 1)
+                    elif var in P0RegAllocator.ALL_REGS:
+                        self.clobbers[P0RegAllocator.ALL_REGS.index(var)].append((k + 1, src))
+                if isinstance(instr, (Call, CallAddress)):
+                    for reg in P0RegAllocator.CALLER_SAVE:
+                        self.clobbers[P0RegAllocator.ALL_REGS.index(reg)].append((k + 1, None))
+        return loops
+
+    def build_interference_graph(self):
+        """Linear scan needs no interference graph: this builds the live
+        intervals instead.  An interval spans every read and write of its
+        variable, and the whole of every loop the variable is live at the
+        top of, since it has to survive the jump back.  Together that covers
+        every position the variable is live at."""
+        loops = self._number(self.program.instructions())
+        for top, start, end in loops:
+            for var in self.liveness.members(top):
+                self._use(var, start)
+                self._use(var, end)
+        # a register written while an interval is live may not hold it
+        for reg, clobbers in enumerate(self.clobbers):
+            positions = [position for position, src in clobbers]
+            for interval in self.intervals.values():
+                i = bisect_left(positions, interval.start)
+                while i < len(positions) and positions[i] <= interval.end:
+                    if clobbers[i][1] is not interval.var:
+                        interval.forbidden.add(reg)
+                        break
+                    i += 1
+
+    def color_graph(self):
+        """Assigns every interval a register, or a stack slot if it is
+        spilled, in order of their start.  When no register is free the
+        interval that ends last among the new one and those holding a
+        register it may use is spilled; the temporaries of the spill
+        generator are never spilled."""
+        numregs = len(P0RegAllocator.ALL_REGS)
+        # in order of start, unspillable ones first, then by Var id, so the
+        # result does not depend on the order of the dictionary
+        intervals = sorted(self.intervals.values(),
+                           key=lambda x: (x.start, x.var.spillable, x.var.id))
+        active = []     # heap of (end, var id, interval) holding a register
+        holder = {}     # register index -> interval
+        spilled = []
+        for interval in intervals:
+            while active and active[0][0] < interval.start:
+                end, id, done = heapq.heappop(active)
+                del holder[self.register_assgnmnt[done.var]]
+            reg = None
+            for r in range(numregs):
+                if r not in holder and r not in interval.forbidden:
+                    reg = r
+                    break
+            if reg is None:
+                victim = None
+                for r, other in holder.items():
+                    if r in interval.forbidden or not other.var.spillable:
+                        continue
+                    if victim is None or (other.end, other.var.id) > (victim.end, victim.var.id):
+                        victim = other
+                if victim is not None and (victim.end > interval.end or not interval.var.spillable):
+                    reg = self.register_assgnmnt[victim.var]
+                    active.remove((victim.end, victim.var.id, victim))
+                    heapq.heapify(active)
+                    del self.register_assgnmnt[victim.var]
+                    spilled.append(victim)
+                elif interval.var.spillable:
+                    spilled.append(interval)
+                    continue
+                else:
+                    raise Exception("No register for unspillable variable '%s'" % interval.var)
+            self.register_assgnmnt[interval.var] = reg
+            holder[reg] = interval
+            heapq.heappush(active, (interval.end, interval.var.id, interval))
+        self.assign_stack_slots(spilled)
+
+    def assign_stack_slots(self, spilled):
+        """Gives the spilled intervals stack slots, reusing the slot of an
+        interval once it has ended."""
+        numregs = len(P0RegAllocator.ALL_REGS)
+        spilled.sort(key=lambda x: (x.start, x.var.id))
+        active = []     # heap of (end, slot)
+        free = []       # heap of slots
+        nslots = 0
+        for interval in spilled:
+            while active and active[0][0] < interval.start:
+                heapq.heappush(free, heapq.heappop(active)[1])
+            if free:
+                slot = heapq.heappop(free)
+            else:
+                slot = nslots
+                nslots += 1
+            self.register_assgnmnt[interval.var] = numregs + slot
+            heapq.heappush(active, (interval.end, slot))
+
+
+if __name__ == "__main__":
+    import sys
+    from p0parser import parseFile
+    import logging.config
+    from comp_util import *
+    from p3declassify import P3Declassify
+    from p3uniquifyvars import P3UniquifyVars
+    from p3explicate import P3Explicate
+    from p3heapify import P3Heapify
+    from p3closureconvert import P3ClosureConversion
+    from p3flattener import P3Flattener
+    from p3insselector import P3InstructionSelector
+    if len(sys.argv) < 2:
+        sys.exit(1)
+    # configure logging
+    logging.config.fileConfig('logging.cfg')
+    testcases = sys.argv[1:]
+    for testcase in testcases:
+        varalloc = VariableAllocator()
+        declassify = P3Declassify(varalloc)
+        unique = P3UniquifyVars()
+        explicator = P3Explicate(varalloc)
+        heap = P3Heapify(explicator)
+        closure = P3ClosureConversion(explicator, varalloc)
+        flatten = P3Flattener(varalloc)
+        insselector = P3InstructionSelector(varalloc)
+
+        ast = parseFile(testcase)
+        ast = declassify.transform(ast)
+        ast = unique.transform(ast)
+        ast = explicator.explicate(ast)
+        ast = heap.transform(ast)
+        astlist = closure.transform(ast)
+        for ast in astlist:
+            ast = flatten.flatten(ast)
+            program = insselector.transform(ast)
+            regallocator = P3LinearScanAllocator(program, varalloc)
+            program = regallocator.substitute()
+            print('\nFunction\n=================')
+            print(program)
+            print(prettyAST(program))
@@ -1,89 +1,273 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
+import os
 from comp_util import *
 from x86ir import *
 from p0regallocator import P0RegAllocator
 from p2regallocator import P2RegAllocator
+from liveness import Liveness
 from p3spillgenerator import P3SpillGenerator
 
+# raised by the first round of substitute for a function with more
+# interferences than MAX_INTERFERENCES, before it has changed the program, so
+# that the function can be given to the linear scan allocator instead
+class GraphTooLarge(Exception):
+    pass
+
 class P3RegAllocator(P2RegAllocator):
+    # substitute only allocates the temporaries of the spill generator on
+    # their own in the first this many rounds, then everything in every
+    # round; P3_MAX_ROUNDS overrides it, for make roundstest
+    MAX_ROUNDS = int(os.environ.get('P3_MAX_ROUNDS', 10))
+    # the colouring takes about 40us per interference over all the rounds of
+    # a function: on programs of bench/genprog.py -l 4 -c 2, 61000 took 3s,
+    # 360000 21s and 2.6 million 103s, where linear scan took at most 1.4s;
+    # no function of the tests has more than 42000 but those of test2 and
+    # ex1.1_tc17, which --allocator auto gives to linear scan anyway
+    MAX_INTERFERENCES = 100000
+
     def __init__(self, program, varalloc):
         P2RegAllocator.__init__(self, program, varalloc)
         self.spillgenerator = P3SpillGenerator(varalloc)
+        self.rounds = 0
+
+    def _reset(self):
+        P2RegAllocator._reset(self)
+        # the moves coalescing may remove, as (src, dst)
+        self.moves = []
+        # coalesced variable -> the variable it was merged into
+        self.alias = {}
+        # how many of the moves coalescing made go away
+        self.coalesced = 0
+
+    def liveness_analyze(self):
+        """Unlike P1RegAllocator this does not store the sets of live
+        variables on the instructions: build_interference_graph walks the
+        blocks of the liveness analysis and works them out as it goes."""
+        self.liveness = Liveness(self.program.instructions())
+        # add all variables to the graph
+        for x in self.liveness.vars.values():
+            self._add_vertex(x)
 
-    def Lbefore(self, instructionlist, Lafter=set()):
-        """Computes liveness recursively.  Liveness is stored as an attribute on
-        the instruction itself, to be used later during construction of the
-        interference graph."""
-        # our base case
-        if len(instructionlist) < 1:
-            return Lafter
-        instr = instructionlist[0]
-        # compute Lafter (haha, laughter, get it?)
-        laughter = self.Lbefore(instructionlist[1:], Lafter)
-        # just store the liveness set in the instruction node itself.
-        instr.liveafter = laughter
-        # Now, return the liveness before. How this is computed depends on whether 
-        # we have an x86If or a real Instruction.
-        if isinstance(instr, x86While):
-            if isinstance(instr.test[0], Var):
-                self._add_vertex(instr.test[0])
-            return (set(instr.test[0]) | self.Lbefore(instr.test[1],instr.liveafter) | self.Lbefore(instr.body,instr.liveafter))
-        elif isinstance(instr, x86If):
-            if isinstance(instr.test, Var):
-                self._add_vertex(instr.test)
-            return (set(instr.test) | self.Lbefore(instr.then,instr.liveafter) | self.Lbefore(instr.else_,instr.liveafter))
-        elif isinstance(instr, Instruction):
-            # get reads/writes performed by instruction, but only for variables
-            writes = set(filter(lambda x: isinstance(x,Var), instr.writes()))
-            reads = set(filter(lambda x: isinstance(x,Var), instr.reads()))
-            # add all variables to the graph
-            for x in writes: self._add_vertex(x)
-            for x in reads: self._add_vertex(x)
-            # For all x86 instructions, Lbefore(instr,Lafter) = Lafter - writes | reads
-            return (instr.liveafter - writes) | reads
-        else:
-            raise Exception("Unknown instruction: '%s'" % instr)
-
-    def build_interference_graph_instr(self, instructions):
-        for instr in instructions:
-            # get the list of variables live at this point
-            live_after_k = instr.liveafter
-            # rule #0 (added in p1)
-            # Need to recurse on x86If nodes.
-            if isinstance(instr,x86If):
-                for live in live_after_k:
-                    if isinstance(instr.test,Var) and live != instr.test:
-                        self._add_edge(live, instr.test)
-                self.log.debug('build_interf_graph: x86If.then = %s' % instr.then)
-                self.log.debug('build_interf_graph: x86If.else_ = %s' % instr.else_)
-                self.build_interference_graph_instr(instr.then)
-                self.build_interference_graph_instr(instr.else_)
-            elif isinstance(instr,x86While):
-                for live in live_after_k:
-                    if isinstance(instr.test[0],Var) and live != instr.test[0]:
-                        self._add_edge(live, instr.test[0])
-                self.log.debug('build_interf_graph: x86While.test[1] = %s' % instr.test[1])
-                self.log.debug('build_interf_graph: x86While.body = %s' % instr.body)
-                self.build_interference_graph_instr(instr.test[1])
-                self.build_interference_graph_instr(instr.body)
-            # rule #1
-            elif isinstance(instr,Movl):
-                for live in live_after_k:
-                    if instr.dst != live or (isinstance(instr.src,Var) and instr.src != live):
-                        self._add_edge(instr.dst, live)
-            # rule #2
-            elif isinstance(instr,(Addl,Negl)):
-                for live in live_after_k:
-                    if isinstance(instr, Addl) and isinstance(instr.dst, Var):
-                        self._add_edge(instr.dst, live)
-                    elif isinstance(instr, Negl) and isinstance(instr.operand, Var):   
-                        self._add_edge(instr.operand, live)
-            # rule #3
-            elif isinstance(instr,(Call,CallAddress)):
-                for live in live_after_k:
+    def build_interference_graph(self):
+        """Builds the graph with the sets of live variables as bits: every
+        variable and register gets the bits of all the variables it
+        interferes with, one integer operation per instruction, and the
+        edges are only made once at the end.  In the first round, raises
+        GraphTooLarge instead if there would be more than
+        MAX_INTERFERENCES of them."""
+        liveness = self.liveness
+        ALL_REGS = P0RegAllocator.ALL_REGS
+        adjacent = {}
+        clobbered = [0] * len(ALL_REGS)
+        for block in liveness.blocks:
+            for instr, live in liveness.backward(block):
+                # rules #1 and #2: whatever an instruction writes interferes
+                # with everything live after it, except that the destination
+                # of a move may share a location with its source
+                src = 0
+                if isinstance(instr,Movl):
+                    src = liveness.bit(instr.src)
+                    if self._coalescable(instr.src, instr.dst):
+                        self.moves.append((instr.src, instr.dst))
+                for dst in instr.writes():
+                    if isinstance(dst,Var):
+                        adjacent[dst] = adjacent.get(dst, 0) | (live & ~(src | liveness.bit(dst)))
+                    elif dst in ALL_REGS:
+                        clobbered[ALL_REGS.index(dst)] |= live & ~src
+                # rule #3
+                if isinstance(instr,(Call,CallAddress)):
                     for reg in P0RegAllocator.CALLER_SAVE:
-                        self._add_edge(live, reg)
+                        clobbered[ALL_REGS.index(reg)] |= live
+        if self.rounds == 1:
+            interferences = sum([bin(bits).count('1') for bits in adjacent.values()])
+            if interferences > self.MAX_INTERFERENCES:
+                raise GraphTooLarge('%d interferences, more than %d' % (interferences, self.MAX_INTERFERENCES))
+        for dst, bits in adjacent.items():
+            self._add_edges(dst, liveness.members(bits))
+        for reg, bits in zip(ALL_REGS, clobbered):
+            self._add_edges(reg, liveness.members(bits))
+
+    def _find(self, var):
+        """The variable or register var was coalesced into, or var."""
+        alias = self.alias
+        root = var
+        while root in alias:
+            root = alias[root]
+        while var is not root:
+            next = alias[var]
+            alias[var] = root
+            var = next
+        return root
+
+    def _coalescable(self, src, dst):
+        """True for a move between two variables, or between a variable
+        and a register the allocator may assign."""
+        if src is dst:
+            return False
+        if isinstance(src, Var):
+            return isinstance(dst, Var) or (isinstance(dst, Register) and dst in P0RegAllocator.ALL_REGS)
+        return isinstance(dst, Var) and isinstance(src, Register) and src in P0RegAllocator.ALL_REGS
+
+    def _significant(self, node, degree):
+        return isinstance(node, Register) or degree >= len(P0RegAllocator.ALL_REGS)
+
+    def _briggs(self, a, b):
+        """True if fewer than K neighbours of a and b together have K or
+        more neighbours once a and b are merged."""
+        graph = self.interf_graph
+        k = len(P0RegAllocator.ALL_REGS)
+        significant = 0
+        for t in graph[a] | graph[b]:
+            degree = len(graph[t])
+            if t in graph[a] and t in graph[b]:
+                degree -= 1
+            if self._significant(t, degree):
+                significant += 1
+                if significant >= k:
+                    return False
+        return True
+
+    def _george(self, a, reg):
+        """True if every neighbour of a already interferes with reg, is
+        another register, or has fewer than K neighbours."""
+        graph = self.interf_graph
+        adjacent = graph[reg]
+        k = len(P0RegAllocator.ALL_REGS)
+        for t in graph[a]:
+            if t not in adjacent and isinstance(t, Var) and len(graph[t]) >= k:
+                return False
+        return True
+
+    def _merge(self, a, b):
+        graph = self.interf_graph
+        adjacent = graph[b]
+        for t in graph.pop(a):
+            graph[t].discard(a)
+            graph[t].add(b)
+            adjacent.add(t)
+        self.alias[a] = b
+
+    def coalesce(self):
+        """Conservative coalescing: merges the source and destination of a
+        move into one vertex, so that they are given the same location and
+        the generator drops the move, when they do not interfere and the
+        merge cannot make the graph harder to colour with K registers.  Two
+        variables are merged when the result has fewer than K neighbours of
+        degree K or more (Briggs); registers always count as such.  A
+        variable is merged into a register, that is given the register,
+        when each of its neighbours already interferes with the register or
+        has degree less than K (George).  George's test is not used for two
+        variables: it merges short lived copies into long lived variables,
+        and the copies end up in memory whenever those are spilled.  The
+        temporaries of the spill generator are left alone."""
+        graph = self.interf_graph
+        for src, dst in self.moves:
+            a = self._find(src)
+            b = self._find(dst)
+            if isinstance(a, Register):
+                a, b = b, a
+            if a is b or isinstance(a, Register) or not a.spillable or b in graph[a]:
+                continue
+            if isinstance(b, Register):
+                if self._george(a, b):
+                    self._merge(a, b)
+            elif b.spillable and self._briggs(a, b):
+                self._merge(a, b)
+        self.coalesced = len([m for m in self.moves if self._find(m[0]) is self._find(m[1])])
+        self.log.info('Coalesced %d of %d moves', self.coalesced, len(self.moves))
+
+    def color_graph(self):
+        self.coalesce()
+        P2RegAllocator.color_graph(self)
+        for var in self.alias:
+            self.register_assgnmnt[var] = self.register_assgnmnt[self._find(var)]
+
+    def allocate_temporaries(self, first):
+        """Gives registers to the temporaries the spill generator added in
+        the last round, the variables numbered first and up, and leaves the
+        other variables where they are.  A temporary only lives from the
+        instruction that sets it to the next one or two, so the liveness of
+        the last round is reused and only the blocks that have temporaries
+        are walked, to find what they interfere with.  Returns False,
+        changing nothing, if a temporary finds every register taken."""
+        liveness = Liveness(self.program.instructions(), self.liveness)
+        ALL_REGS = P0RegAllocator.ALL_REGS
+        temps = self.varalloc.operands.varlist[first:]
+        if not temps:
+            return True
+        # temporary -> the bits of the variables it interferes with, and
+        # the indexes of the registers written while it is live
+        adjacent = dict([(x, 0) for x in temps])
+        clobbered = dict([(x, set()) for x in temps])
+        for block in liveness.blocks:
+            if not [x for x in block.instructions if x.writes() and liveness.mask(x.writes()) >> first]:
+                continue
+            for instr, live in liveness.backward(block):
+                src = liveness.bit(instr.src) if isinstance(instr,Movl) else 0
+                # the same rules as build_interference_graph, for the
+                # temporaries live after the instruction or written by it
+                live_temps = liveness.members(((live & ~src) >> first) << first)
+                for dst in instr.writes():
+                    if isinstance(dst,Var):
+                        if dst.id >= first:
+                            adjacent[dst] |= live & ~(src | liveness.bit(dst))
+                        for temp in live_temps:
+                            if temp is not dst:
+                                adjacent[temp] |= liveness.bit(dst)
+                    elif dst in ALL_REGS:
+                        for temp in live_temps:
+                            clobbered[temp].add(ALL_REGS.index(dst))
+                if isinstance(instr,(Call,CallAddress)):
+                    for temp in liveness.members((live >> first) << first):
+                        clobbered[temp].update([ALL_REGS.index(reg) for reg in P0RegAllocator.CALLER_SAVE])
+        assignment = {}
+        for temp in temps:
+            taken = set(clobbered[temp])
+            for var in liveness.members(adjacent[temp]):
+                taken.add(assignment.get(var, self.register_assgnmnt.get(var)))
+            free = [reg for reg in range(len(ALL_REGS)) if reg not in taken]
+            if not free:
+                self.log.info('No register for %s, allocating again', temp)
+                return False
+            assignment[temp] = free[0]
+        self.register_assgnmnt.update(assignment)
+        for temp in temps:
+            self._add_edges(temp, liveness.members(adjacent[temp]))
+            for reg in clobbered[temp]:
+                self._add_edges(ALL_REGS[reg], [temp])
+        self.liveness = liveness
+        return True
+
+    def substitute(self):
+        """Like P0RegAllocator.substitute, but a round after the first only
+        allocates the temporaries of the spill generator, with
+        allocate_temporaries, unless one of them finds no register: then
+        everything is allocated again, the temporaries first.  That is
+        usually done in two rounds, the second a small fraction of the
+        first.  After MAX_ROUNDS rounds everything is allocated again in
+        every round, as P0RegAllocator.substitute does, which ends because
+        the temporaries are never spilled."""
+        self.log.info('Starting register allocation')
+        self.rounds = 0
+        first = None
+        spilled = True
+        while spilled:
+            self.rounds += 1
+            if first is None or self.rounds > self.MAX_ROUNDS or \
+               not self.allocate_temporaries(first):
+                self._reset()
+                self.liveness_analyze()
+                self.build_interference_graph()
+                self.color_graph()
+            # assign a storage location to Vars (either Register or StackSlot)
+            self.program = self.visit(self.program)
+            # the temporaries of the spill generator are numbered from here
+            first = len(self.varalloc.operands)
+            spilled, self.program = self.spillgenerator.generate_spill(self.program)
+        self.log.info('Finished register allocation in %d rounds', self.rounds)
+        return self.program
 
     def visit_x86While(self, node, *args, **kwargs):
         test = [self.visit(x) for x in node.test[1]]
@@ -95,7 +279,8 @@ class P3RegAllocator(P2RegAllocator):
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     from comp_util import *
     from p3declassify import P3Declassify
@@ -120,7 +305,7 @@ if __name__ == "__main__":
         flatten = P3Flattener(varalloc)
         insselector = P3InstructionSelector(varalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         ast = declassify.transform(ast)
         ast = unique.transform(ast)        
         ast = explicator.explicate(ast)
@@ -131,6 +316,6 @@ if __name__ == "__main__":
             program = insselector.transform(ast)
             regallocator = P3RegAllocator(program, varalloc)
             program = regallocator.substitute()
-            print '\nFunction\n================='
-            print program
-            print prettyAST(program)
+            print('\nFunction\n=================')
+            print(program)
+            print(prettyAST(program))
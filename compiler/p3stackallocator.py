@@ -1,5 +1,6 @@
 # vim: set ts=4 sw=4 expandtab:
 
+from __future__ import print_function
 from p2stackallocator import *
 from x86ir import *
 
@@ -16,7 +17,8 @@ class P3StackAllocator(P2StackAllocator):
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging, logging.config
     from comp_util import *
     from p3declassify import P3Declassify
@@ -47,7 +49,7 @@ if __name__ == "__main__":
         flatten = P3Flattener(varalloc)
         insselector = P3InstructionSelector(varalloc)
 
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         ast = declassify.transform(ast)
         ast = wrapper.transform(ast)
         ast = unique.transform(ast)        
@@ -61,5 +63,5 @@ if __name__ == "__main__":
             program = insselector.transform(ast)
             allocator = P3StackAllocator(program)
             program = allocator.substitute()
-            print '\nFunction\n================='
-            print prettyAST(program)
+            print('\nFunction\n=================')
+            print(prettyAST(program))
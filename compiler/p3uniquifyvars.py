@@ -1,43 +1,100 @@
 # vim: set ts=4 sw=4 expandtab:
-from compiler.ast import *
+from __future__ import print_function
+from pyast import *
 from comp_util import *
 
 import logging, logging.config
 
 from p2uniquifyvars import P2UniquifyVars
+from passmanager import Rewriter
+
+class P3UniquifyVars(Rewriter, P2UniquifyVars):
+    """Renames every variable so that names are unique across scopes.  Works
+    in place on the tree the wrapper has normalised; only Name and AssName
+    nodes are replaced."""
+    name = 'uniquify'
+    requires = ('wrapper',)
 
-class P3UniquifyVars(P2UniquifyVars):
     def __init__(self):
         P2UniquifyVars.__init__(self)
+        # variables to pop when leaving each enclosing Function/Lambda
+        self.scopes = []
+        # ids of the Names that are called by CallFunc; after declassify
+        # these are runtime functions, which are not renamed
+        self.callees = set()
+
+    def transform(self, node):
+        self.log.info('Starting uniquify')
+        ret = Rewriter.transform(self, node)
+        self.log.info('Finished uniquify')
+        return ret
+
+    def enter_Module(self, node):
+        # figure out the set of variables that are assigned to in this scope.
+        # Create an assignment for each of these variables
+        for var in getLocalAssigns(node):
+            self.assignVar(var)
+
+    def enter_CallFunc(self, node):
+        self.callees.add(id(node.node))
+        node.lineno = None
+
+    def leave_CallFunc(self, node):
+        self.callees.discard(id(node.node))
+        return node
 
-    def visit_While(self, node):
-        return While(self.visit(node.test), self.visit(node.body), None, node.lineno)
+    def enter_CallFuncIndirect(self, node):
+        node.lineno = None
 
-    def visit_If(self, node):
-        tests = [self.visit(x[0]) for x in node.tests]
-        thens = [self.visit(x[1]) for x in node.tests]
-        return If(zip(tests, thens), self.visit(node.else_))
+    def enter_Function(self, node):
+        # get function name
+        # do this first since the function name is technically a variable that
+        # is outside the scope of the function.  Otherwise, if there is a variable
+        # in the statements of the function with the same name as the function,
+        # the function name gets this value, which is incorrect.
+        node.name = self.getCurrent(node.name)
+        # figure out the set of variables that are assigned to in this scope.
+        localvars = getLocalAssigns(node.code)
+        # add the parameters to the Function to this set
+        localvars = localvars | set(node.argnames)
+        # Create an assignment for each of these variables
+        for var in localvars:
+            self.assignVar(var)
+        # uniquify the parameters to the Function
+        node.argnames = [self.getCurrent(x) for x in node.argnames]
+        self.scopes.append(localvars)
 
-    def visit_CallFunc(self, node):
-        args = [self.visit(x) for x in node.args]
-        return CallFunc(node.node, args) 
+    def leave_Function(self, node):
+        # pop all vars
+        self.popVars(self.scopes.pop())
+        return node
 
-    def visit_CallFuncIndirect(self, node):
-        args = [self.visit(x) for x in node.args]
-        return CallFuncIndirect(self.visit(node.node), args) 
+    def enter_Lambda(self, node):
+        localvars = getLocalAssigns(node.code) | set(node.argnames)
+        for var in localvars:
+            self.assignVar(var)
+        # only the parameters are popped again
+        self.scopes.append(node.argnames)
+        node.argnames = [self.getCurrent(x) for x in node.argnames]
 
-    def visit_InjectFrom(self, node):
-        return InjectFrom(node.typ, self.visit(node.arg))
+    def leave_Lambda(self, node):
+        self.popVars(self.scopes.pop())
+        return node
 
-    def visit_Getattr(self, node):
-        return Getattr(self.visit(node.expr), node.attrname)
+    def leave_Name(self, node):
+        if node.name == 'True' or node.name == 'False' or id(node) in self.callees:
+            return node
+        return Name(self.getCurrent(node.name))
 
-    def visit_AssAttr(self, node):
-        return AssAttr(self.visit(node.expr), node.attrname, node.flags)
+    def leave_AssName(self, node):
+        if not self.isAllocated(node.name):
+            raise Exception("This shouldn't happen since we pre-allocate variables at the beginning of a Module/Function/Lambda node.")
+        return AssName(self.getCurrent(node.name), node.flags)
 
 
 if __name__ == "__main__":
-    import sys, compiler
+    import sys
+    from p0parser import parseFile
     import logging.config
     from p3declassify import P3Declassify
     if len(sys.argv) < 2:
@@ -46,11 +103,11 @@ if __name__ == "__main__":
     logging.config.fileConfig('logging.cfg')
     testcases = sys.argv[1:]
     for testcase in testcases:
-        ast = compiler.parseFile(testcase)
+        ast = parseFile(testcase)
         varalloc = VariableAllocator()
         declassify = P3Declassify(varalloc)
         uniquify = P3UniquifyVars()
         ast = declassify.transform(ast)
         ast = uniquify.transform(ast)
-        print ast
-        print prettyAST(ast)
+        print(ast)
+        print(prettyAST(ast))
@@ -0,0 +1,259 @@
+# vim: set ts=4 sw=4 expandtab:
+#
+# Pass manager for the whole-program passes of the front end.
+#
+# A pass has a name and the names of the passes it requires to have run
+# before it (the class attributes name and requires).  Most passes are
+# Visitors that copy the tree into a new one; they are run one after the
+# other with their transform().  Passes derived from Rewriter instead do their
+# work in hooks that change the tree in place:
+#
+#   enter_<Class>(node)  called before the children of node are walked
+#   leave_<Class>(node)  called after them, returns what takes the node's
+#                        place; a statement may be replaced by a list of
+#                        statements
+#
+# Which children are walked, and in what order, is up to the pass's walker
+# (see Walker).  Consecutive Rewriters are fused into a single walk of the
+# tree, with the hooks of each pass called in the order the passes were
+# added, as long as all but the last of them are local: their enter_ hooks
+# only look at the node they are given, they have no leave_ hooks and they
+# allocate no temporaries.  Running them node by node then gives the same
+# tree as running them one after the other, provided the later passes'
+# enter_ hooks do not look into the subtree for something a local pass has
+# yet to rewrite.  Passes that hand out
+# temporaries in the order they visit the tree (gcflatten, explicate,
+# heapify, closure conversion) are never fused with each other, the
+# temporaries would be numbered differently.
+#
+# The scope analysis in comp_util (scopes) is shared by all the passes; its
+# answers are thrown away after every pass.
+
+import logging
+from visitor import Visitor
+from passstats import run_pass
+from comp_util import scopes
+
+class Walker(Visitor):
+    """Walks a tree in place, calling the hooks of a group of Rewriters on
+    every node.  visit_<Class> walks the children of a node of that class
+    and stores the results back into it; the order is the one the copying
+    passes used to visit children in, which matters to passes that number
+    things as they go."""
+    def __init__(self, passes):
+        self.passes = passes
+        self.hooks = {}
+
+    def _hooks(self, cls):
+        name = cls.__name__
+        enters = [getattr(p, 'enter_' + name) for p in self.passes if hasattr(p, 'enter_' + name)]
+        leaves = [getattr(p, 'leave_' + name) for p in self.passes if hasattr(p, 'leave_' + name)]
+        self.hooks[cls] = (enters, leaves)
+        return enters, leaves
+
+    def walk(self, node):
+        try:
+            enters, leaves = self.hooks[node.__class__]
+        except KeyError:
+            enters, leaves = self._hooks(node.__class__)
+        for enter in enters:
+            enter(node)
+        self.visit(node)
+        for leave in leaves:
+            node = leave(node)
+        return node
+
+    def walk_list(self, nodes):
+        result = []
+        for n in nodes:
+            n = self.walk(n)
+            if isinstance(n, list):
+                result.extend(n)
+            else:
+                result.append(n)
+        return result
+
+    # P0
+    # ================================================================================
+    def visit_Module(self, node):
+        node.node = self.walk(node.node)
+
+    def visit_Stmt(self, node):
+        node.nodes = self.walk_list(node.nodes)
+
+    def visit_Printnl(self, node):
+        node.nodes = self.walk_list(node.nodes)
+
+    def visit_Assign(self, node):
+        node.nodes = self.walk_list(node.nodes)
+        node.expr = self.walk(node.expr)
+
+    def visit_Discard(self, node):
+        node.expr = self.walk(node.expr)
+
+    def visit_Add(self, node):
+        node.left = self.walk(node.left)
+        node.right = self.walk(node.right)
+
+    def visit_UnarySub(self, node):
+        node.expr = self.walk(node.expr)
+
+    def visit_CallFunc(self, node):
+        node.args = self.walk_list(node.args)
+        node.node = self.walk(node.node)
+
+    def visit_CallFuncIndirect(self, node):
+        node.args = self.walk_list(node.args)
+        node.node = self.walk(node.node)
+
+    def visit_Const(self, node):
+        pass
+
+    def visit_Name(self, node):
+        pass
+
+    def visit_AssName(self, node):
+        pass
+
+    # P1
+    # ================================================================================
+    def visit_Or(self, node):
+        node.nodes = self.walk_list(node.nodes)
+
+    def visit_And(self, node):
+        node.nodes = self.walk_list(node.nodes)
+
+    def visit_IfExp(self, node):
+        node.test = self.walk(node.test)
+        node.then = self.walk(node.then)
+        node.else_ = self.walk(node.else_)
+
+    def visit_List(self, node):
+        node.nodes = self.walk_list(node.nodes)
+
+    def visit_Dict(self, node):
+        keys = self.walk_list([x[0] for x in node.items])
+        values = self.walk_list([x[1] for x in node.items])
+        node.items = list(zip(keys, values))
+
+    def visit_Compare(self, node):
+        ops = [(op, self.walk(x)) for op, x in node.ops]
+        node.expr = self.walk(node.expr)
+        node.ops = ops
+
+    def visit_Not(self, node):
+        node.expr = self.walk(node.expr)
+
+    def visit_Subscript(self, node):
+        subs = self.walk_list(node.subs)
+        node.expr = self.walk(node.expr)
+        node.subs = subs
+
+    # P2
+    # ================================================================================
+    def visit_Return(self, node):
+        node.value = self.walk(node.value)
+
+    def visit_Function(self, node):
+        node.code = self.walk(node.code)
+
+    def visit_Lambda(self, node):
+        node.code = self.walk(node.code)
+
+    # P3
+    # ================================================================================
+    def visit_While(self, node):
+        node.test = self.walk(node.test)
+        node.body = self.walk(node.body)
+        if node.else_ is not None:
+            node.else_ = self.walk(node.else_)
+
+    def visit_If(self, node):
+        tests = [self.walk(x[0]) for x in node.tests]
+        thens = [self.walk(x[1]) for x in node.tests]
+        node.tests = list(zip(tests, thens))
+        if node.else_ is not None:
+            node.else_ = self.walk(node.else_)
+
+    def visit_InjectFrom(self, node):
+        node.arg = self.walk(node.arg)
+
+    def visit_Getattr(self, node):
+        node.expr = self.walk(node.expr)
+
+    def visit_AssAttr(self, node):
+        node.expr = self.walk(node.expr)
+
+class Rewriter(object):
+    """Base class for passes that work in place, see the top of this file.
+    Set local = True if the pass may be fused with the passes after it."""
+    name = None
+    requires = ()
+    local = False
+    walker = Walker
+
+    def transform(self, node):
+        ret = self.walker([self]).walk(node)
+        scopes.invalidate()
+        return ret
+
+class PassManager(object):
+    def __init__(self, stats=None, fuse=True):
+        self.log = logging.getLogger('compiler.passmanager')
+        self.stats = stats
+        self.fuse = fuse
+        self.passes = []
+
+    def add(self, p):
+        """Adds a pass to run after the ones already added.  Raises if a
+        pass it requires has not been added before it."""
+        names = [x.name for x in self.passes]
+        for req in getattr(p, 'requires', ()):
+            if req not in names:
+                raise Exception("Pass '%s' requires '%s' to run before it" % (p.name, req))
+        self.passes.append(p)
+
+    def index(self, name):
+        """Returns the position of the pass called name."""
+        for i in range(len(self.passes)):
+            if self.passes[i].name == name:
+                return i
+        raise Exception("No pass named '%s'" % name)
+
+    def schedule(self, passes=None):
+        """Returns the passes (default: all of them) grouped into the
+        traversals they run in."""
+        if passes is None:
+            passes = self.passes
+        groups = []
+        for p in passes:
+            last = groups[-1] if groups else None
+            if self.fuse and isinstance(p, Rewriter) and last is not None and \
+               isinstance(last[-1], Rewriter) and last[-1].local:
+                last.append(p)
+            else:
+                groups.append([p])
+        return groups
+
+    def run(self, ast, varalloc=None, start_after=None, stop_after=None):
+        """Runs the passes on ast and returns the result.  If start_after
+        names a pass, ast is what that pass returned and only the passes
+        after it are run.  If stop_after names a pass, the passes after it
+        are left out."""
+        end = len(self.passes)
+        if stop_after is not None:
+            end = self.index(stop_after) + 1
+        begin = 0
+        if start_after is not None:
+            begin = self.index(start_after) + 1
+        for group in self.schedule(self.passes[begin:end]):
+            name = '+'.join([p.name for p in group])
+            if len(group) == 1:
+                func = group[0].transform
+            else:
+                self.log.debug('fusing %s', name)
+                func = group[-1].walker(group).walk
+            ast = run_pass(self.stats, name, func, ast, varalloc)
+            # the pass may have changed scopes the analysis has answered for
+            scopes.invalidate()
+        return ast
@@ -0,0 +1,145 @@
+# vim: set ts=4 sw=4 expandtab:
+#
+# Per-pass instrumentation for compile.py --time-passes.  For every pass we
+# record how often it ran, the wall time, the process's peak resident set size
+# once it finished (and how much the pass raised it), the size of the IR going
+# in and coming out, and how many temporaries it got from the
+# VariableAllocator.  IR size is the number of AST nodes for the front end,
+# the number of x86 instructions once instruction selection has run, and the
+# number of lines of assembly for the generator.  A pass may also report
+# counters of its own with count(), listed after the table.
+#
+# Python 2 has no tracemalloc, so peak memory is the ru_maxrss high water mark
+# of the process.  It only moves when a pass needs more memory than any pass
+# before it did.
+
+import time, resource, cProfile
+from pyast import Node
+from x86ir import X86Node, Instruction, Program, x86Function
+
+def ir_size(ir):
+    """Returns (unit, count) for an AST, an x86 program, or assembly text."""
+    if isinstance(ir, str):
+        return 'lines', ir.count('\n') + 1
+    if isinstance(ir, (Program, x86Function)) or \
+       (isinstance(ir, list) and len(ir) > 0 and isinstance(ir[0], (Program, x86Function))):
+        return 'instructions', count_nodes(ir, Instruction)
+    return 'nodes', count_nodes(ir, Node)
+
+def count_nodes(ir, cls):
+    count = 0
+    stack = [ir]
+    while stack:
+        n = stack.pop()
+        if isinstance(n, (list,tuple)):
+            stack.extend(n)
+        elif isinstance(n, (Node, X86Node)):
+            if isinstance(n, cls):
+                count += 1
+            children = n.getChildren()
+            if children is not None:
+                stack.extend(children)
+    return count
+
+def maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class PassStats(object):
+    FIELDS = ['calls', 'time', 'maxrss_kb', 'rss_growth_kb', 'size_before', 'size_after', 'temps']
+
+    def __init__(self, profile_prefix=None):
+        # when profile_prefix is set, each pass is run under cProfile and the
+        # profile is written to <profile_prefix>.<pass>.prof
+        self.profile_prefix = profile_prefix
+        self.passes = []
+        self.records = {}
+        # pass name -> {counter: total}, for what passes report with count()
+        self.counters = {}
+
+    def child(self, name):
+        """Returns an empty PassStats for a part of the compile that may run
+        in another process, e.g. one function's back end.  Its records are
+        added back with merge()."""
+        prefix = None
+        if self.profile_prefix is not None:
+            prefix = '%s.%s' % (self.profile_prefix, name)
+        return PassStats(prefix)
+
+    def run(self, name, func, arg, varalloc=None):
+        unit, before = ir_size(arg)
+        temps = varalloc.allocated if varalloc is not None else 0
+        rss = maxrss()
+        start = time.time()
+        if self.profile_prefix is not None:
+            profile = cProfile.Profile()
+            result = profile.runcall(func, arg)
+            elapsed = time.time() - start
+            profile.dump_stats('%s.%s.prof' % (self.profile_prefix, name))
+        else:
+            result = func(arg)
+            elapsed = time.time() - start
+        unit_after, after = ir_size(result)
+        record = {'calls': 1,
+                  'time': elapsed,
+                  'maxrss_kb': maxrss(),
+                  'rss_growth_kb': maxrss() - rss,
+                  'size_before': before,
+                  'size_after': after,
+                  'unit_before': unit,
+                  'unit_after': unit_after,
+                  'temps': 0}
+        if varalloc is not None:
+            record['temps'] = varalloc.allocated - temps
+        self.add(name, record)
+        return result
+
+    def count(self, name, counter, n):
+        """Adds n to counter, a number the pass name reports about what it
+        did, such as the moves the register allocator coalesced."""
+        counters = self.counters.setdefault(name, {})
+        counters[counter] = counters.get(counter, 0) + n
+
+    def add(self, name, record):
+        if name not in self.records:
+            self.passes.append(name)
+            self.records[name] = dict(record)
+            return
+        total = self.records[name]
+        for field in PassStats.FIELDS:
+            if field == 'maxrss_kb':
+                total[field] = max(total[field], record[field])
+            else:
+                total[field] += record[field]
+
+    def merge(self, other):
+        for name in other.passes:
+            self.add(name, other.records[name])
+        for name, counters in other.counters.items():
+            for counter, n in counters.items():
+                self.count(name, counter, n)
+
+    def report(self):
+        lines = ['%-15s %5s %9s %11s %9s %26s %7s' %
+                 ('pass', 'calls', 'time (s)', 'maxrss (KB)', '+rss (KB)', 'ir size in -> out', 'temps')]
+        total = 0.0
+        for name in self.passes:
+            r = self.records[name]
+            total += r['time']
+            size = '%d -> %d %s' % (r['size_before'], r['size_after'], r['unit_after'])
+            lines.append('%-15s %5d %9.4f %11d %9d %26s %7d' %
+                         (name, r['calls'], r['time'], r['maxrss_kb'], r['rss_growth_kb'], size, r['temps']))
+        lines.append('%-15s %5s %9.4f' % ('total', '', total))
+        for name in self.passes:
+            for counter, n in sorted(self.counters.get(name, {}).items()):
+                lines.append('%-15s %s: %d' % (name, counter, n))
+        return '\n'.join(lines)
+
+    def as_json(self):
+        return [dict(self.records[name], name=name, counters=self.counters.get(name, {}))
+                for name in self.passes]
+
+def run_pass(stats, name, func, arg, varalloc=None):
+    """Runs func(arg), recording it under name if stats is not None."""
+    if stats is None:
+        return func(arg)
+    return stats.run(name, func, arg, varalloc)
@@ -1848,16 +1848,25 @@ class LRTable(object):
         except ImportError:
             import pickle
 
+        if sys.version_info[0] < 3:
+            load = pickle.load
+        else:
+            # the byte strings of tables pickled by Python 2 are read back as
+            # text, except for the signature, which is compared with bytes
+            load = lambda f: pickle.load(f, encoding='latin-1')
+
         in_f = open(filename,"rb")
 
-        tabversion = pickle.load(in_f)
+        tabversion = load(in_f)
         if tabversion != __tabversion__:
             raise VersionError("yacc table file version is out of date")
-        self.lr_method = pickle.load(in_f)
-        signature      = pickle.load(in_f)
-        self.lr_action = pickle.load(in_f)
-        self.lr_goto   = pickle.load(in_f)
-        productions    = pickle.load(in_f)
+        self.lr_method = load(in_f)
+        signature      = load(in_f)
+        if sys.version_info[0] >= 3 and isinstance(signature, str):
+            signature = signature.encode('latin-1')
+        self.lr_action = load(in_f)
+        self.lr_goto   = load(in_f)
+        productions    = load(in_f)
 
         self.lr_productions = []
         for p in productions:
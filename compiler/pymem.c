@@ -6,6 +6,10 @@
 #include <libgen.h>
 #include "pymem.h"
 
+/* The release build of the runtime (make release) defines RUNTIME_RELEASE,
+ * which replaces all of the allocation tracking below with plain malloc and
+ * free.  See the end of this file. */
+#ifndef RUNTIME_RELEASE
 
 /* linked list */
 struct node {
@@ -233,3 +237,29 @@ static char *format_tv (const struct timeval *tv)
 
     return timestr;
 }
+
+#else /* RUNTIME_RELEASE */
+
+void pymem_init()
+{
+}
+
+void pymem_shutdown()
+{
+}
+
+void *pymem_new(int type, size_t size)
+{
+    return malloc(size);
+}
+
+void pymem_free(void *loc)
+{
+    free(loc);
+}
+
+void pymem_print_stats()
+{
+}
+
+#endif /* RUNTIME_RELEASE */
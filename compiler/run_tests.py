@@ -1,15 +1,23 @@
 #! /usr/bin/python
 
+from __future__ import print_function
 import sys
 import os
 import subprocess
 import difflib
+import threading
+import time
+import json
+from multiprocessing.pool import ThreadPool
+from optparse import OptionParser
 from os.path import splitext
 import colors
-import string
-from string import split
 from colors import *
+from compcache import Cache, format_stats
+from runtimelib import RUNTIMES, build_runtime
 
+# the test programs are Python 2; their expected output comes from running
+# them with this
 python_prog = "/usr/bin/python"
 
 # we'll need a garbage collection library later
@@ -23,51 +31,88 @@ else:
 default_prog = "./compile.py"
 default_tests_dir = "./test"
 
+parser = OptionParser(usage='%prog [options] [compiler] [tests-dir...]')
+parser.add_option('-j', '--jobs', dest='jobs', type='int', default=1,
+                  help='run N tests at the same time (default: 1)')
+parser.add_option('-t', '--timeout', dest='timeout', type='float', default=60,
+                  help='kill any stage of a test that takes longer than this '
+                       'many seconds, 0 for no limit (default: %default)')
+parser.add_option('--shard', dest='shard', default=None,
+                  help='only run shard I of N (0 <= I < N) of the sorted tests')
+parser.add_option('--json', dest='json', default=None,
+                  help='write the results, with per-stage timings, to this file')
+parser.add_option('--python', dest='python', default=sys.executable,
+                  help='interpreter that runs the compiler, Python 2 or 3 '
+                       '(default: the one running this script, %default)')
+parser.add_option('--reference-python', dest='reference_python', default=python_prog,
+                  help='Python 2 interpreter that gives the expected output (default: %default)')
+parser.add_option('--allocator', dest='allocator', default=None,
+                  help='pass --allocator ALLOCATOR to the compiler (default: its own default)')
+parser.add_option('--differential', dest='differential', action='store_true', default=False,
+                  help='check the output against that of the program compiled with '
+                       '--allocator stack instead of against Python')
+parser.add_option('--runtime', dest='runtime', default='instrumented',
+                  choices=sorted(RUNTIMES.keys()),
+                  help='link against the release or instrumented runtime (default: %default)')
+parser.add_option('--no-cache', dest='cache', action='store_false', default=True,
+                  help='always recompile, relink and regenerate expected output')
+parser.add_option('--cache-dir', dest='cache_dir', default=None,
+                  help='cache directory (default: $P3_CACHE_DIR or ~/.cache/p3compile)')
+parser.add_option('--cache-stats', dest='cache_stats', action='store_true', default=False,
+                  help='print cache hits and misses for this run')
+(options, args) = parser.parse_args()
+
 # default to using compiler.py and tests dir
-if len(sys.argv) < 2:
+if len(args) < 1:
   prog = default_prog
 else:
-  prog = sys.argv[1]
+  prog = args[0]
 
 if not os.path.exists(prog):
-    print "Compiler not found: " + prog
+    print("Compiler not found: " + prog)
     sys.exit(1)
 
-if len(sys.argv) < 3:
-  testsdir = default_tests_dir
+if len(args) < 2:
+  testsdirs = [default_tests_dir]
 else:
-  testsdir = sys.argv[2]
+  testsdirs = args[1:]
+
+shard, nshards = 0, 1
+if options.shard:
+    try:
+        shard, nshards = map(int, options.shard.split('/'))
+    except ValueError:
+        nshards = 0
+    if not 0 <= shard < nshards:
+        print("Bad shard, expected I/N with 0 <= I < N: " + options.shard)
+        sys.exit(1)
 
 (homedir,progname) = os.path.split(prog)
 
 gcc_params = ['-g', '-lm', '-m32','-I' + homedir, '-I' + homedir + '/test', '-I' + homedir + '/tests',gc_inc]
 
 
-runtime_files = filter(lambda f: splitext(f)[1] == '.c', os.listdir(homedir))
-for f in runtime_files:
-    gcc_cmd = ["gcc", homedir + '/' + f, "-c", "-g", "-m32", gc_inc, "-lm"]
-    gcc_cmd = [arg for arg in gcc_cmd if arg]
-    compile_proc = subprocess.Popen(gcc_cmd)
-    warn = compile_proc.communicate()[1]
-    retcode = compile_proc.poll()
-    if retcode != 0:
-      print 'failed to compile ' + f
-    mvproc = subprocess.Popen(["mv", splitext(f)[0] + '.o', homedir + '/' + splitext(f)[0] + '.o'])
-    retcode = mvproc.poll()    
-
-object_files = map(lambda f: homedir + '/' + splitext(f)[0] + '.o', runtime_files)
+# make only rebuilds the runtime objects whose sources changed
+archive = build_runtime(homedir, options.runtime)
+if archive is None:
+    print('failed to build the ' + options.runtime + ' runtime')
+object_files = [archive] if archive is not None else []
 
-tests = os.listdir(testsdir)
+tests = []
+for testsdir in testsdirs:
+    tests.extend([testsdir + '/' + t for t in os.listdir(testsdir) if splitext(t)[1] == '.py'])
+tests = sorted(tests)[shard::nshards]
 
+# the compiler flags of the programs that are tested and, with
+# --differential, of the ones whose output they are checked against
+flags = []
+if options.allocator is not None:
+    flags = ['--allocator', options.allocator]
+reference_flags = ['--allocator', 'stack']
 
-tests = filter(lambda t: splitext(t)[1] == '.py', tests)
-tests = map(lambda t: testsdir + '/' + t, tests)
-
-success = 0
-fail = 0
-
-successes = []
-failures = []
+cache = None
+if options.cache:
+    cache = Cache(options.cache_dir)
 
 COMPILE_SUCCESS=0
 COMPILE_WARN=1
@@ -75,12 +120,132 @@ COMPILE_FAIL=2
 
 RUN_SUCCESS=0
 RUN_FAIL=1
-
+RUN_TIMEOUT=2
+
+
+def run(cmd, **kwargs):
+    """Runs cmd to completion, killing it after options.timeout seconds.
+    Returns (retcode, wall time, timed out)."""
+    start = time.time()
+    proc = subprocess.Popen(cmd, **kwargs)
+    killed = []
+    def kill():
+        killed.append(True)
+        proc.kill()
+    timer = None
+    if options.timeout > 0:
+        timer = threading.Timer(options.timeout, kill)
+        timer.start()
+    proc.communicate()
+    if timer is not None:
+        timer.cancel()
+    return proc.returncode, time.time() - start, bool(killed)
+
+def build(t, base, outbase, flags, result, stage=''):
+    """Compiles the test t, whose name without .py is base, with the
+    compiler flags given to outbase.s and links it into outbase.  The times
+    and cache hits go into result, their names prefixed with stage.
+    Returns whether both steps worked."""
+    times = result['times']
+    cfilename = outbase + '.s'
+    if cache is not None:
+        asm_key = cache.asm_key(t, homedir, *flags)
+    if cache is not None and cache.get('asm', asm_key, cfilename):
+        result['cached'].append(stage + 'compile')
+    else:
+        # the compiler writes base.s itself
+        retcode, times[stage + 'compile'], timed_out = run([options.python, prog] + flags + [t],
+                                                           stdout=subprocess.PIPE)
+        if timed_out or retcode != 0:
+            result['timeout'] = timed_out
+            return False
+        if outbase != base:
+            os.rename(base + '.s', cfilename)
+        if cache is not None:
+            cache.put('asm', asm_key, cfilename)
+
+    gcc_cmd = ["gcc", cfilename] + object_files + [gc_lib] + ["-o", outbase] + gcc_params
+    gcc_cmd = [arg for arg in gcc_cmd if arg]
+    if cache is not None:
+        bin_key = cache.bin_key(asm_key, homedir, gcc_cmd)
+    if cache is not None and cache.get('bin', bin_key, outbase):
+        result['cached'].append(stage + 'link')
+    else:
+        retcode, times[stage + 'link'], timed_out = run(gcc_cmd)
+        if timed_out or retcode != 0:
+            result['timeout'] = timed_out
+            return False
+        if cache is not None:
+            cache.put('bin', bin_key, outbase)
+    return True
+
+def run_test(t):
+    base = splitext(t)[0]
+    infilename = base + '.in'
+    result = {'test': t, 'compile': COMPILE_FAIL, 'run': RUN_FAIL, 'timeout': False,
+              'times': {}, 'cached': []}
+    times = result['times']
+
+    def stdin():
+        if os.path.exists(infilename):
+            return open(infilename, 'r')
+        return None
+
+    if options.differential:
+        # the reference is built first, compile.py always writes base.s
+        refbase = base + '.stack'
+        if not build(t, base, refbase, reference_flags, result, 'reference '):
+            return result
+        outfilename = refbase + '.out'
+        outfile = open(outfilename, 'w')
+        retcode, times['reference run'], timed_out = run([refbase], stdin=stdin(), stdout=outfile)
+        outfile.close()
+        if timed_out:
+            result['timeout'] = True
+            return result
+
+    if not build(t, base, base, flags, result):
+        return result
+    result['compile'] = COMPILE_SUCCESS
+
+    outfilename = base + '.out'
+    outfile = open(outfilename, 'w')
+    retcode, times['run'], timed_out = run([base], stdin=stdin(), stdout=outfile)
+    outfile.close()
+    if timed_out:
+        result['timeout'] = True
+        result['run'] = RUN_TIMEOUT
+        return result
+
+    if options.differential:
+        # what the program compiled with the stack allocator printed
+        expfilename = refbase + '.out'
+    else:
+        expfilename = base+'.expected'
+        if cache is not None:
+            expected_key = cache.expected_key(t, infilename, options.reference_python)
+        if cache is not None and cache.get('expected', expected_key, expfilename):
+            result['cached'].append('expected')
+        else:
+            expected = open(expfilename, 'w')
+            retcode, times['expected'], timed_out = run([options.reference_python,t], stdin=stdin(), stdout=expected)
+            expected.close()
+            if timed_out:
+                result['timeout'] = True
+                return result
+            if cache is not None:
+                cache.put('expected', expected_key, expfilename)
+
+    retcode = subprocess.call(["diff","-w","-B",expfilename, outfilename],stdout=subprocess.PIPE)
+    if retcode == 0:
+        result['run'] = RUN_SUCCESS
+    return result
 
 def show_test_result(test_name, compile, run):
     terminal_width = 50
-    t_name = split(test_name,'.py')[0]
-    t_name = split(t_name,testsdir + os.sep)[1]
+    t_name = test_name.split('.py')[0]
+    if len(testsdirs) == 1:
+        t_name = t_name.split(testsdirs[0] + os.sep)[1]
     test_output = blue + t_name + normal
     if compile == COMPILE_SUCCESS:
         compile_result_str = '[ ' + green + 'OK' + normal + ' ]'
@@ -91,6 +256,8 @@ def show_test_result(test_name, compile, run):
 
     if run == RUN_SUCCESS:
         run_result_str = '[ ' + green + 'OK' + normal + ' ]'
+    elif run == RUN_TIMEOUT:
+        run_result_str = '[' + yellow + 'TIME' + normal + ']'
     else:
         run_result_str = '[' + red + 'FAIL' + normal + ']'
 
@@ -98,80 +265,64 @@ def show_test_result(test_name, compile, run):
     for i in range(spaces):
         test_output += ' '
     test_output += compile_result_str + ' ' + run_result_str
-    print test_output
-
-print 'Test Name                              [Comp] [Run!]'
+    print(test_output)
 
-for t in sorted(tests):
-    test_name = t
-    base = splitext(t)[0]
-    cfilename = base+'.s'
-    cfile = open(cfilename, 'w')
-    wfile = open(base+'.warn', 'w')
-#    print 'compiling Python to C'
-    retcode = subprocess.call([python_prog,prog,t], stdout=cfile)
-#    print 'about to indent'
-#    retcode = subprocess.call(['indent',cfilename])
-    gcc_cmd = ["gcc", cfilename] + object_files + [gc_lib] + ["-o", base] + gcc_params
-    gcc_cmd = [arg for arg in gcc_cmd if arg]
-    
-#    print 'invoking gcc'
-#    print ' '.join(gcc_cmd)
-#    compile_proc = subprocess.Popen(gcc_cmd, stderr=subprocess.PIPE)
-    compile_proc = subprocess.Popen(gcc_cmd)
-    warn = compile_proc.communicate()[1]
-    retcode = compile_proc.poll()
-
-    compile_result = COMPILE_SUCCESS
-    if retcode != 0:
-        compile_result = COMPILE_FAIL
-        fail = fail + 1
-    elif warn:
-        compile_result = COMPILE_WARN
-    run_result = RUN_FAIL
-
-    if retcode == 0:
-        outfilename = base + '.out'
-        infilename = base + '.in'
-#        print 'running the program'
-        outfile = open(outfilename, 'w')
-        if os.path.split(infilename)[1] in os.listdir(testsdir):
-          infile = open(infilename, 'r')
-          retcode = subprocess.call([base], stdin=infile, stdout=outfile)
-        else:
-          retcode = subprocess.call([base], stdout=outfile)
+print('Test Name                              [Comp] [Run!]')
 
-        expfilename = base+'.expected'
-        expected = open(expfilename, 'w')
-        
-        if os.path.split(infilename)[1] in os.listdir(testsdir):
-          infile = open(infilename, 'r')
-          retcode = subprocess.call([python_prog,t], stdin=infile, stdout=expected)
-        else:
-          retcode = subprocess.call([python_prog,t], stdout=expected)
+success = 0
+fail = 0
 
-        retcode = subprocess.call(["diff","-w","-B",expfilename, outfilename],stdout=subprocess.PIPE)
-        if retcode == 0:
-            success = success + 1
-            successes.append(base)
-            run_result = RUN_SUCCESS
-        else:
-            fail = fail + 1
-            failures.append(base)
-    show_test_result(test_name, compile_result, run_result)
+successes = []
+failures = []
+results = []
+
+# imap hands the results back in test order, whatever order they finish in
+pool = ThreadPool(max(options.jobs, 1))
+for result in pool.imap(run_test, tests):
+    base = splitext(result['test'])[0]
+    if result['compile'] == COMPILE_SUCCESS and result['run'] == RUN_SUCCESS:
+        success = success + 1
+        successes.append(base)
+    else:
+        fail = fail + 1
+        failures.append(base)
+    results.append(result)
+    show_test_result(result['test'], result['compile'], result['run'])
+pool.close()
+pool.join()
 
 def hr():
-    print '===================================================='
+    print('====================================================')
 
 
 hr()
-print '                tests passed: ' + green + str(success) + normal + \
-        ', tests failed: ' + red + str(fail) + normal
+print('                tests passed: ' + green + str(success) + normal + \
+        ', tests failed: ' + red + str(fail) + normal)
+
+if cache is not None:
+    if options.cache_stats:
+        print(format_stats(cache.hits, cache.misses))
+    cache.trim()
+    cache.save_stats()
+
+if options.json:
+    f = open(options.json, 'w')
+    json.dump({'compiler': prog, 'testsdirs': testsdirs, 'shard': [shard, nshards],
+               'allocator': options.allocator, 'differential': options.differential,
+               'passed': success, 'failed': fail,
+               'tests': [{'test': r['test'],
+                          'passed': r['compile'] == COMPILE_SUCCESS and r['run'] == RUN_SUCCESS,
+                          'compiled': r['compile'] == COMPILE_SUCCESS,
+                          'timeout': r['timeout'],
+                          'cached': r['cached'],
+                          'times': r['times']} for r in results]},
+              f, indent=2, sort_keys=True)
+    f.close()
 
 if False and fail > 0:
-    print '\nfailures:'
+    print('\nfailures:')
     for f in failures:
-        print red + f + normal
-        print blue + 'test program:\n' + normal + open(f + '.py', 'r').read()
-        print blue + 'output:\n' + normal + open(f + '.out','r').read()
-        print blue + 'expected:\n' + normal + open(f + '.expected','r').read()
+        print(red + f + normal)
+        print(blue + 'test program:\n' + normal + open(f + '.py', 'r').read())
+        print(blue + 'output:\n' + normal + open(f + '.out','r').read())
+        print(blue + 'expected:\n' + normal + open(f + '.expected','r').read())
@@ -7,12 +7,15 @@
 #include <sys/time.h>
 
 #include "runtime.h"
+#include "pymem.h"
 
 int min(int x, int y) {
     return y < x ? y : x;
 }
 
+#ifndef RUNTIME_RELEASE
 static struct timeval decref_latency;
+#endif
 
 /* Some forward declarations */
 static int equal_pyobj(pyobj a, pyobj b);
@@ -1409,6 +1412,12 @@ void dec_ref_ctr_rec(pyobj v) {
     }
 }
 
+#ifdef RUNTIME_RELEASE
+void dec_ref_ctr(pyobj v) {
+    if (is_big(v))
+        dec_ref_ctr_rec(v);
+}
+#else
 void dec_ref_ctr(pyobj v) {
     struct timeval start, end, result;
     int ret;
@@ -1431,6 +1440,7 @@ void dec_ref_ctr(pyobj v) {
         }
     }
 }
+#endif
 
 void autorelease(pyobj v) {
     if (is_big(v)) {
@@ -1442,13 +1452,17 @@ void autorelease(pyobj v) {
 
 void runtime_init()
 {
+#ifndef RUNTIME_RELEASE
     decref_latency.tv_sec = 0;
     decref_latency.tv_usec = 0;
+#endif
 }
 
 void runtime_shutdown()
 {
+#ifndef RUNTIME_RELEASE
     fprintf(stderr, "dec_ref_ctr took %ld.%06ld seconds\n", decref_latency.tv_sec, decref_latency.tv_usec);
+#endif
 }
 
 
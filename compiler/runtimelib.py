@@ -0,0 +1,30 @@
+# vim: set ts=4 sw=4 expandtab:
+#
+# Helpers for building and linking against the runtime library.  The Makefile
+# knows how to build both flavours and only rebuilds objects whose sources
+# changed, so asking make for the archive every time is cheap.
+
+import os, subprocess
+
+RUNTIMES = {
+    'release':      'libruntime.a',
+    'instrumented': 'libruntime_instrumented.a',
+}
+
+def build_runtime(compdir, kind):
+    """Brings the runtime archive of the given kind up to date and returns
+    its path, or None if it could not be built."""
+    if kind not in RUNTIMES:
+        raise Exception("Unknown runtime '%s', expected one of: %s" % (kind, ', '.join(sorted(RUNTIMES))))
+    retcode = subprocess.call(['make', '-s', '-C', compdir or '.', RUNTIMES[kind]])
+    if retcode != 0:
+        return None
+    return os.path.join(compdir, RUNTIMES[kind])
+
+def link(asmfile, output, compdir, kind):
+    """Links the assembly file against the runtime into output, returns gcc's
+    exit status."""
+    archive = build_runtime(compdir, kind)
+    if archive is None:
+        return 1
+    return subprocess.call(['gcc', '-m32', asmfile, archive, '-o', output, '-lm'])
@@ -0,0 +1,74 @@
+# vim: set ts=4 sw=4 expandtab:
+#
+# IR snapshots for compile.py --stop-after and --start-from.  A snapshot holds
+# the IR of a program as it was after one pass, along with the allocator state
+# the passes after it need, so that resuming from it gives the same assembly
+# as a compile that never stopped.
+#
+# Everything is pickled in one go, which keeps objects that are shared in the
+# IR shared after loading it; e.g. every use of a Var is still the Var in the
+# OperandTable of its VariableAllocator.  The x86 IR classes use __slots__,
+# which only pickle protocol 2 handles.  The pickle is compressed with zlib and
+# follows a one line header,
+#     P3IR <format> py<major version of Python>
+# since a pickle of these classes written by Python 3 cannot be loaded by
+# Python 2, nor the other way round.
+
+import sys
+import zlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+MAGIC = b'P3IR'
+# bumped whenever the layout of Snapshot changes
+FORMAT = 2
+
+class Snapshot(object):
+    """The IR after the pass named passname.  After a front end pass, ir is
+    the tree (the list of functions after closure conversion) and varalloc
+    the front end's VariableAllocator.  After a back end pass, ir has one
+    (ir, varalloc, labelalloc) per function, see compile.backend, and
+    varalloc is None.  refcount and allocator are the options the passes up
+    to passname were run with."""
+    def __init__(self, passname, ir, varalloc, refcount, allocator):
+        self.passname = passname
+        self.ir = ir
+        self.varalloc = varalloc
+        self.refcount = refcount
+        self.allocator = allocator
+
+def header():
+    return b'%s %d py%d\n' % (MAGIC, FORMAT, sys.version_info[0])
+
+def save(snapshot, path):
+    data = zlib.compress(pickle.dumps(snapshot, 2))
+    f = open(path, 'wb')
+    try:
+        f.write(header())
+        f.write(data)
+    finally:
+        f.close()
+
+def load(path):
+    """Returns the Snapshot saved to path, raising an Exception that says why
+    if it cannot be loaded by this compiler and interpreter."""
+    f = open(path, 'rb')
+    try:
+        data = f.read()
+    finally:
+        f.close()
+    end = data.find(b'\n')
+    fields = data[:end].split() if end >= 0 else []
+    if len(fields) != 3 or fields[0] != MAGIC or not fields[1].isdigit():
+        raise Exception("'%s' is not an IR snapshot, or one written by an older version of the compiler" % path)
+    if int(fields[1]) != FORMAT:
+        raise Exception("'%s' is an IR snapshot of format %d, this version of the compiler reads format %d"
+                        % (path, int(fields[1]), FORMAT))
+    python = 'py%d' % sys.version_info[0]
+    if fields[2].decode('ascii', 'replace') != python:
+        raise Exception("'%s' was written by Python %s and cannot be loaded by Python %d; "
+                        "resume it with the Python it was written by"
+                        % (path, fields[2][2:].decode('ascii', 'replace'), sys.version_info[0]))
+    return pickle.loads(zlib.decompress(data[end + 1:]))
@@ -1,12 +1,13 @@
 # vim: set ts=4 sw=4 expandtab:
 
 # main function
+from __future__ import print_function
 if __name__ == "__main__":
     import sys, compiler
     from p0parser import P0Parser
 
     if len(sys.argv) < 2:
-        print "Usage: %s <input-file> [input-files...]" % sys.argv[0]
+        print("Usage: %s <input-file> [input-files...]" % sys.argv[0])
         sys.exit(1)
 
     red = "\033[31m"
@@ -17,6 +18,7 @@ if __name__ == "__main__":
     pars = P0Parser()
     pars.build()
 
+    failed = 0
     for filename in sys.argv[1:]:
         f = open(filename, 'r')
         data = f.read()
@@ -32,8 +34,11 @@ if __name__ == "__main__":
             raise
             result2 = 'failed parse'
         if result1 == result2:
-            print "%-30s [%s%s%s]" % (filename, green, 'OK', reset)
+            print("%-30s [%s%s%s]" % (filename, green, 'OK', reset))
         else:
-            print "%-30s [%s%s%s]" % (filename, red, 'FAIL', reset)
-            print result1 
-            print result2
+            print("%-30s [%s%s%s]" % (filename, red, 'FAIL', reset))
+            failed += 1
+            print(result1) 
+            print(result2)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,64 @@
+# vim: set ts=4 sw=4 expandtab:
+#
+# Common base class for the passes.  Each pass used to build the string
+# 'visit_'+classname and getattr it for every node it visited.  Visitor looks
+# the method up once per (pass class, node class) and keeps it in a table, so
+# dispatch is a single dict lookup.  Every pass class gets its own table,
+# which is filled in lazily, so visit_ methods overridden in a subclass are
+# found just as getattr would have found them.
+#
+# Nodes without a visit_ method go to visit_default(), which raises.  Passes
+# that hand unknown nodes back unchanged override it.
+#
+# Tracing: set_trace(hook) makes visit() call hook(visitor, node) before each
+# node is dispatched.  It replaces visit on that one instance, so passes that
+# are not traced do not pay for it.
+#
+# Visitor gets its metaclass from the base class VisitorMeta makes, which
+# Python 2 and 3 both understand (they spell __metaclass__ differently).
+
+import logging
+
+class VisitorMeta(type):
+    def __init__(cls, name, bases, dict):
+        type.__init__(cls, name, bases, dict)
+        cls._dispatch = {}
+
+class Visitor(VisitorMeta('VisitorBase', (object,), {})):
+    def visit(self, node, *args, **kwargs):
+        try:
+            meth = self._dispatch[node.__class__]
+        except KeyError:
+            meth = self._lookup(node.__class__)
+        return meth(self, node, *args, **kwargs)
+
+    @classmethod
+    def _lookup(cls, nodeclass):
+        meth = getattr(cls, 'visit_' + nodeclass.__name__, None)
+        if meth is None:
+            meth = cls.visit_default
+        # keep the plain function, calling it saves making a bound method;
+        # Python 3 has no unbound methods and gives the function already
+        meth = getattr(meth, '__func__', meth)
+        cls._dispatch[nodeclass] = meth
+        return meth
+
+    def visit_default(self, node, *args, **kwargs):
+        raise Exception('Unknown node: %s method: %s' % (node.__class__, 'visit_' + node.__class__.__name__))
+
+    def set_trace(self, hook):
+        """Calls hook(self, node) before every node this pass visits, e.g.
+        log_visit.  set_trace(None) turns tracing off again."""
+        if hook is None:
+            self.__dict__.pop('visit', None)
+            return
+        visit = type(self).visit
+        def traced(node, *args, **kwargs):
+            hook(self, node)
+            return visit(self, node, *args, **kwargs)
+        self.visit = traced
+
+def log_visit(visitor, node):
+    """Trace hook that logs each visited node on the pass's logger."""
+    log = getattr(visitor, 'log', None) or logging.getLogger('compiler.visit')
+    log.debug('%s: %s', node.__class__.__name__, node)
@@ -1,14 +1,32 @@
 # vim: set ts=4 sw=4 expandtab:
 
-from compiler.ast import Node, flatten
+from pyast import flatten
 
-class Instruction(Node):
+class X86Node(object):
+    """Base class of the x86 IR.  It has the interface of compiler.ast.Node,
+    but is a new-style class so that the IR classes below can use __slots__:
+    a classic base class always gives instances a __dict__."""
+    __slots__ = ()
+    def getChildren(self):
+        pass
+    def __iter__(self):
+        for n in self.getChildren():
+            yield n
+    def asList(self):
+        return self.getChildren()
+    def getChildNodes(self):
+        pass
+
+class Instruction(X86Node):
+    # liveafter is set by the liveness analysis of the register allocators
+    __slots__ = ('liveafter',)
     def writes(self):
         raise NotImplementedError('writes() not implemented')
     def reads(self):
         raise NotImplementedError('reads() not implemented')
 
-class Program(Node):
+class Program(X86Node):
+    __slots__ = ('statements',)
     def __init__(self, statements):
         self.statements = statements
     def __str__(self):
@@ -24,7 +42,8 @@ class Program(Node):
                 instructions.append(instr)
         return instructions
 
-class Statement(Node):
+class Statement(X86Node):
+    __slots__ = ('instructions', 'source')
     def __init__(self, instructions, source):
         self.instructions = instructions
         self.source = source
@@ -39,11 +58,18 @@ class Statement(Node):
 #        l.append(self.source)
         return tuple(l)
     def writes(self):
-        return reduce(lambda x,y: x+y, [x.writes() for x in self.instructions])
+        writes = []
+        for x in self.instructions:
+            writes.extend(x.writes())
+        return writes
     def reads(self):
-        return reduce(lambda x,y: x+y, [x.reads() for x in self.instructions])
+        reads = []
+        for x in self.instructions:
+            reads.extend(x.reads())
+        return reads
 
 class Movl(Instruction):
+    __slots__ = ('src', 'dst')
     def __init__(self, src, dst):
         self.src = src
         self.dst = dst
@@ -57,6 +83,7 @@ class Movl(Instruction):
         return [self.src]
 
 class Pushl(Instruction):
+    __slots__ = ('src',)
     def __init__(self, src):
         self.src = src 
     def __str__(self):
@@ -69,6 +96,7 @@ class Pushl(Instruction):
         return [self.src]
 
 class Addl(Instruction):
+    __slots__ = ('src', 'dst')
     def __init__(self, src, dst):
         self.src = src 
         self.dst = dst 
@@ -82,6 +110,7 @@ class Addl(Instruction):
         return [self.src, self.dst]
 
 class Call(Instruction):
+    __slots__ = ('func',)
     def __init__(self, func):
         self.func = func
     def __str__(self):
@@ -94,6 +123,7 @@ class Call(Instruction):
         return []
 
 class Negl(Instruction):
+    __slots__ = ('operand',)
     def __init__(self, operand):
         self.operand = operand
     def __str__(self):
@@ -105,25 +135,37 @@ class Negl(Instruction):
     def reads(self):
         return [self.operand]
 
-class Register(Node):
-    def __init__(self, name):
-        self.name = name
+class Register(X86Node):
+    """Registers are interned: Register(name) always returns the same object,
+    so registers compare and hash by identity.  id numbers them densely."""
+    __slots__ = ('name', 'id')
+    _interned = {}
+    def __new__(cls, name):
+        try:
+            return cls._interned[name]
+        except KeyError:
+            reg = X86Node.__new__(cls)
+            reg.name = name
+            reg.id = len(cls._interned)
+            cls._interned[name] = reg
+            return reg
+    def __reduce__(self):
+        return (Register, (self.name,))
     def __str__(self):
         return "Register('%s')" % (self.name)
     def __repr__(self):
         return self.__str__()
-    def __eq__(self, other):
-        return self.name == other.name
-    def __ne__(self, other):
-        return not self.__eq__(other)
-    def __hash__(self):
-        return self.name.__hash__()
 
-class Var(Node):
-    def __init__(self, name, spillable=True, storage=None):
+class Var(X86Node):
+    """A variable of the function being compiled.  Vars are made by an
+    OperandTable, which hands out one Var per name, so they compare and hash
+    by identity."""
+    __slots__ = ('name', 'spillable', 'storage', 'id')
+    def __init__(self, name, spillable, id):
         self.name = name
         self.spillable = spillable
         self.storage = None   # one of Register() or StackSlot()
+        self.id = id
     def __str__(self):
         if self.storage is not None:
             if isinstance(self.storage, (Register,StackSlot)):
@@ -133,18 +175,38 @@ class Var(Node):
         return "Var('%s')" % (self.name)
     def __repr__(self):
         return self.__str__()
-    def __eq__(self, other):
-        return self.name == other.name
-    def __ne__(self, other):
-        return not self.__eq__(other)
-    def __hash__(self):
-        return self.name.__hash__()
+    # the allocators' priority queue compares variables of equal priority
+    def __lt__(self, other):
+        return self.id < other.id
     # need this for set operations b/c Node overrides __iter__ to
     # call getChildren().  Nasty.
     def getChildren(self):
         return tuple()
 
-class Imm32(Node):
+class OperandTable(object):
+    """Interns the variables of one function.  var(name) always returns the
+    same Var for the same name, and the Vars are numbered 0, 1, 2, ... in the
+    order they were first asked for, so passes can keep per-variable data in
+    lists indexed by Var.id.  Names are only unique within a function, so
+    every function's back end needs a table of its own."""
+    def __init__(self):
+        self.vars = {}
+        self.varlist = []
+
+    def var(self, name, spillable=True):
+        try:
+            return self.vars[name]
+        except KeyError:
+            v = Var(name, spillable, len(self.varlist))
+            self.vars[name] = v
+            self.varlist.append(v)
+            return v
+
+    def __len__(self):
+        return len(self.varlist)
+
+class Imm32(X86Node):
+    __slots__ = ('value',)
     def __init__(self, value):
         self.value = value
     def __str__(self):
@@ -158,7 +220,8 @@ class Imm32(Node):
     def __hash__(self):
         return self.value.__hash__()
 
-class StackSlot(Node):
+class StackSlot(X86Node):
+    __slots__ = ('slot',)
     def __init__(self, slot):
         self.slot = slot
     def __str__(self):
@@ -173,6 +236,7 @@ class StackSlot(Node):
         return self.value.__hash__()
 
 class Cmp(Instruction):
+    __slots__ = ('lhs', 'rhs')
     def __init__(self, lhs, rhs):
         self.lhs = lhs
         self.rhs = rhs
@@ -192,6 +256,7 @@ class Cmp(Instruction):
         return [self.lhs, self.rhs]
 
 class CmpNe(Cmp):
+    __slots__ = ()
     def __init__(self, lhs, rhs):
         Cmp.__init__(lhs,rhs)
     def __str__(self):
@@ -200,6 +265,7 @@ class CmpNe(Cmp):
         return self.__str__()
     
 class BitwiseNot(Instruction):
+    __slots__ = ('value',)
     def __init__(self, value):
         self.value = value
     def __str__(self):
@@ -218,6 +284,7 @@ class BitwiseNot(Instruction):
         return [self.value]
     
 class BitwiseAnd(Instruction):
+    __slots__ = ('src', 'dst')
     def __init__(self, src, dst):
         self.src = src 
         self.dst = dst 
@@ -237,6 +304,7 @@ class BitwiseAnd(Instruction):
         return [self.src, self.dst]
 
 class BitwiseOr(Instruction):
+    __slots__ = ('src', 'dst')
     def __init__(self, src, dst):
         self.src = src
         self.dst = dst 
@@ -256,6 +324,7 @@ class BitwiseOr(Instruction):
         return [self.src, self.dst]
     
 class BitShift(Instruction):
+    __slots__ = ('src', 'dst', 'dir')
     def __init__(self, src, dst, direction):
         self.src = src 
         self.dst = dst 
@@ -276,6 +345,7 @@ class BitShift(Instruction):
         return [self.src, self.dst]
         
 class Label(Instruction):
+    __slots__ = ('label',)
     def __init__(self, label):
         self.label = label
     def __str__(self):
@@ -294,6 +364,7 @@ class Label(Instruction):
         return []
     
 class Jump(Instruction):
+    __slots__ = ('label',)
     def __init__(self, label):
         self.label = label
     def __str__(self):
@@ -312,12 +383,14 @@ class Jump(Instruction):
         return []
     
 class JumpEquals(Jump):
+    __slots__ = ()
     def __init__(self, label):
         Jump.__init__(self, label)
     def __str__(self):
         return "JumpEquals(%s)" % self.label
 
-class x86If(Node):
+class x86If(X86Node):
+    __slots__ = ('test', 'then', 'else_', 'liveafter')
     def __init__(self, test, then, else_):
         self.test = test
         self.then = then
@@ -329,7 +402,8 @@ class x86If(Node):
     def getChildren(self):
         return (self.test, self.then, self.else_)
 
-class x86Function(Node):
+class x86Function(X86Node):
+    __slots__ = ('name', 'argnames', 'statements', 'lineno')
     def __init__(self, name, argnames, statements, lineno=None):
         self.name = name
         self.argnames = argnames
@@ -351,7 +425,8 @@ class x86Function(Node):
                 instructions.append(instr)
         return instructions
 
-class x86While(Node):
+class x86While(X86Node):
+    __slots__ = ('test', 'body', 'else_', 'lineno', 'liveafter')
     def __init__(self, test, body, else_, lineno=None):
         self.test = test
         self.body = body
@@ -379,6 +454,7 @@ class x86While(Node):
         return self.__str__()
 
 class CallAddress(Instruction):
+    __slots__ = ('address',)
     def __init__(self, address):
         self.address = address
     def __str__(self):
@@ -391,6 +467,7 @@ class CallAddress(Instruction):
         return [self.address]
 
 class Ret(Instruction):
+    __slots__ = ('value',)
     def __init__(self, value):
         self.value = value
     def __str__(self):